@@ -0,0 +1,89 @@
+"""
+
+Running Aggregates
+
+Totals that the achievements need (all-time totals per product, number of
+deposits, scans per day) are updated incrementally on every deposit/scan
+instead of summing the whole history each time. rebuild() recomputes them
+from the history if they ever get out of sync.
+
+"""
+from datetime import datetime
+
+
+class AggregateIndex:
+    def __init__(self):
+        self.product_totals = {}
+        self.all_time_total = 0
+        self.total_amount = 0.0
+        self.deposit_count = 0
+        self.total_scans = 0
+        self.daily_scans = {}  # 'YYYY-MM-DD' -> scans on that day
+
+    def add_deposit(self, record):
+        for product, quantity in record['quantities'].items():
+            self.product_totals[product] = self.product_totals.get(product, 0) + quantity
+            self.all_time_total += quantity
+        self.total_amount += record.get('total', 0.0)
+        self.deposit_count += 1
+
+    def add_scan(self, day=None):
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        self.total_scans += 1
+        self.daily_scans[day] = self.daily_scans.get(day, 0) + 1
+        return self.daily_scans[day]
+
+    def scans_on(self, day=None):
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        return self.daily_scans.get(day, 0)
+
+    def reset_deposits(self):
+        self.product_totals = {}
+        self.all_time_total = 0
+        self.total_amount = 0.0
+        self.deposit_count = 0
+
+    def to_dict(self):
+        return {
+            'product_totals': self.product_totals,
+            'all_time_total': self.all_time_total,
+            'total_amount': self.total_amount,
+            'deposit_count': self.deposit_count,
+            'total_scans': self.total_scans,
+            'daily_scans': self.daily_scans,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        if data:
+            index.product_totals = dict(data.get('product_totals', {}))
+            index.all_time_total = data.get('all_time_total', 0)
+            index.total_amount = data.get('total_amount', 0.0)
+            index.deposit_count = data.get('deposit_count', 0)
+            index.total_scans = data.get('total_scans', 0)
+            index.daily_scans = dict(data.get('daily_scans', {}))
+        return index
+
+    def rebuild(self, history, scan_events=None):
+        # Deposits are recomputed from the history, scan counters from the
+        # scan log stream if given (otherwise they are kept)
+        self.reset_deposits()
+        for record in history:
+            self.add_deposit(record)
+
+        if scan_events is not None:
+            self.total_scans = 0
+            self.daily_scans = {}
+            for event in scan_events:
+                # Only scans that were counted as a product count for achievements
+                if event.get('product'):
+                    self.add_scan(scan_day(event.get('timestamp')))
+
+
+def scan_day(timestamp):
+    # Scan log timestamp ('%d.%m.%Y %H:%M:%S') -> 'YYYY-MM-DD'
+    try:
+        return datetime.strptime(timestamp, "%d.%m.%Y %H:%M:%S").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return "unbekannt"
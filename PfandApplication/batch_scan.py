@@ -0,0 +1,197 @@
+"""
+
+Offline Batch Scanning
+
+Scans video files, single images or folders of images without a camera,
+with the same decoding as the scanner windows, spread over all cores
+(DecodePool). A barcode that shows up again within `window` seconds in
+the same file counts as the same bottle, like the scanners do live.
+
+    python -m PfandApplication.batch_scan videos/abgabe.mp4 fotos/ -o scans.csv
+    python -m PfandApplication.batch_scan abgabe.mp4 --log --product Dose
+
+    events = batch_scan(["abgabe.mp4"])
+    write_csv(events, "scans.csv")
+
+--log appends the scans to the scan log (scan_log.jsonl). --product counts
+every scan as that product through PfandCore.record_scan, like a scan in
+the scanner window: quantity, scan achievements, barcode catalog and scan
+log stay in sync.
+
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import cv2
+
+from PfandApplication.decode_pool import DecodePool
+from PfandApplication.decoding import pyramid_decoder
+from PfandApplication.dedup import DedupCache
+from PfandApplication.frame_sources import is_image
+from PfandApplication.preprocessing import decode_cascade_pyramid
+from PfandApplication.scan_log import TIMESTAMP_FORMAT
+
+# 'scanner': like the scanner window, 'uscan': with the µScan preprocessing cascade
+DECODE_STRATEGIES = {
+    'scanner': pyramid_decoder(),
+    'uscan': decode_cascade_pyramid,
+}
+
+ScanEvent = namedtuple('ScanEvent', ['timestamp', 'barcode', 'type', 'source', 'position'])
+
+
+def expand_paths(paths):
+    # Folders -> their images (sorted by name)
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if is_image(name):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def iter_frames(path, sample_fps=10):
+    # (position in seconds, timestamp, frame); videos are sampled at sample_fps
+    started = datetime.fromtimestamp(os.path.getmtime(path))
+    if is_image(path):
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError(f"Bild konnte nicht gelesen werden: {path}")
+        yield 0.0, started, frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Video konnte nicht geöffnet werden: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / sample_fps)) if sample_fps else 1
+        index = 0
+        while True:
+            # grab() skips frames without decoding them into an image
+            if not cap.grab():
+                break
+            if index % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    position = index / fps
+                    yield position, started + timedelta(seconds=position), frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def batch_scan(paths, workers=None, mode=None, strategy='scanner', sample_fps=10, window=5.0, progress=None):
+    # Returns the ScanEvents of all files in input order. progress(source, frames) is called per file.
+    pool = DecodePool(workers, mode, decoder=DECODE_STRATEGIES[strategy])
+    # Offline nothing may be dropped: wait for room instead
+    pool.max_pending = pool.workers * 4
+    dedup = DedupCache(window)  # keyed by (file, barcode), timed by the position in the file
+    events = []
+    frames = {}  # seq -> (source, position, timestamp)
+
+    def collect():
+        for seq, detections in pool.results():
+            source, position, timestamp = frames.pop(seq)
+            for detection in detections:
+                if dedup.is_new((source, detection.data), position):
+                    events.append(ScanEvent(timestamp, detection.data, detection.type, source, position))
+
+    seq = 0
+    try:
+        for path in expand_paths(paths):
+            count = 0
+            try:
+                for position, timestamp, frame in iter_frames(path, sample_fps):
+                    while pool.full:
+                        pool.wait(0.1)
+                        collect()
+                    seq += 1
+                    frames[seq] = (path, position, timestamp)
+                    while not pool.submit(seq, frame):
+                        # No free slot right now, retry once a frame is done
+                        if not pool.pending:
+                            del frames[seq]
+                            raise ValueError(f"Bild {position:.1f}s konnte nicht dekodiert werden")
+                        pool.wait(0.1)
+                        collect()
+                    count += 1
+                    collect()
+            except (OSError, ValueError) as e:
+                print(f"Fehler bei {path}: {e}", file=sys.stderr)
+            if progress:
+                progress(path, count)
+
+        while pool.pending:
+            pool.wait(0.1)
+            collect()
+    finally:
+        pool.close()
+    return events
+
+
+def write_csv(events, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Datum', 'Barcode', 'Typ', 'Quelle', 'Position (s)'])
+        for event in events:
+            writer.writerow([event.timestamp.strftime(TIMESTAMP_FORMAT), event.barcode, event.type,
+                             event.source, f"{event.position:.1f}"])
+
+
+def record_events(events, core, product=None):
+    # Returns the keys of the achievements unlocked by the scans
+    unlocked = []
+    for event in events:
+        unlocked += core.record_scan(event.barcode, True if product else None, product,
+                                     source=f"batch:{os.path.basename(event.source)}",
+                                     timestamp=event.timestamp.strftime(TIMESTAMP_FORMAT))
+    return unlocked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m PfandApplication.batch_scan",
+                                     description="Barcodes aus Videos und Bildern scannen (ohne Kamera)")
+    parser.add_argument('paths', nargs='+', help="Videodateien, Bilder oder Ordner mit Bildern")
+    parser.add_argument('-o', '--output', help="CSV Datei für die Scans")
+    parser.add_argument('--workers', type=int, help="Anzahl Decoder (Standard: Kerne - 1)")
+    parser.add_argument('--mode', choices=['process', 'thread'], help="Decoder Prozesse oder Threads")
+    parser.add_argument('--strategy', choices=sorted(DECODE_STRATEGIES), default='scanner')
+    parser.add_argument('--fps', type=float, default=10, help="Ausgewertete Bilder pro Sekunde Video")
+    parser.add_argument('--window', type=float, default=5.0, help="Sekunden, in denen derselbe Barcode nur einmal zählt")
+    parser.add_argument('--log', action='store_true', help="Scans in das Scan Log schreiben")
+    parser.add_argument('--product', help="Scans als dieses Produkt zählen (schreibt auch das Scan Log)")
+    args = parser.parse_args(argv)
+
+    events = batch_scan(args.paths, args.workers, args.mode, args.strategy, args.fps, args.window,
+                        progress=lambda path, count: print(f"{path}: {count} Bilder", file=sys.stderr))
+    print(f"{len(events)} Scans, {len({event.barcode for event in events})} verschiedene Barcodes")
+
+    if args.output:
+        write_csv(events, args.output)
+        print(f"Gespeichert: {args.output}")
+
+    if args.log or args.product:
+        # Imported here, the core opens the storage in the working directory
+        from PfandApplication.core import PfandCore
+        core = PfandCore()
+        try:
+            if args.product and args.product not in core.products:
+                parser.error(f"Unbekanntes Produkt: {args.product}")
+            unlocked = record_events(events, core, args.product)
+            if args.product and events:
+                print(f"{args.product}: +{len(events)}")
+            for key in unlocked:
+                print(f"Erfolg freigeschaltet: {core.achievements[key].title}")
+        finally:
+            core.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+
+Decode Benchmark
+
+Measures every decode strategy of the scanners on the same frames and
+reports frames per second, p50/p95 latency and hit rate, without a camera
+or a window:
+
+    python -m PfandApplication.benchmark -o results.json
+    python -m PfandApplication.benchmark --recorded aufnahme/ --compare results.json
+
+Corpora:
+
+    synthetic  ->  rendered EAN-13/EAN-8 barcodes (frame_sources.SyntheticSource)
+                   for every combination of frame size, barcode size, blur
+                   and lighting, the same for a given seed
+    recorded   ->  frames saved with --record from a frame source,
+                   replayed as they are (frames.json holds the expected
+                   barcodes if known, otherwise any detection is a hit)
+
+    python -m PfandApplication.benchmark --record aufnahme/ --source camera:0 --count 100
+
+A hit is a frame on which the expected barcode was found, a misread a
+detection of a different barcode. --compare prints the change against an
+earlier result file (another version, another machine).
+
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from functools import partial
+from itertools import product
+
+import cv2
+import numpy as np
+
+from PfandApplication.decoding import decode_frame, decode_gray, pyramid_decoder, to_gray
+from PfandApplication.frame_sources import ImageSequenceSource, SyntheticSource, open_source
+from PfandApplication.preprocessing import PREPROCESSORS, decode_cascade, decode_cascade_pyramid
+
+MANIFEST = 'frames.json'
+
+FRAME_SIZES = ((640, 480), (1280, 720))
+MODULE_WIDTHS = {'small': (1, 2), 'large': (3, 4)}
+BLUR_LEVELS = {'sharp': 0.0, 'blurry': 2.5}
+LIGHTING_LEVELS = {'even': 0.0, 'dark': 0.7}
+
+
+def decode_variant(frame, variant):
+    # A single preprocessing variant of the µScan cascade
+    return decode_gray(PREPROCESSORS[variant](to_gray(frame)))
+
+
+STRATEGIES = {
+    'gray': decode_frame,  # scanner window without the pyramid
+    'pyramid': pyramid_decoder(),  # scanner window
+    'equalized': partial(decode_variant, variant='equalized'),
+    'threshold': partial(decode_variant, variant='threshold'),  # old µScan path (adjust_image)
+    'sharpened': partial(decode_variant, variant='sharpened'),
+    'cascade': decode_cascade,
+    'uscan': decode_cascade_pyramid,  # µScan
+}
+
+
+def synthetic_corpus(per_case=4, seed=0):
+    # [(case, frame, expected barcode)] for every size/blur/lighting combination
+    corpus = []
+    cases = product(FRAME_SIZES, MODULE_WIDTHS.items(), BLUR_LEVELS.items(), LIGHTING_LEVELS.items(), (13, 8))
+    for number, ((width, height), (size, widths), (blur_name, blur), (light_name, lighting), length) in enumerate(cases):
+        case = f"{width}x{height} {size} {blur_name} {light_name} ean{length}"
+        source = SyntheticSource(width, height, length=length, hold_frames=1, gap_frames=0, module_widths=widths,
+                                 blur=blur, lighting=lighting, seed=seed * 1000 + number, realtime=False)
+        for index in range(per_case):
+            frame, code = source.frame_at(index)
+            corpus.append((case, frame, code))
+    return corpus
+
+
+def recorded_corpus(directory):
+    expected = {}
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r', encoding='utf-8') as f:
+            expected = {entry['file']: entry.get('truth') for entry in json.load(f)['frames']}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    source = ImageSequenceSource(directory, loop=False, realtime=False)
+    corpus = []
+    for path in source.paths:
+        ret, frame = source.read()
+        if ret:
+            corpus.append(("recorded", frame, expected.get(os.path.basename(path))))
+    return corpus
+
+
+def record_frames(spec, directory, count=100, every=1):
+    # Saves count frames of a frame source (every n-th) as PNG for later replay
+    os.makedirs(directory, exist_ok=True)
+    source = open_source(spec, realtime=False)
+    if not source.isOpened():
+        raise ValueError(f"Bildquelle konnte nicht geöffnet werden: {spec}")
+    frames = []
+    try:
+        index = 0
+        while len(frames) < count:
+            ret, frame = source.read()
+            if not ret:
+                break
+            if index % every == 0:
+                name = f"frame_{len(frames):05d}.png"
+                cv2.imwrite(os.path.join(directory, name), frame)
+                entry = {'file': name}
+                if hasattr(source, 'truth'):
+                    entry['truth'] = source.truth or ''  # synthetic source: known barcode or empty frame
+                frames.append(entry)
+            index += 1
+    finally:
+        source.release()
+
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'source': spec, 'frames': frames}, f, indent=4)
+    return len(frames)
+
+
+def run_strategy(decoder, corpus):
+    latencies = []
+    hits = expected = misreads = 0
+    cases = {}  # case -> [hits, frames with a barcode]
+
+    decoder(corpus[0][1])  # warm up (first call loads libraries)
+    for case, frame, truth in corpus:
+        start = time.perf_counter()
+        detections = decoder(frame)
+        latencies.append(time.perf_counter() - start)
+
+        # truth: expected barcode, '' for an empty frame, None if unknown (any detection counts)
+        found = {detection.data for detection in detections}
+        if truth is not None:
+            misreads += len(found - {truth})
+        if truth != '':
+            hit = truth in found if truth else bool(found)
+            expected += 1
+            hits += hit
+            counts = cases.setdefault(case, [0, 0])
+            counts[0] += hit
+            counts[1] += 1
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'frames': len(corpus),
+        'fps': len(corpus) / (latencies.sum() / 1000) if latencies.sum() else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'hit_rate': hits / expected if expected else 0.0,
+        'misreads': misreads,
+        'cases': {case: case_hits / total for case, (case_hits, total) in cases.items()},
+    }
+
+
+def run_benchmark(corpora, strategies=None, progress=None):
+    # {corpus: {strategy: result}}
+    results = {}
+    for name, corpus in corpora.items():
+        if not corpus:
+            continue
+        results[name] = {}
+        for strategy in strategies or STRATEGIES:
+            results[name][strategy] = run_strategy(STRATEGIES[strategy], corpus)
+            if progress:
+                progress(name, strategy, results[name][strategy])
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def format_result(corpus, strategy, result):
+    return (f"{corpus:<10} {strategy:<10} {result['fps']:8.1f} fps  p50 {result['p50_ms']:7.1f} ms  "
+            f"p95 {result['p95_ms']:7.1f} ms  Treffer {result['hit_rate']:6.1%}  Fehllesungen {result['misreads']}")
+
+
+def compare(results, baseline):
+    # Lines "corpus strategy: fps and hit rate change" for strategies in both runs
+    lines = []
+    for corpus, strategies in results.items():
+        for strategy, result in strategies.items():
+            old = baseline.get('results', {}).get(corpus, {}).get(strategy)
+            if not old:
+                continue
+            speed = result['fps'] / old['fps'] - 1 if old['fps'] else 0.0
+            lines.append(f"{corpus:<10} {strategy:<10} fps {speed:+7.1%}  "
+                         f"Treffer {(result['hit_rate'] - old['hit_rate']) * 100:+6.1f} Punkte")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m PfandApplication.benchmark",
+                                     description="Dekodierstrategien messen (ohne Kamera und Fenster)")
+    parser.add_argument('-o', '--output', help="JSON Datei für die Ergebnisse")
+    parser.add_argument('--strategies', help=f"Kommagetrennt, Standard: alle ({','.join(STRATEGIES)})")
+    parser.add_argument('--frames', type=int, default=4, help="Synthetische Bilder je Kombination")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-synthetic', action='store_true', help="Nur aufgenommene Bilder messen")
+    parser.add_argument('--recorded', action='append', default=[], help="Ordner mit aufgenommenen Bildern")
+    parser.add_argument('--compare', help="Frühere Ergebnis Datei zum Vergleich")
+    parser.add_argument('--record', metavar='ORDNER', help="Bilder aufnehmen statt messen")
+    parser.add_argument('--source', default='camera:0', help="Bildquelle für --record (z.B. camera:0, video:datei.mp4)")
+    parser.add_argument('--count', type=int, default=100, help="Anzahl Bilder für --record")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        try:
+            count = record_frames(args.source, args.record, args.count)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{count} Bilder gespeichert: {args.record}")
+        return 0
+
+    strategies = args.strategies.split(',') if args.strategies else list(STRATEGIES)
+    unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+    if unknown:
+        parser.error(f"Unbekannte Strategie: {', '.join(unknown)}")
+
+    corpora = {}
+    if not args.no_synthetic:
+        corpora['synthetic'] = synthetic_corpus(args.frames, args.seed)
+    for directory in args.recorded:
+        corpora[os.path.basename(os.path.normpath(directory))] = recorded_corpus(directory)
+
+    results = run_benchmark(corpora, strategies,
+                            progress=lambda corpus, strategy, result: print(format_result(corpus, strategy, result)))
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'corpora': {name: len(corpus) for name, corpus in corpora.items()},
+        'results': results,
+    }
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nVergleich mit {args.compare} ({baseline.get('environment', {}).get('version')}):")
+        for line in compare(results, baseline):
+            print(line)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Gespeichert: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
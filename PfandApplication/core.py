@@ -0,0 +1,480 @@
+"""
+
+Headless Pfand Core
+
+Products/prices, quantities, deposits, achievements and scan events without
+any Tkinter. The GUI (main.py) and µScan (pfand_scanner.py) both call this,
+batch imports, benchmarks or a server can use it directly:
+
+    core = PfandCore()
+    core.increment("Dose", 12)
+    record, unlocked = core.deposit()
+    core.close()
+
+Barcodes are remembered in a catalog (barcode -> product, has Pfand
+symbol, last seen, count): a barcode the user classified once is counted
+right away by record_known_scan() the next time, without any dialog.
+
+Methods never show dialogs, they return what happened (e.g. the keys of
+newly unlocked achievements) and the caller decides how to present it.
+
+"""
+from datetime import datetime
+
+from PfandApplication.aggregates import AggregateIndex, scan_day
+from PfandApplication.history_model import ColumnarHistory
+from PfandApplication.persistence import WriteBehind
+from PfandApplication.scan_log import TIMESTAMP_FORMAT, get_scan_log
+from PfandApplication.storage import JsonStorage, open_storage, migrate_json_to_sqlite
+
+DEFAULT_PRODUCTS = ["Flaschen", "Bierflasche", "Kasten", "Dose", "Plastikflasche", "Monster", "Joghurt Glas"]
+DEFAULT_PRICES = {
+    "Flaschen": 0.25,
+    "Bierflasche": 0.20,
+    "Kasten": 3.00,
+    "Dose": 0.25,
+    "Plastikflasche": 0.25,
+    "Monster": 0.25,
+    "Joghurt Glas": 0.17,
+}
+
+DEPOSIT_ACHIEVEMENTS = {
+    1: "first_deposit",
+    10: "deposits_10",
+    50: "deposits_50",
+    100: "deposits_100",
+    150: "deposits_150"
+}
+
+SCAN_ACHIEVEMENTS = {
+    1: "first_scan",
+    50: "scans_50",
+    100: "scans_100",
+    500: "scans_500"
+}
+
+DAILY_SCAN_ACHIEVEMENTS = {
+    10: "daily_10",
+    25: "daily_25"
+}
+
+
+class Achievement:
+    def __init__(self, title, description, condition_type, condition_value):
+        self.title = title
+        self.description = description
+        self.condition_type = condition_type
+        self.condition_value = condition_value
+        self.unlocked = False
+        self.unlock_date = None
+
+
+def initialize_achievements():
+    return {
+        "each_100": Achievement("Krass, Weiter So!", "Du hast bis jetzt 100 von jedem Element gesammelt!", "each_element", 100),
+        "each_500": Achievement("Adlersson wäre neidisch!", "Adlersson wäre neidisch auf dich! Du hast 500 von jedem Element gesammelt!", "each_element", 500),
+        "each_1000": Achievement("Arbeitslos I", "Arbeitsamt hat angerufen! Du hast 1000 von jedem Element gesammelt!", "each_element", 1000),
+        "total_2000": Achievement("Arbeitslos II", "Das Arbeitsamt hat angst vor dir! Du hast 2000 totale Elemente gesammelt!", "total_elements", 2000),
+        "total_3000": Achievement("Arbeitslos III", "Drachenlord hat angst vor dir! Du hast mehr wie 3000 Elemente gesammelt!", "total_elements", 3000),
+        "total_over_3000": Achievement("Krankhafte Sucht!", "Du hast echt einen Vogel! Pfandangel #1! Du hast >3000 gesammelt!", "total_elements", 3001),
+        "first_deposit": Achievement("Depositer!", "Guter Anfang!", "deposits", 1),
+        "deposits_10": Achievement("Depositer I", "Cool, Weiter So!", "deposits", 10),
+        "deposits_50": Achievement("Depositer II", "WoW, Echt viele Abgaben!", "deposits", 50),
+        "deposits_100": Achievement("Depositer III", "Du bist der Meister der Abgaben!", "deposits", 100),
+        "deposits_150": Achievement("Meister Depositer", "Der Pfandautomat hat Angst vor dir, so viel wie du Abgegeben hast müsstest du eine Villa besitzen!", "deposits", 150),
+        # New scanner achievements
+        "first_scan": Achievement("Scanner Neuling", "Du hast deinen ersten Barcode gescannt!", "scans", 1),
+        "scans_50": Achievement("Scanner Pro", "50 Barcodes gescannt - du kennst dich aus!", "scans", 50),
+        "scans_100": Achievement("Scanner Meister", "100 Barcodes gescannt - der Profi ist da!", "scans", 100),
+        "scans_500": Achievement("Scanner Legende", "500 Barcodes gescannt - legendärer Scanner Status erreicht!", "scans", 500),
+        "daily_10": Achievement("Tages Champion", "10 Barcodes an einem Tag gescannt!", "daily_scans", 10),
+        "daily_25": Achievement("Tages Meister", "25 Barcodes an einem Tag gescannt - sehr fleißig!", "daily_scans", 25)
+    }
+
+
+class PfandCore:
+    def __init__(self, storage=None, scan_log=None, write_delay_ms=500):
+        # JSON files or SQLite database (see storage.py)
+        self.storage = storage or open_storage()
+        self.scan_log = scan_log or get_scan_log()
+        # Quantities/aggregates are written behind (coalesced), save_quantities() writes immediately
+        self.quantity_writer = WriteBehind(lambda quantities: self.storage.save_quantities(quantities), write_delay_ms)
+        self.aggregate_writer = WriteBehind(lambda aggregates: self.storage.save_aggregates(aggregates), write_delay_ms)
+        # Only the changed barcodes are written (see update_catalog in storage.py)
+        self.catalog_writer = WriteBehind(lambda changes: self.storage.update_catalog(changes), write_delay_ms,
+                                          merge=True)
+        self.listeners = []  # called with the changed product (None = everything)
+
+        self.load_products()
+        self.load_quantities()
+        self._deposit_history = None  # loaded on first use, see deposit_history
+        self.aggregates = self.load_aggregates()
+        self._history_model = None  # built on first use, see history_model
+
+        self.achievements = initialize_achievements()
+        self.load_achievements()
+
+        # Barcode -> product/has_pfand of every barcode classified before
+        self.catalog = self.load_catalog()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, product=None):
+        for callback in list(self.listeners):
+            try:
+                callback(product)
+            except Exception as e:
+                print(f"Error in core listener: {e}")
+
+    # Products
+
+    def load_products(self):
+        stored = self.storage.load_products()
+        if stored is not None:
+            self.products, self.prices = stored
+        else:
+            # Default products if nothing is stored yet
+            self.products = list(DEFAULT_PRODUCTS)
+            self.prices = dict(DEFAULT_PRICES)
+            self.save_products()
+
+    def save_products(self):
+        self.storage.save_products(self.products, self.prices)
+
+    def add_product(self, name, price):
+        if not name:
+            raise ValueError("Produktname fehlt")
+        if name in self.products:
+            raise ValueError(f"Produkt '{name}' existiert bereits")
+        self.products.append(name)
+        self.prices[name] = price
+        self.save_products()
+        self._notify()
+
+    def remove_product(self, name):
+        self.products.remove(name)
+        del self.prices[name]
+        self.save_products()
+        self._notify()
+
+    # Quantities
+
+    def load_quantities(self):
+        self.quantities = self.storage.load_quantities()
+        if self.quantities is None:
+            self.quantities = {product: 0 for product in self.products}
+
+    def mark_quantities_dirty(self):
+        self.quantity_writer.mark_dirty(self.quantities)
+
+    def save_quantities(self):
+        self.mark_quantities_dirty()
+        self.quantity_writer.flush()
+
+    def reload_quantities(self):
+        # Write pending changes first
+        self.quantity_writer.flush()
+        self.load_quantities()
+
+    def set_quantity(self, product, quantity):
+        if quantity < 0:
+            raise ValueError("Menge darf nicht negativ sein")
+        self.quantities[product] = quantity
+        self.mark_quantities_dirty()
+        self._notify(product)
+
+    def increment(self, product, count=1):
+        self.quantities[product] = self.quantities.get(product, 0) + count
+        self.mark_quantities_dirty()
+        self._notify(product)
+        return self.quantities[product]
+
+    def reset_quantities(self):
+        self.quantities = {product: 0 for product in self.products}
+        self.mark_quantities_dirty()
+        self._notify()
+
+    def has_saved_quantities(self):
+        return self.storage.has_quantities()
+
+    def delete_quantities(self):
+        self.quantity_writer.discard()
+        self.storage.delete_quantities()
+        self.quantities = {product: 0 for product in self.products}
+        self._notify()
+
+    def current_total(self):
+        return sum(self.quantities.get(product, 0) * self.prices[product] for product in self.products)
+
+    # Deposits
+
+    def load_deposit_history(self):
+        try:
+            return self.storage.load_deposit_history()
+        except Exception as e:
+            print(f"Error loading deposit history: {e}")
+            return []
+
+    @property
+    def deposit_history(self):
+        # The full list is only loaded when it is really needed (history
+        # window, export, import), counts and totals come from the aggregates
+        if self._deposit_history is None:
+            self._deposit_history = self.load_deposit_history()
+        return self._deposit_history
+
+    def read_deposit_history(self):
+        # Snapshot for a worker thread (export), the history is not loaded into the core
+        history = self._deposit_history
+        if history is not None:
+            return list(history)
+        return self.storage.read_deposit_history()
+
+    def deposit_count(self):
+        if self._deposit_history is not None:
+            return len(self._deposit_history)
+        try:
+            return self.storage.deposit_count()
+        except Exception as e:
+            print(f"Error counting deposits: {e}")
+            return 0
+
+    def deposit(self, date=None):
+        # Hands in the current quantities, returns (record, unlocked achievement keys)
+        if date is None:
+            date = datetime.now()
+        if not isinstance(date, str):
+            date = date.strftime("%d.%m.%Y")
+
+        record = {
+            'date': date,
+            'quantities': dict(self.quantities),
+            'total': self.current_total()
+        }
+        self.add_deposit(record)
+        self.reset_quantities()
+        return record, self.check_achievements()
+
+    def add_deposit(self, record):
+        # Single append (journal line / row insert) instead of rewriting the whole history
+        if self._deposit_history is not None:
+            self._deposit_history.append(record)
+        self.aggregates.add_deposit(record)
+        if self._history_model is not None:
+            self._history_model.append(record)
+        self.storage.append_deposit(record)
+        self.save_aggregates()
+        self.aggregate_writer.flush()
+
+    def add_deposits(self, records):
+        # Bulk insert (CSV import): one transaction, returns newly unlocked achievement keys
+        self.storage.append_deposits(records)
+        for record in records:
+            if self._deposit_history is not None:
+                self._deposit_history.append(record)
+            self.aggregates.add_deposit(record)
+            if self._history_model is not None:
+                self._history_model.append(record)
+        self.save_aggregates()
+        self.aggregate_writer.flush()
+        return self.check_achievements()
+
+    def clear_deposit_history(self):
+        self._deposit_history = []
+        self.storage.clear_deposit_history()
+        self._history_model = None
+        self.aggregates.reset_deposits()
+        self.save_aggregates()
+
+    @property
+    def history_model(self):
+        if self._history_model is None:
+            self._history_model = ColumnarHistory.from_history(self.deposit_history, self.products)
+        return self._history_model
+
+    # Aggregates
+
+    def load_aggregates(self):
+        aggregates = AggregateIndex.from_dict(self.storage.load_aggregates())
+        # Missing or out of sync (e.g. crash between deposit and aggregate write) -> rebuild
+        if aggregates.deposit_count != self.deposit_count():
+            aggregates.rebuild(self.deposit_history)
+            self.storage.save_aggregates(aggregates.to_dict())
+        return aggregates
+
+    def save_aggregates(self):
+        self.aggregate_writer.mark_dirty(self.aggregates.to_dict())
+
+    def rebuild_aggregates(self):
+        # Scan counters are recounted from the persistent scan log
+        self.aggregates.rebuild(self.deposit_history, self.scan_log.iter_events())
+        # Through the writer: a timer that is already writing could race a direct write
+        self.aggregate_writer.mark_dirty(self.aggregates.to_dict())
+        self.aggregate_writer.flush()
+        return self.check_achievements()
+
+    # Achievements
+
+    def load_achievements(self):
+        data = self.storage.load_achievements()
+        for key, achievement_data in data.items():
+            if key in self.achievements:
+                self.achievements[key].unlocked = achievement_data['unlocked']
+                self.achievements[key].unlock_date = achievement_data['unlock_date']
+
+    def save_achievements(self):
+        data = {
+            key: {
+                'unlocked': achievement.unlocked,
+                'unlock_date': achievement.unlock_date
+            }
+            for key, achievement in self.achievements.items()
+        }
+        self.storage.save_achievements(data)
+
+    def clear_achievements(self):
+        for achievement in self.achievements.values():
+            achievement.unlocked = False
+            achievement.unlock_date = None
+        self.storage.clear_achievements()
+
+    def unlock_achievement(self, achievement_key):
+        achievement = self.achievements[achievement_key]
+        if achievement.unlocked:
+            return False
+        achievement.unlocked = True
+        achievement.unlock_date = datetime.now().strftime("%d.%m.%Y")
+        self.save_achievements()
+        return True
+
+    def check_achievements(self):
+        # Reads the running aggregates only, no pass over the history
+        product_totals = self.aggregates.product_totals
+        all_time_total = self.aggregates.all_time_total
+        deposits_count = self.aggregates.deposit_count
+        unlocked = []
+
+        for achievement in ["each_100", "each_500", "each_1000"]:
+            if not self.achievements[achievement].unlocked and self.products:
+                if all(product_totals.get(product, 0) >= self.achievements[achievement].condition_value
+                       for product in self.products):
+                    unlocked.append(achievement)
+
+        for achievement in ["total_2000", "total_3000", "total_over_3000"]:
+            if not self.achievements[achievement].unlocked and all_time_total >= self.achievements[achievement].condition_value:
+                unlocked.append(achievement)
+
+        for count, achievement_key in DEPOSIT_ACHIEVEMENTS.items():
+            if not self.achievements[achievement_key].unlocked and deposits_count >= count:
+                unlocked.append(achievement_key)
+
+        return [key for key in unlocked if self.unlock_achievement(key)]
+
+    # Scans
+
+    def record_scan(self, barcode, has_pfand, product=None, source=None, timestamp=None, remember=True):
+        # Logs the scan; with a product it is counted and the scan achievements
+        # are checked. Returns the keys of newly unlocked achievements.
+        # remember=False for a has_pfand the user did not confirm (guessed from
+        # the prefix table): logged, but not put into the catalog.
+        try:
+            self.scan_log.append(barcode, has_pfand, product, source=source, timestamp=timestamp)
+        except Exception as e:
+            print(f"Error writing scan log: {e}")
+        self._update_catalog(barcode, has_pfand if remember else None, product, timestamp)
+
+        if not product:
+            return []
+
+        self.increment(product)
+        # Counted on the day of the scan, like rebuild_aggregates() does from the log
+        daily_scans = self.aggregates.add_scan(scan_day(timestamp) if timestamp else None)
+        total_scans = self.aggregates.total_scans
+        self.save_aggregates()
+
+        unlocked = []
+        for count, achievement_key in SCAN_ACHIEVEMENTS.items():
+            if total_scans >= count and self.unlock_achievement(achievement_key):
+                unlocked.append(achievement_key)
+        for count, achievement_key in DAILY_SCAN_ACHIEVEMENTS.items():
+            if daily_scans >= count and self.unlock_achievement(achievement_key):
+                unlocked.append(achievement_key)
+        return unlocked
+
+    # Barcode catalog
+
+    def load_catalog(self):
+        try:
+            return self.storage.load_catalog()
+        except Exception as e:
+            print(f"Error loading barcode catalog: {e}")
+            return {}
+
+    def lookup_barcode(self, barcode):
+        # Catalog entry if the barcode was classified before (product chosen or
+        # no Pfand symbol), else None -> ask the user
+        entry = self.catalog.get(barcode)
+        if entry is None:
+            return None
+        if entry['has_pfand'] is False or entry['product'] in self.prices:
+            return entry
+        return None
+
+    def remember_barcode(self, barcode, has_pfand, product=None):
+        # Classifies a barcode without counting a scan
+        entry = self.catalog.setdefault(barcode, {'product': None, 'has_pfand': None, 'last_seen': None, 'count': 0})
+        entry['has_pfand'] = has_pfand
+        if product or not has_pfand:
+            entry['product'] = product
+        self._catalog_changed(barcode)
+        return entry
+
+    def forget_barcode(self, barcode):
+        if self.catalog.pop(barcode, None) is not None:
+            self._catalog_changed(barcode)
+
+    def record_known_scan(self, barcode, source=None, timestamp=None):
+        # Counts a scan of a catalogued barcode without asking anything.
+        # Returns (entry, unlocked achievement keys), entry None if unknown.
+        entry = self.lookup_barcode(barcode)
+        if entry is None:
+            return None, []
+        return entry, self.record_scan(barcode, entry['has_pfand'], entry['product'], source, timestamp)
+
+    def _update_catalog(self, barcode, has_pfand, product, timestamp):
+        entry = self.remember_barcode(barcode, has_pfand, product) if has_pfand is not None else self.catalog.get(barcode)
+        if entry is not None:
+            entry['last_seen'] = timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+            entry['count'] += 1
+            self._catalog_changed(barcode)
+
+    def _catalog_changed(self, barcode):
+        # None -> forgotten, deleted on the next write
+        self.catalog_writer.mark_dirty({barcode: self.catalog.get(barcode)})
+
+    # Storage
+
+    def migrate_to_sqlite(self):
+        if not isinstance(self.storage, JsonStorage):
+            raise ValueError("Die Daten liegen bereits in der SQLite Datenbank")
+        self.quantity_writer.mark_dirty(self.quantities)
+        self.quantity_writer.flush()
+        self.aggregate_writer.flush()
+        self.catalog_writer.flush()
+        self.storage, migrated = migrate_json_to_sqlite()
+        return migrated
+
+    def flush(self):
+        self.quantity_writer.flush()
+        self.aggregate_writer.flush()
+        self.catalog_writer.flush()
+
+    def close(self):
+        # Write everything that is still pending
+        self.flush()
+        self.storage.close()
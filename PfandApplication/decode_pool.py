@@ -0,0 +1,196 @@
+"""
+
+Decode Pool
+
+Runs barcode decoding on several worker processes (or threads) so decoding
+can keep up with the camera on multi-core machines.
+
+    pool = DecodePool(mode='process')
+    pool.submit(seq, frame)          # False if the frame was dropped
+    for seq, detections in pool.results():
+        ...
+
+- process mode: frames are copied into a ring of shared memory slots and
+  only the slot name is sent to the worker, the 1280x720 arrays are never
+  pickled. thread mode passes the frame directly (pyzbar and OpenCV
+  release the GIL while they work).
+- results() returns results in submit order, a slow frame holds back the
+  ones after it until it is done.
+- backpressure: at most max_pending frames are in flight. A new frame
+  replaces the oldest one that has not started yet, if all of them are
+  already running the new frame is dropped.
+- a frame bigger than the slots (e.g. a full frame after ROI crops) gets
+  new, bigger slots, the old ones are unlinked once their frames are done.
+
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from PfandApplication.decoding import decode_frame
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+# Worker process side
+
+_attached = OrderedDict()  # slot name -> SharedMemory, reused for every frame
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is not None:
+        _attached.move_to_end(name)
+        return shm
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block with the resource tracker.
+        # Spawned workers share the owner's tracker, where the block is
+        # already registered, so this is a no-op and the owner still unlinks it.
+        shm = shared_memory.SharedMemory(name=name)
+    _attached[name] = shm
+    while len(_attached) > 32:
+        _attached.popitem(last=False)[1].close()
+    return shm
+
+
+def _decode_shared(name, shape, dtype, decoder, args):
+    shm = _attach(name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    try:
+        return decoder(frame, *args)
+    finally:
+        del frame
+
+
+# Owner side
+
+class DecodePool:
+    def __init__(self, workers=None, mode=None, decoder=decode_frame, max_pending=None):
+        self.workers = workers or default_workers()
+        # Separate processes only pay off with spare cores
+        self.mode = mode or ('process' if self.workers > 1 else 'thread')
+        self.decoder = decoder  # module level function in process mode (it is pickled by name)
+        self.max_pending = max_pending or self.workers * 2
+
+        if self.mode == 'process':
+            # spawn: forking a process that runs Tk and camera threads is not safe
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=get_context('spawn'))
+        elif self.mode == 'thread':
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="decode")
+        else:
+            raise ValueError(f"Unbekannter Modus: {self.mode}")
+
+        # Reentrant: cancel() runs the slot release callback right away
+        self.lock = threading.RLock()
+        self.pending = OrderedDict()  # seq -> (future, submit time, slot)
+        self.slots = []
+        self.free_slots = []
+        self.slot_size = 0
+
+        self.submitted = 0
+        self.dropped = 0
+        self.last_latency = 0.0  # seconds from submit to result of the last frame
+
+    @property
+    def full(self):
+        with self.lock:
+            return len(self.pending) >= self.max_pending
+
+    def submit(self, seq, frame, *args):
+        with self.lock:
+            if len(self.pending) >= self.max_pending and not self._cancel_oldest():
+                self.dropped += 1
+                return False
+
+            slot = None
+            if self.mode == 'process':
+                slot = self._take_slot(frame.nbytes)
+                if slot is None:
+                    self.dropped += 1
+                    return False
+                np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+                future = self.executor.submit(_decode_shared, slot.name, frame.shape, frame.dtype.str,
+                                              self.decoder, args)
+            else:
+                future = self.executor.submit(self.decoder, frame, *args)
+
+            self.pending[seq] = (future, time.perf_counter(), slot)
+            self.submitted += 1
+            if slot is not None:
+                future.add_done_callback(lambda f, slot=slot: self._release_slot(slot))
+            return True
+
+    def results(self):
+        # Finished results in submit order; dropped frames are skipped
+        results = []
+        with self.lock:
+            while self.pending:
+                seq, (future, submitted, _) = next(iter(self.pending.items()))
+                if not future.done():
+                    break
+                del self.pending[seq]
+                if future.cancelled():
+                    continue
+                try:
+                    detections = future.result()
+                except Exception as e:
+                    print(f"Error decoding frame {seq}: {e}")
+                    continue
+                self.last_latency = time.perf_counter() - submitted
+                results.append((seq, detections))
+        return results
+
+    def wait(self, timeout=None):
+        # Blocks until the oldest pending frame is done (or timeout)
+        with self.lock:
+            if not self.pending:
+                return
+            future = next(iter(self.pending.values()))[0]
+        wait([future], timeout, return_when=FIRST_COMPLETED)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            self.pending.clear()
+            for slot in self.slots:
+                slot.close()
+                slot.unlink()
+            self.slots = []
+            self.free_slots = []
+
+    def _cancel_oldest(self):
+        for seq, (future, _, _) in self.pending.items():
+            if future.cancel():
+                del self.pending[seq]
+                self.dropped += 1
+                return True
+        return False
+
+    def _take_slot(self, size):
+        if size > self.slot_size:
+            # Frame size grew: slots in use are retired, _release_slot unlinks them
+            for slot in self.free_slots:
+                slot.close()
+                slot.unlink()
+            self.slots = [shared_memory.SharedMemory(create=True, size=size)
+                          for _ in range(self.max_pending + self.workers)]
+            self.free_slots = list(self.slots)
+            self.slot_size = size
+        return self.free_slots.pop() if self.free_slots else None
+
+    def _release_slot(self, slot):
+        with self.lock:
+            if slot in self.slots:
+                self.free_slots.append(slot)
+            else:
+                slot.close()
+                slot.unlink()
@@ -0,0 +1,110 @@
+"""
+
+Barcode Decoding
+
+Thin layer over pyzbar that returns plain Detection tuples (data as str,
+polygon as list of (x, y) in frame coordinates), so results can be passed
+between threads without keeping pyzbar objects around.
+
+EAN/UPC results with a wrong check digit (misreads) are dropped.
+
+decode_pyramid() tries a downscaled copy first and only escalates to the
+next (larger) scale if nothing was found. Detection.scale tells at which
+scale a barcode was found, PyramidStats turns that into hit rates.
+
+"""
+from collections import namedtuple
+from functools import partial
+
+import cv2
+from pyzbar.pyzbar import decode
+
+from PfandApplication.ean import is_valid
+
+# scale/variant: pyramid scale and preprocessing variant (preprocessing.py) that found it
+Detection = namedtuple('Detection', ['data', 'type', 'polygon', 'scale', 'variant'], defaults=(1.0, None))
+
+# Tried in this order, 1.0 = full resolution
+DEFAULT_SCALES = (0.5, 1.0)
+
+
+def to_gray(frame):
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def decode_gray(gray):
+    detections = []
+    for barcode in decode(gray):
+        data = barcode.data.decode('utf-8')
+        # Misreads with a wrong GS1 check digit never reach the scanners
+        if not is_valid(data, barcode.type):
+            continue
+        polygon = [(point.x, point.y) for point in barcode.polygon]
+        detections.append(Detection(data, barcode.type, polygon))
+    return detections
+
+
+def decode_frame(frame):
+    return decode_gray(to_gray(frame))
+
+
+def map_detection(detection, offset=(0, 0), scale=1.0):
+    # Polygon of a detection in a crop/scaled copy -> frame coordinates
+    dx, dy = offset
+    polygon = [(int(round(x / scale)) + dx, int(round(y / scale)) + dy) for x, y in detection.polygon]
+    return detection._replace(polygon=polygon)
+
+
+def pyramid_levels(frame, scales=DEFAULT_SCALES, min_size=120):
+    # (scale, image, last) for each scale, scales that would make the image
+    # smaller than min_size pixels are skipped (the last one never)
+    height, width = frame.shape[:2]
+    for i, scale in enumerate(scales):
+        last = i == len(scales) - 1
+        if scale != 1.0 and not last and min(height, width) * scale < min_size:
+            continue
+        image = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        yield scale, image, last
+
+
+def scaled_detections(detections, scale):
+    return [map_detection(detection, scale=scale)._replace(scale=scale) for detection in detections]
+
+
+def decode_pyramid(frame, *args, scales=DEFAULT_SCALES, decoder=decode_frame, min_size=120):
+    # decoder(image, *args) on each scale until something is found
+    for scale, image, _ in pyramid_levels(frame, scales, min_size):
+        detections = decoder(image, *args)
+        if detections:
+            return scaled_detections(detections, scale)
+    return []
+
+
+def pyramid_decoder(scales=DEFAULT_SCALES, decoder=decode_frame):
+    # Picklable decoder for the DecodePool
+    return partial(decode_pyramid, scales=tuple(scales), decoder=decoder)
+
+
+class PyramidStats:
+    # Hit rate per scale: every scale up to the one that found something was tried
+    def __init__(self, scales=DEFAULT_SCALES):
+        self.scales = tuple(scales)
+        self.attempts = {scale: 0 for scale in self.scales}
+        self.hits = {scale: 0 for scale in self.scales}
+
+    def record(self, detections):
+        hit = detections[0].scale if detections else None
+        for scale in self.scales:
+            self.attempts[scale] += 1
+            if scale == hit:
+                self.hits[scale] += 1
+                break
+
+    def hit_rates(self):
+        return {scale: self.hits[scale] / self.attempts[scale] if self.attempts[scale] else 0.0
+                for scale in self.scales}
+
+    def summary(self):
+        return "  ".join(f"{scale:g}x: {rate:.0%}" for scale, rate in self.hit_rates().items())
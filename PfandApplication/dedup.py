@@ -0,0 +1,87 @@
+"""
+
+Scan Deduplication
+
+A barcode is decoded on many frames in a row while the bottle is held in
+front of the camera, but it should only count once. DedupCache remembers
+when each barcode was last seen:
+
+    - seen again within `window` seconds  ->  the same bottle (hit), the
+                                              window starts over
+    - not seen for longer                 ->  new scan
+
+The entries are kept in an OrderedDict sorted by the time they were last
+seen, so the expired ones are always at the front and are dropped there,
+and at most max_size barcodes are kept (least recently seen go first).
+Every call is O(1) (amortized), memory stays bounded however long the
+scanner runs.
+
+    recent = DedupCache(window=5.0)
+    if recent.is_new(barcode):
+        ... count it ...
+
+Keys can be anything hashable, e.g. (file, barcode) in the batch scan,
+which passes the video position as `now`.
+
+"""
+import time
+from collections import OrderedDict
+
+DEFAULT_WINDOW = 5.0
+
+
+class DedupCache:
+    def __init__(self, window=DEFAULT_WINDOW, max_size=1024):
+        self.window = window
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> last seen, oldest first
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def is_new(self, key, now=None):
+        # True if key was not seen within the window; records it either way
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+
+        new = not self.seen(key, now)
+        if new:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.entries[key] = now
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+        return new
+
+    def seen(self, key, now=None):
+        # Like is_new without recording anything
+        now = time.monotonic() if now is None else now
+        last = self.entries.get(key)
+        return last is not None and now - last <= self.window
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self.entries:
+            key, last = next(iter(self.entries.items()))
+            if now - last <= self.window:
+                break
+            del self.entries[key]
+            self.expired += 1
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def summary(self):
+        return f"{len(self.entries)} active, {self.hits} repeats, {self.expired} expired, {self.evicted} evicted"
@@ -0,0 +1,116 @@
+"""
+
+Append-only Journal for the Deposit History
+
+Every deposit is appended as a single line to <snapshot>.journal instead of
+rewriting the whole history. Once the journal gets long it is folded into
+the snapshot file (compaction). Loading = snapshot + replay of the tail.
+A half written last line (crash) is cut off on load, so the next append
+starts on a fresh line.
+
+"""
+import json
+import os
+
+
+class DepositJournal:
+    def __init__(self, snapshot_path='deposit_history.json', compact_every=500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + '.journal'
+        self.compact_every = compact_every
+        self.seq = 0          # sequence number of the last written record
+        self.tail_length = 0  # records in the journal that are not in the snapshot yet
+
+    def load(self):
+        self._truncate_torn_tail()
+        history, self.seq, self.tail_length = self.read()
+        return history
+
+    def read(self):
+        # (history, last seq, records in the journal) without changing any
+        # state, so another thread can read while deposits are appended
+        history, snapshot_seq = self._read_snapshot()
+        seq = snapshot_seq
+        tail_length = 0
+
+        for entry in self._read_journal():
+            # Entries up to snapshot_seq are already part of the snapshot
+            # (compaction was interrupted before the journal got truncated)
+            if entry['seq'] <= snapshot_seq:
+                continue
+            history.append(entry['record'])
+            seq = entry['seq']
+            tail_length += 1
+
+        return history, seq, tail_length
+
+    def append(self, record):
+        self.seq += 1
+        line = json.dumps({'seq': self.seq, 'record': record}, separators=(',', ':'))
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+        self.tail_length += 1
+
+    @property
+    def needs_compaction(self):
+        return self.tail_length >= self.compact_every
+
+    def compact(self, history):
+        # Write the new snapshot atomically, then drop the journal.
+        # A crash in between is harmless, the seq numbers filter duplicates.
+        data = {'seq': self.seq, 'deposits': history}
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.tail_length = 0
+
+    def clear(self):
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.seq = 0
+        self.tail_length = 0
+
+    def _truncate_torn_tail(self):
+        # Everything after the last newline is a line that was never finished
+        try:
+            with open(self.journal_path, 'rb+') as f:
+                data = f.read()
+                if data and not data.endswith(b'\n'):
+                    print(f"Removing unfinished last line of {self.journal_path}")
+                    f.truncate(data.rfind(b'\n') + 1)
+        except FileNotFoundError:
+            return
+
+    def _read_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return [], 0
+
+        # Old versions stored a plain list of deposits
+        if isinstance(data, list):
+            return data, 0
+        return data.get('deposits', []), data.get('seq', 0)
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Half written line from a crash, everything before is fine
+                        print(f"Skipping damaged journal line in {self.journal_path}")
+        except FileNotFoundError:
+            return
@@ -0,0 +1,135 @@
+"""
+
+Video Device Discovery
+
+Finding the cameras used to mean opening cv2.VideoCapture(0..9) one after
+the other, which takes seconds for every index without a device. Now:
+
+    Linux    ->  /sys/class/video4linux lists the devices (with their
+                 names) without opening any of them
+    others   ->  all indices are probed at the same time, an index that
+                 does not answer within `timeout` seconds counts as absent
+
+The result is cached in video_devices.json. On Linux the cache is checked
+against the device list in /sys (plugged in/out -> probed again), the
+probed result expires after `ttl` seconds. invalidate() forgets it, e.g.
+when a cached camera could not be opened.
+
+    devices = DeviceCache().devices()    ->  [VideoDevice(index=0, name='HD Webcam'), ...]
+
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+DEVICE_CACHE_PATH = 'video_devices.json'
+SYSFS_PATH = '/sys/class/video4linux'
+
+VideoDevice = namedtuple('VideoDevice', ['index', 'name'])
+
+
+def read_sysfs(path=SYSFS_PATH):
+    # None if there is no sysfs (not Linux), else the capture devices
+    if not os.path.isdir(path):
+        return None
+    devices = []
+    for entry in os.listdir(path):
+        if not entry.startswith('video') or not entry[5:].isdigit():
+            continue
+        # Webcams often add a second node (index 1) for metadata, it delivers no frames
+        if read_attribute(os.path.join(path, entry, 'index'), '0') != '0':
+            continue
+        devices.append(VideoDevice(int(entry[5:]), read_attribute(os.path.join(path, entry, 'name'), entry)))
+    return sorted(devices)
+
+
+def read_attribute(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or default
+    except OSError:
+        return default
+
+
+def sysfs_signature(path=SYSFS_PATH):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return None
+
+
+def probe_devices(max_devices=10, timeout=3.0):
+    # Opens all indices in parallel; threads still hanging after timeout are abandoned
+    found = {}
+    lock = threading.Lock()
+
+    def probe(index):
+        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW if os.name == 'nt' else 0)
+        try:
+            if cap.isOpened():
+                with lock:
+                    found[index] = VideoDevice(index, "")  # OpenCV knows no device names
+        finally:
+            cap.release()
+
+    threads = [threading.Thread(target=probe, args=(index,), daemon=True) for index in range(max_devices)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    with lock:
+        return [found[index] for index in sorted(found)]
+
+
+class DeviceCache:
+    def __init__(self, path=DEVICE_CACHE_PATH, ttl=24 * 3600, max_devices=10, timeout=3.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_devices = max_devices
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+    def cached(self):
+        # Cached devices if still valid, else None (never blocks on a camera)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get('signature') != sysfs_signature() or time.time() - data.get('time', 0) > self.ttl:
+            return None
+        return [VideoDevice(*device) for device in data.get('devices', [])]
+
+    def devices(self, refresh=False):
+        with self.lock:
+            if not refresh:
+                devices = self.cached()
+                if devices is not None:
+                    return devices
+
+            devices = read_sysfs()
+            if devices is None:
+                devices = probe_devices(self.max_devices, self.timeout)
+            self.store(devices)
+            return devices
+
+    def store(self, devices):
+        data = {'time': time.time(), 'signature': sysfs_signature(), 'devices': [list(device) for device in devices]}
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving device cache: {e}")
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
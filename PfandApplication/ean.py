@@ -0,0 +1,131 @@
+"""
+
+EAN-13 / EAN-8 / UPC
+
+GS1 check digits, validation of decoded barcodes and rendering of EAN
+barcodes as images (synthetic frame source, benchmark corpus).
+
+    check_digit("400638133393")          ->  1
+    complete("400638133393")             ->  "4006381333931"
+    is_valid("4006381333931")            ->  True
+    is_valid("4006381333932")            ->  False (misread)
+    normalize("01234565", "UPCE")        ->  "0012345000065" (as EAN-13)
+    render_ean("4006381333931")          ->  grayscale image (numpy)
+
+Decoders report the symbology as e.g. 'EAN13', 'EAN-8' or 'UPCA'. Only
+GS1 symbologies are validated, other barcodes (QR codes, Code 128) pass.
+
+"""
+import cv2
+import numpy as np
+
+# Module patterns of the digits (1 = bar)
+L_CODES = ['0001101', '0011001', '0010011', '0111101', '0100011',
+           '0110001', '0101111', '0111011', '0110111', '0001011']
+G_CODES = ['0100111', '0110011', '0011011', '0100001', '0011101',
+           '0111001', '0000101', '0010001', '0001001', '0010111']
+R_CODES = ['1110010', '1100110', '1101100', '1000010', '1011100',
+           '1001110', '1010000', '1000100', '1001000', '1110100']
+# EAN-13: the first digit selects L/G for the left half
+PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG',
+          'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL']
+
+GUARD = '101'
+CENTER = '01010'
+
+# Symbologies with a GS1 mod 10 check digit (normalized names, see symbology())
+GS1_TYPES = ('EAN13', 'EAN8', 'UPCA', 'UPCE', 'ISBN13')
+
+
+def check_digit(digits):
+    # GS1 mod 10: weights 3 and 1 alternating from the right
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10
+
+
+def complete(digits):
+    return digits + str(check_digit(digits))
+
+
+def symbology(barcode_type):
+    # 'EAN-13' / 'ean13' / 'EAN13' -> 'EAN13'
+    return (barcode_type or '').replace('-', '').replace('_', '').upper()
+
+
+def upce_to_upca(code):
+    # 8 digit UPC-E (number system, 6 digits, check digit) -> 12 digit UPC-A
+    number_system, digits, check = code[0], code[1:7], code[7]
+    last = digits[5]
+    if last in '012':
+        body = digits[:2] + last + '0000' + digits[2:5]
+    elif last == '3':
+        body = digits[:3] + '00000' + digits[3:5]
+    elif last == '4':
+        body = digits[:4] + '00000' + digits[4]
+    else:
+        body = digits[:5] + '0000' + last
+    return number_system + body + check
+
+
+def normalize(code, barcode_type=None):
+    # EAN-13 for EAN-13/UPC-A/UPC-E, EAN-8 stays 8 digits; None if not a GS1 number
+    if not code or not code.isdigit():
+        return None
+    kind = symbology(barcode_type)
+    if kind == 'UPCE' and len(code) == 8:
+        code = upce_to_upca(code)
+    if len(code) == 12:
+        code = '0' + code
+    if len(code) not in (8, 13):
+        return None
+    return code
+
+
+def is_valid(code, barcode_type=None):
+    # Check digit test; without a type every 8/12/13 digit number is taken as GS1
+    kind = symbology(barcode_type)
+    if barcode_type and kind not in GS1_TYPES:
+        return True
+    normalized = normalize(code, kind)
+    return normalized is not None and check_digit(normalized[:-1]) == int(normalized[-1])
+
+
+def modules(code):
+    # '0'/'1' module string of a complete EAN-13 or EAN-8
+    if not code.isdigit() or len(code) not in (8, 13):
+        raise ValueError(f"Kein EAN-8/EAN-13: {code}")
+
+    if len(code) == 13:
+        parity, left, right = PARITY[int(code[0])], code[1:7], code[7:]
+    else:
+        parity, left, right = 'LLLL', code[:4], code[4:]
+
+    bars = GUARD
+    for digit, kind in zip(left, parity):
+        bars += (L_CODES if kind == 'L' else G_CODES)[int(digit)]
+    bars += CENTER
+    for digit in right:
+        bars += R_CODES[int(digit)]
+    return bars + GUARD
+
+
+def render_ean(code, module_width=3, height=None, quiet_zone=10):
+    # White background with black bars, quiet zone in modules on both sides
+    bars = np.array([c == '1' for c in modules(code)], dtype=bool)
+    height = height or module_width * 60
+    row = np.concatenate([np.zeros(quiet_zone, bool), bars, np.zeros(quiet_zone, bool)])
+    row = np.repeat(row, module_width)
+    image = np.where(row, 0, 255).astype(np.uint8)
+    image = np.tile(image, (height, 1))
+
+    # Human readable digits below the bars, like on a real label
+    text_height = max(12, module_width * 8)
+    label = np.full((text_height, image.shape[1]), 255, np.uint8)
+    scale = module_width * 0.35
+    cv2.putText(label, code, (quiet_zone * module_width, text_height - 4),
+                cv2.FONT_HERSHEY_SIMPLEX, scale, 0, max(1, module_width // 2), cv2.LINE_AA)
+    return np.vstack([image, label])
+
+
+def random_code(rng, length=13):
+    return complete(''.join(str(d) for d in rng.integers(0, 10, length - 1)))
@@ -0,0 +1,88 @@
+"""
+
+Background CSV Export
+
+CsvExportJob writes rows on a worker thread in chunks. The Tk side polls
+poll() for progress events, cancel() stops the export and removes the
+partial file. Paths ending in .gz are written gzip compressed. rows can
+also be a function returning the rows, it is called on the worker thread
+(for rows that are expensive to prepare, like the whole history).
+
+Events:
+    ('progress', written, total)
+    ('done', written, path)
+    ('cancelled', written, path)
+    ('error', message, path)
+
+"""
+import csv
+import gzip
+import os
+import queue
+import threading
+
+
+class CsvExportJob(threading.Thread):
+    def __init__(self, path, header, rows, total=None, chunk_size=1000, compress=None, delimiter=';'):
+        super().__init__(daemon=True)
+        self.path = path
+        self.header = header
+        self.rows = rows
+        self.total = total
+        self.chunk_size = chunk_size
+        self.compress = path.endswith('.gz') if compress is None else compress
+        self.delimiter = delimiter
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def poll(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _open(self, path):
+        if self.compress:
+            return gzip.open(path, 'wt', newline='', encoding='utf-8')
+        return open(path, 'w', newline='', encoding='utf-8')
+
+    def run(self):
+        # Written to a temp file first, a cancelled/failed export leaves nothing behind
+        tmp_path = self.path + '.part'
+        written = 0
+        try:
+            rows = self.rows() if callable(self.rows) else self.rows
+            with self._open(tmp_path) as f:
+                writer = csv.writer(f, delimiter=self.delimiter)
+                writer.writerow(self.header)
+
+                chunk = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= self.chunk_size:
+                        writer.writerows(chunk)
+                        written += len(chunk)
+                        chunk = []
+                        self.events.put(('progress', written, self.total))
+                        if self.cancel_event.is_set():
+                            break
+                else:
+                    writer.writerows(chunk)
+                    written += len(chunk)
+
+            if self.cancel_event.is_set():
+                os.remove(tmp_path)
+                self.events.put(('cancelled', written, self.path))
+                return
+
+            os.replace(tmp_path, self.path)
+            self.events.put(('done', written, self.path))
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.events.put(('error', str(e), self.path))
@@ -0,0 +1,281 @@
+"""
+
+Frame Sources
+
+Everything the scanners read frames from, with the interface of
+cv2.VideoCapture (read / set / get / isOpened / release), so the decode
+pipeline runs the same on a camera, a recorded video, a folder of images
+or rendered test barcodes:
+
+    camera:0               ->  CameraSource (webcam 0)
+    video:abgabe.mp4       ->  VideoFileSource (looped, at the video's fps)
+    images:fotos/          ->  ImageSequenceSource (looped, 5 images per second)
+    synthetic              ->  SyntheticSource with EAN-13 barcodes
+    synthetic:ean8         ->  SyntheticSource with EAN-8 barcodes
+
+    source = open_source("synthetic")
+    ret, frame = source.read()
+    source.truth            ->  barcode visible in the last frame (or None)
+
+Files and image folders are paced like a camera (read() waits for the
+next frame) unless realtime=False, then they are read as fast as possible
+(benchmarks). The synthetic source is deterministic for a given seed.
+
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+from PfandApplication.ean import random_code, render_ean
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class FrameSource:
+    name = "source"
+    fps = 30.0
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self.next_frame = None
+
+    def read(self):
+        return False, None
+
+    def set(self, prop, value):
+        # Camera settings (focus, ...) only mean something for cameras
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+    def _pace(self):
+        # Wait like a camera would until the next frame is due
+        if not self.realtime:
+            return
+        now = time.perf_counter()
+        if self.next_frame is None or now - self.next_frame > 1.0:
+            self.next_frame = now
+        elif self.next_frame > now:
+            time.sleep(self.next_frame - now)
+        self.next_frame += 1.0 / self.fps
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0, width=1280, height=720):
+        super().__init__(realtime=False)  # the camera paces itself
+        self.index = index
+        self.name = str(index)
+        self.capture = cv2.VideoCapture(index, cv2.CAP_DSHOW if os.name == 'nt' else 0)
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self):
+        return self.capture.read()
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, loop=True, realtime=True):
+        super().__init__(realtime)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def read(self):
+        self._pace()
+        ret, frame = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return ret, frame
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageSequenceSource(FrameSource):
+    def __init__(self, paths, fps=5.0, loop=True, realtime=True):
+        # paths: a folder (its images sorted by name) or a list of image files
+        super().__init__(realtime)
+        if isinstance(paths, str):
+            self.name = os.path.basename(os.path.normpath(paths))
+            paths = [os.path.join(paths, name) for name in sorted(os.listdir(paths)) if is_image(name)]
+        else:
+            self.name = "images"
+        self.paths = list(paths)
+        self.fps = fps
+        self.loop = loop
+        self.position = 0
+
+    def read(self):
+        if self.position >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.position = 0
+        self._pace()
+        frame = cv2.imread(self.paths[self.position])
+        self.position += 1
+        return frame is not None, frame
+
+    def isOpened(self):
+        return bool(self.paths)
+
+
+class SyntheticSource(FrameSource):
+    # Rendered EAN barcodes on a noisy background: each code is shown for
+    # hold_frames frames (rotated, blurred, unevenly lit), then gap_frames
+    # empty frames follow
+    def __init__(self, width=1280, height=720, fps=30.0, codes=None, length=13, hold_frames=30, gap_frames=15,
+                 module_widths=(2, 4), noise=8.0, blur=1.5, rotation=20.0, lighting=0.4, seed=0, realtime=True):
+        super().__init__(realtime)
+        self.name = "synthetic" if length == 13 else f"synthetic-ean{length}"
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codes = list(codes) if codes else None
+        self.length = length
+        self.hold_frames = hold_frames
+        self.gap_frames = gap_frames
+        self.noise = noise  # standard deviation of the pixel noise
+        self.blur = blur  # maximum Gaussian blur sigma
+        self.rotation = rotation  # maximum rotation in degrees (both directions)
+        self.lighting = lighting  # maximum darkening towards one side (0-1)
+        self.module_widths = module_widths  # bar width range in pixels (barcode size)
+        self.seed = seed
+
+        self.index = 0
+        self.truth = None
+        self.scene = (None, None, None)  # (scene number, code, rendered frame without noise)
+        self.background = self._background(np.random.default_rng(seed))
+
+    def read(self):
+        self._pace()
+        frame, self.truth = self.frame_at(self.index)
+        self.index += 1
+        return True, frame
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.index = int(value)
+            return True
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return super().get(prop)
+
+    def frame_at(self, index):
+        # (frame, code or None); the same index always gives the same picture
+        period = self.hold_frames + self.gap_frames
+        number, offset = divmod(index, period)
+        if self.scene[0] != number:
+            self.scene = (number,) + self._render_scene(number)
+        _, code, image = self.scene
+
+        frame = image if offset < self.hold_frames else self.background
+        rng = np.random.default_rng((self.seed, index))
+        if self.noise:
+            frame = cv2.scaleAdd(rng.standard_normal(frame.shape, dtype=np.float32), self.noise, frame)
+        frame = cv2.cvtColor(cv2.convertScaleAbs(frame), cv2.COLOR_GRAY2BGR)
+        return frame, code if offset < self.hold_frames else None
+
+    def _background(self, rng):
+        # Smooth grey texture (counter, wall)
+        small = rng.integers(90, 200, (self.height // 40 + 1, self.width // 40 + 1)).astype(np.uint8)
+        return cv2.resize(small, (self.width, self.height), interpolation=cv2.INTER_CUBIC).astype(np.float32)
+
+    def _render_scene(self, number):
+        rng = np.random.default_rng((self.seed, number, 1))
+        if self.codes:
+            code = self.codes[number % len(self.codes)]
+        else:
+            code = random_code(rng, self.length)
+
+        # Never wider than 90% of the frame
+        widest = max(1, int(self.width * 0.9) // (len(code) * 7 + 31))
+        module_width = min(int(rng.integers(self.module_widths[0], self.module_widths[1] + 1)), widest)
+        label = render_ean(code, module_width=module_width).astype(np.float32)
+        h, w = label.shape
+        angle = rng.uniform(-self.rotation, self.rotation) if self.rotation else 0.0
+        center = (rng.uniform(w / 2, max(w / 2 + 1, self.width - w / 2)),
+                  rng.uniform(h / 2, max(h / 2 + 1, self.height - h / 2)))
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        matrix[:, 2] += (center[0] - w / 2, center[1] - h / 2)
+
+        size = (self.width, self.height)
+        placed = cv2.warpAffine(label, matrix, size, flags=cv2.INTER_LINEAR)
+        mask = cv2.warpAffine(np.ones_like(label), matrix, size, flags=cv2.INTER_LINEAR)
+        image = self.background * (1 - mask) + placed * mask
+
+        if self.lighting:
+            # Darker towards a random side
+            direction = rng.uniform(0, 2 * np.pi)
+            x = np.linspace(-0.5, 0.5, self.width, dtype=np.float32)
+            y = np.linspace(-0.5, 0.5, self.height, dtype=np.float32)[:, None]
+            ramp = x * np.cos(direction) + y * np.sin(direction) + 0.5
+            image = image * (1 - rng.uniform(0, self.lighting) * ramp)
+        if self.blur:
+            sigma = rng.uniform(0, self.blur)
+            if sigma > 0.3:
+                image = cv2.GaussianBlur(image, (0, 0), sigma)
+        return code, image.astype(np.float32)
+
+
+def open_source(spec, realtime=True):
+    # "camera:0", "video:<file>", "images:<folder>", "synthetic", "synthetic:ean8";
+    # a number is a camera, a plain path a video file or image folder
+    if isinstance(spec, int):
+        return CameraSource(spec)
+    kind, _, argument = spec.partition(':')
+    if kind == 'camera':
+        return CameraSource(int(argument or 0))
+    if kind == 'video':
+        return VideoFileSource(argument, realtime=realtime)
+    if kind == 'images':
+        return ImageSequenceSource(argument, realtime=realtime)
+    if kind == 'synthetic':
+        length = 8 if argument.lower() == 'ean8' else 13
+        return SyntheticSource(length=length, realtime=realtime)
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageSequenceSource(spec, realtime=realtime)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, realtime=realtime)
+    raise ValueError(f"Unbekannte Bildquelle: {spec}")
@@ -0,0 +1,188 @@
+"""
+
+Columnar Deposit History (NumPy)
+
+The deposit history as columns instead of a list of dicts:
+    days      ->  date ordinals              (n,)
+    matrix    ->  quantity per product       (n, products)
+    totals    ->  deposit value in €         (n,)
+
+Statistics and exports run vectorized queries on these arrays.
+append() keeps the model in sync with new deposits (amortized O(1)).
+
+"""
+from datetime import date, datetime
+
+import numpy as np
+
+from PfandApplication.storage import date_to_day
+
+# date(1970, 1, 1).toordinal(), used to convert ordinals to datetime64
+EPOCH_ORDINAL = 719163
+
+
+def to_ordinal(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str):
+        return date_to_day(value)
+    return int(value)
+
+
+class ColumnarHistory:
+    def __init__(self, products=(), capacity=256):
+        self.products = list(products)
+        self.columns = {product: i for i, product in enumerate(self.products)}
+        self.size = 0
+        self.dates = []  # original date strings, for display/export
+        self._days = np.zeros(capacity, dtype=np.int32)
+        self._matrix = np.zeros((capacity, len(self.products)), dtype=np.int64)
+        self._totals = np.zeros(capacity, dtype=np.float64)
+
+    @classmethod
+    def from_history(cls, history, products=()):
+        products = list(products)
+        known = set(products)
+        for record in history:
+            for product in record['quantities']:
+                if product not in known:
+                    known.add(product)
+                    products.append(product)
+
+        model = cls(products, capacity=max(256, len(history)))
+        n = len(history)
+        model._days[:n] = [date_to_day(record['date']) for record in history]
+        model._totals[:n] = [record.get('total', 0.0) for record in history]
+        for row, record in enumerate(history):
+            for product, quantity in record['quantities'].items():
+                model._matrix[row, model.columns[product]] = quantity
+        model.dates = [record['date'] for record in history]
+        model.size = n
+        return model
+
+    @property
+    def days(self):
+        return self._days[:self.size]
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.size]
+
+    @property
+    def totals(self):
+        return self._totals[:self.size]
+
+    def append(self, record):
+        for product in record['quantities']:
+            if product not in self.columns:
+                self._add_column(product)
+
+        if self.size == len(self._days):
+            self._grow()
+
+        row = self.size
+        self._days[row] = date_to_day(record['date'])
+        self._totals[row] = record.get('total', 0.0)
+        self._matrix[row] = 0
+        for product, quantity in record['quantities'].items():
+            self._matrix[row, self.columns[product]] = quantity
+        self.dates.append(record['date'])
+        self.size += 1
+
+    def clear(self):
+        self.size = 0
+        self.dates = []
+
+    def _grow(self):
+        capacity = max(256, len(self._days) * 2)
+        self._days = np.resize(self._days, capacity)
+        self._totals = np.resize(self._totals, capacity)
+        matrix = np.zeros((capacity, len(self.products)), dtype=np.int64)
+        matrix[:self.size] = self._matrix[:self.size]
+        self._matrix = matrix
+
+    def _add_column(self, product):
+        self.columns[product] = len(self.products)
+        self.products.append(product)
+        self._matrix = np.hstack([self._matrix, np.zeros((len(self._matrix), 1), dtype=np.int64)])
+
+    def column(self, product):
+        if product not in self.columns:
+            return np.zeros(self.size, dtype=np.int64)
+        return self.matrix[:, self.columns[product]]
+
+    # Queries
+
+    def range_mask(self, start=None, end=None):
+        mask = np.ones(self.size, dtype=bool)
+        start, end = to_ordinal(start), to_ordinal(end)
+        if start is not None:
+            mask &= self.days >= start
+        if end is not None:
+            mask &= self.days <= end
+        return mask
+
+    def totals_per_product(self, start=None, end=None):
+        sums = self.matrix[self.range_mask(start, end)].sum(axis=0)
+        return dict(zip(self.products, sums.tolist()))
+
+    def amount(self, start=None, end=None):
+        return float(self.totals[self.range_mask(start, end)].sum())
+
+    def totals_by_month(self, start=None, end=None):
+        return self._group(self._period_keys('M'), start, end)
+
+    def totals_by_year(self, start=None, end=None):
+        return self._group(self._period_keys('Y'), start, end)
+
+    def top_days(self, n=10, by='amount', start=None, end=None):
+        # Deposits on the same day are added up first
+        mask = self.range_mask(start, end)
+        days, inverse = np.unique(self.days[mask], return_inverse=True)
+        amounts = np.bincount(inverse, weights=self.totals[mask], minlength=len(days))
+        items = np.bincount(inverse, weights=self.matrix[mask].sum(axis=1), minlength=len(days))
+
+        order = np.argsort(-(amounts if by == 'amount' else items), kind='stable')[:n]
+        return [
+            (date.fromordinal(int(days[i])) if days[i] > 0 else None, int(items[i]), float(amounts[i]))
+            for i in order
+        ]
+
+    def _period_keys(self, unit):
+        # Unparseable dates (ordinal 0) end up as NaT and are grouped as None
+        keys = np.where(self.days > 0, self.days - EPOCH_ORDINAL, 0).astype('datetime64[D]')
+        keys = keys.astype(f'datetime64[{unit}]')
+        keys[self.days <= 0] = np.datetime64('NaT')
+        return keys
+
+    def _group(self, keys, start, end):
+        mask = self.range_mask(start, end)
+        periods, inverse = np.unique(keys[mask], return_inverse=True)
+        quantities = np.zeros((len(periods), len(self.products)), dtype=np.int64)
+        np.add.at(quantities, inverse, self.matrix[mask])
+        amounts = np.bincount(inverse, weights=self.totals[mask], minlength=len(periods))
+
+        result = []
+        for i, period in enumerate(periods):
+            label = None if np.isnat(period) else str(period)
+            result.append((label, dict(zip(self.products, quantities[i].tolist())), float(amounts[i])))
+        return result
+
+    def iter_rows(self, products):
+        # Export rows: date, quantity per product, total.
+        # The columns are copied here, so the generator can run on another
+        # thread while new deposits are appended.
+        size = self.size
+        columns = np.column_stack([self.column(product) for product in products]) if products \
+            else np.zeros((size, 0), dtype=np.int64)
+        totals = self.totals.copy()
+        dates = self.dates[:size]
+
+        def rows():
+            for i in range(size):
+                yield [dates[i]] + columns[i].tolist() + [f"{totals[i]:.2f}"]
+        return rows()
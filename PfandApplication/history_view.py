@@ -0,0 +1,112 @@
+"""
+
+Virtualized Deposit History Table
+
+The Treeview only ever contains as many rows as fit into the window.
+Scrolling does not insert anything, it just refills those rows with the
+deposits at the new offset. Opening the history is therefore instant no
+matter how many deposits exist. The row height is measured, so themes
+and DPI scaling do not clip rows.
+
+"""
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualHistoryTable(ttk.Frame):
+    def __init__(self, parent, history, item_columns):
+        super().__init__(parent)
+        self.history = history  # shared list, not copied
+        self.item_columns = item_columns
+        self.offset = 0
+        self.row_ids = []
+
+        columns = ['Datum'] + item_columns + ['Gesamt']
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=1)
+        for col in columns:
+            self.tree.heading(col, text=col, anchor='center')
+            width = 100 if col == 'Datum' else 80
+            self.tree.column(col, width=width, anchor='center' if col != 'Gesamt' else 'e')
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_rows(int(-1 * (e.delta / 120)) * 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))  # Linux
+        self.tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        self.tree.bind('<Prior>', lambda e: self.scroll_rows(-len(self.row_ids)))
+        self.tree.bind('<Next>', lambda e: self.scroll_rows(len(self.row_ids)))
+
+    def row_values(self, index):
+        deposit = self.history[index]
+        quantities = deposit.get('quantities', {})
+        row = [deposit.get('date', '')]
+        for item in self.item_columns:
+            row.append(quantities.get(item, 0))
+        row.append(f"{deposit.get('total', 0.0):.2f}")
+        return row
+
+    def set_history(self, history):
+        # The core replaces the list when the history is cleared
+        self.history = history
+        self.scroll_to(self.offset)
+
+    def measure(self):
+        # (row height, header height), both depend on theme, font and DPI scaling
+        if self.row_ids:
+            bbox = self.tree.bbox(self.row_ids[0])
+            if bbox:
+                return bbox[3], bbox[1]
+        try:
+            row_height = int(float(ttk.Style(self).lookup('Treeview', 'rowheight') or 0))
+        except (tk.TclError, ValueError):
+            row_height = 0
+        row_height = row_height or 20
+        return row_height, row_height
+
+    def on_resize(self, event):
+        # Second pass with the height measured on the rows from the first one
+        for _ in range(2):
+            row_height, header_height = self.measure()
+            visible = max(1, (event.height - header_height) // row_height)
+            if visible == len(self.row_ids):
+                break
+            while len(self.row_ids) < visible:
+                self.row_ids.append(self.tree.insert('', tk.END, values=()))
+            while len(self.row_ids) > visible:
+                self.tree.delete(self.row_ids.pop())
+        self.scroll_to(self.offset)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.history)))
+        elif action == 'scroll':
+            step = len(self.row_ids) if unit == 'pages' else 1
+            self.scroll_rows(int(amount) * step)
+
+    def scroll_rows(self, delta):
+        self.scroll_to(self.offset + delta)
+        return 'break'
+
+    def scroll_to(self, offset):
+        total = len(self.history)
+        self.offset = max(0, min(offset, total - len(self.row_ids)))
+        self.render()
+
+    def render(self):
+        total = len(self.history)
+        for i, iid in enumerate(self.row_ids):
+            index = self.offset + i
+            self.tree.item(iid, values=self.row_values(index) if index < total else ())
+
+        if total:
+            first = self.offset / total
+            last = min(1.0, (self.offset + len(self.row_ids)) / total)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,180 @@
+"""
+
+Bulk CSV Import of the Deposit History
+
+Reads files written by "Historie Exportieren" (Datum;<Produkte>;Gesamt (€),
+also .csv.gz) back in, e.g. to merge the history of several stations.
+Rows are read in chunks and dates/quantities are validated per chunk with
+NumPy. Totals are recomputed from the current prices, rows that already
+exist in the history (same day and quantities) are skipped and everything
+is committed in one transaction. Identical rows within one file are
+separate deposits and are all imported (as many as the history does not
+have yet). Files read earlier in the same import count as history, so
+overlapping exports of several stations are merged, not doubled.
+
+"""
+import csv
+import gzip
+from collections import Counter
+
+import numpy as np
+
+from PfandApplication.history_model import EPOCH_ORDINAL
+
+# Digit positions in 'dd.mm.YYYY'
+DATE_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9]
+
+
+def parse_dates(values):
+    # 'dd.mm.YYYY' -> date ordinals, 0 for invalid dates
+    dates = np.char.strip(np.asarray(values, dtype=str))
+    valid = np.char.str_len(dates) == 10
+    chars = dates.astype('U10').view('U1').reshape(len(dates), 10)
+
+    digits = chars[:, DATE_DIGITS]
+    valid &= (chars[:, 2] == '.') & (chars[:, 5] == '.')
+    valid &= np.char.isdecimal(digits).all(axis=1)
+    digits = np.where(valid[:, None], digits, '0').astype(np.int64)
+
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+    valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+
+    # Days in the month = first of next month - first of this month
+    month_start = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    first_day = month_start.astype('datetime64[D]')
+    month_length = ((month_start + 1).astype('datetime64[D]') - first_day).astype(np.int64)
+    valid &= day <= month_length
+
+    ordinals = first_day.astype(np.int64) + day - 1 + EPOCH_ORDINAL
+    return np.where(valid, ordinals, 0)
+
+
+def parse_quantities(cells):
+    # 2D array of cells -> (int64 quantities, valid row mask); empty cells count as 0
+    cells = np.char.strip(np.asarray(cells, dtype=str))
+    cells = np.where(cells == '', '0', cells)
+    ok = np.char.isdecimal(cells) & (np.char.str_len(cells) <= 9)
+    quantities = np.where(ok, cells, '0').astype(np.int64)
+    return quantities, ok.all(axis=1)
+
+
+def deposit_key(day, quantities):
+    # Same day and same (non-zero) quantities -> same deposit
+    return day, tuple(sorted((product, quantity) for product, quantity in quantities.items() if quantity))
+
+
+class ImportResult:
+    def __init__(self):
+        self.files = 0
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.repeated = 0  # imported rows identical to an earlier row of the same file
+        self.invalid = 0
+        self.unknown_products = set()  # columns without a price, imported with 0 €
+        self.errors = []  # (path, message) of files that could not be read
+
+
+class HistoryImporter:
+    def __init__(self, prices, existing=(), chunk_size=5000):
+        self.prices = prices
+        self.chunk_size = chunk_size
+        self.records = []
+        self.result = ImportResult()
+        # Deposits in the history and in the files accepted so far, key -> how often
+        self.existing = Counter()
+        existing = list(existing)
+        days = parse_dates([record['date'] for record in existing]) if existing else []
+        for day, record in zip(days, existing):
+            self.existing[deposit_key(int(day), record['quantities'])] += 1
+
+    def add_file(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        self.file_records = []
+        self.file_counts = Counter()
+        try:
+            with opener(path, 'rt', newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f, delimiter=';')
+                products = self._read_header(next(reader, None))
+
+                chunk = []
+                for row in reader:
+                    if not any(cell.strip() for cell in row):
+                        continue
+                    chunk.append(row)
+                    if len(chunk) >= self.chunk_size:
+                        self._add_chunk(products, chunk)
+                        chunk = []
+                if chunk:
+                    self._add_chunk(products, chunk)
+        except (OSError, ValueError, csv.Error) as e:
+            # Nothing of a broken file is imported
+            self.result.errors.append((path, str(e)))
+            return False
+
+        self.records.extend(self.file_records)
+        # A file with n identical rows leaves max(known, n) of those deposits
+        self.existing |= self.file_counts
+        self.result.files += 1
+        return True
+
+    def _read_header(self, header):
+        if not header or header[0].strip() != 'Datum':
+            raise ValueError("Keine Pfand Historie (erste Spalte muss 'Datum' sein)")
+        header = [column.strip() for column in header]
+        # The total is recomputed from the prices
+        products = header[1:-1] if header[-1].startswith('Gesamt') else header[1:]
+        self.result.unknown_products.update(product for product in products if product not in self.prices)
+        self.columns = len(header)
+        return products
+
+    def _add_chunk(self, products, rows):
+        self.result.rows += len(rows)
+        complete = [row for row in rows if len(row) == self.columns]
+        self.result.invalid += len(rows) - len(complete)
+        rows = complete
+        if not rows:
+            return
+
+        dates = [row[0] for row in rows]
+        days = parse_dates(dates)
+        quantities, valid = parse_quantities([row[1:1 + len(products)] for row in rows])
+        valid &= days > 0
+
+        prices = np.array([self.prices.get(product, 0.0) for product in products], dtype=np.float64)
+        totals = np.round(quantities @ prices, 2)
+
+        self.result.invalid += int((~valid).sum())
+        for i in np.flatnonzero(valid):
+            record = {
+                'date': dates[i].strip(),
+                'quantities': dict(zip(products, quantities[i].tolist())),
+                'total': float(totals[i]),
+            }
+            key = deposit_key(int(days[i]), record['quantities'])
+            # The n-th identical row of a file is a duplicate if the history already had n of them
+            self.file_counts[key] += 1
+            if self.file_counts[key] <= self.existing[key]:
+                self.result.duplicates += 1
+                continue
+            if self.file_counts[key] > 1:
+                self.result.repeated += 1
+            self.file_records.append((int(days[i]), key, record))
+
+    def sorted_records(self):
+        # Oldest first, rows of the same day keep their file order
+        return [record for _, _, record in sorted(self.records, key=lambda item: item[0])]
+
+
+def import_history_csv(core, paths, chunk_size=5000):
+    # Imports the given CSV files into the core, returns (ImportResult, unlocked achievement keys)
+    importer = HistoryImporter(core.prices, core.deposit_history, chunk_size)
+    for path in paths:
+        importer.add_file(path)
+
+    records = importer.sorted_records()
+    importer.result.imported = len(records)
+    unlocked = core.add_deposits(records) if records else []
+    return importer.result, unlocked
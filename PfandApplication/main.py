@@ -1,35 +1,49 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import webbrowser
-import json
 from PIL import Image, ImageTk
 import os
 import subprocess
-from datetime import datetime
 from tkcalendar import DateEntry
-import csv
 import cv2
-from pyzbar.pyzbar import decode
-import threading
-import queue
-import numpy as np
 import shutil
 
 # Local Dependencies
 from PfandApplication.wiki import main as wiki
 from PfandApplication.pfand_scanner import launch_pfand_scanner
 from PfandApplication.updater import open_updater as open_updater, run_silent_update
+from PfandApplication.core import PfandCore
+from PfandApplication.storage import JsonStorage
+from PfandApplication.history_model import ColumnarHistory
+from PfandApplication.history_view import VirtualHistoryTable
+from PfandApplication.exporter import CsvExportJob
+from PfandApplication.importer import import_history_csv
+from PfandApplication.scan_pipeline import ScanPipeline
+from PfandApplication.decode_pool import DecodePool
+from PfandApplication.roi_tracker import RoiTracker
+from PfandApplication.decoding import PyramidStats, pyramid_decoder
+from PfandApplication.preview import PreviewRenderer
+from PfandApplication.motion import MotionGate
+from PfandApplication.scheduler import DecodeScheduler
+from PfandApplication.frame_sources import open_source
+from PfandApplication.dedup import DedupCache
 from PfandApplication.tgtg_orderchecker import main as tgtg
 from PfandApplication.tgtg_orderchecker import setupkey as tgtg_kt
 
-class Achievement:
-    def __init__(self, title, description, condition_type, condition_value):
-        self.title = title
-        self.description = description
-        self.condition_type = condition_type
-        self.condition_value = condition_value
-        self.unlocked = False
-        self.unlock_date = None
+# Preview frames per second in the scanner window (decoding runs independently)
+PREVIEW_FPS = 30
+# Decodes per second the scanner window aims for (lowered automatically if the machine can't keep up)
+DECODE_RATE = 15
+# Seconds in which the same barcode counts as the same bottle
+SCAN_WINDOW = 5
+# Frame sources of the scanner window (see frame_sources.py), None -> ask for a file/folder
+SCANNER_SOURCES = {
+    "Kamera 0": "camera:0",
+    "Videodatei...": None,
+    "Bildordner...": None,
+    "Synthetisch (EAN-13)": "synthetic",
+    "Synthetisch (EAN-8)": "synthetic:ean8",
+}
 
 class PfandCalculator:
     def __init__(self, root):
@@ -37,30 +51,31 @@ class PfandCalculator:
         self.root = root
         self.root.title("Österreichischer Pfandrechner")
         
-        # Load products and prices from JSON
-        self.load_products()
+        # Products, quantities, deposits, achievements and scans live in the
+        # headless core (core.py), this class only presents them
+        self.core = PfandCore()
+        self.core.add_listener(self.on_quantities_changed)
         
-        self.quantities = {}
         self.images = {}
         self.spinboxes = {}  # Store spinbox references
-        self.deposit_history = self.load_deposit_history()
-        self.scanned_barcodes = set()
-        self.barcode_history = []  # Store barcode scan history
+        # The same barcode within SCAN_WINDOW seconds is the same bottle (see dedup.py)
+        self.recent_barcodes = DedupCache(SCAN_WINDOW)
+        self.open_dialogs = set()  # barcodes whose verify/product dialog is open right now
         
-        self.achievements = self.initialize_achievements()
-        self.load_achievements()
+        self.export_job = None  # running background export (see exporter.py)
+        self.history_table = None  # open history window (see history_view.py)
         
         if not os.path.exists('PfandApplication/images'):
             os.makedirs('images')
             
         self.create_menu()
-        self.load_quantities()
         self.create_widgets()
         
         # Scanner window
         self.scanner_window = None
-        self.cap = None
+        self.scan_pipeline = None  # capture/decode threads while scanning (see scan_pipeline.py)
         self.scanning = False
+        self.scan_source_name = "0"  # name of the frame source in the scan log
         
         self.achievement_image = self.load_achievement_image()
 
@@ -117,84 +132,57 @@ class PfandCalculator:
             print(f"Error loading achievement image: {e}")
             return None
 
-    @staticmethod
-    def initialize_achievements():
-        return {
-            "each_100": Achievement("Krass, Weiter So!", "Du hast bis jetzt 100 von jedem Element gesammelt!", "each_element", 100),
-            "each_500": Achievement("Adlersson wäre neidisch!", "Adlersson wäre neidisch auf dich! Du hast 500 von jedem Element gesammelt!", "each_element", 500),
-            "each_1000": Achievement("Arbeitslos I", "Arbeitsamt hat angerufen! Du hast 1000 von jedem Element gesammelt!", "each_element", 1000),
-            "total_2000": Achievement("Arbeitslos II", "Das Arbeitsamt hat angst vor dir! Du hast 2000 totale Elemente gesammelt!", "total_elements", 2000),
-            "total_3000": Achievement("Arbeitslos III", "Drachenlord hat angst vor dir! Du hast mehr wie 3000 Elemente gesammelt!", "total_elements", 3000),
-            "total_over_3000": Achievement("Krankhafte Sucht!", "Du hast echt einen Vogel! Pfandangel #1! Du hast >3000 gesammelt!", "total_elements", 3001),
-            "first_deposit": Achievement("Depositer!", "Guter Anfang!", "deposits", 1),
-            "deposits_10": Achievement("Depositer I", "Cool, Weiter So!", "deposits", 10),
-            "deposits_50": Achievement("Depositer II", "WoW, Echt viele Abgaben!", "deposits", 50),
-            "deposits_100": Achievement("Depositer III", "Du bist der Meister der Abgaben!", "deposits", 100),
-            "deposits_150": Achievement("Meister Depositer", "Der Pfandautomat hat Angst vor dir, so viel wie du Abgegeben hast müsstest du eine Villa besitzen!", "deposits", 150),
-            # New scanner achievements
-            "first_scan": Achievement("Scanner Neuling", "Du hast deinen ersten Barcode gescannt!", "scans", 1),
-            "scans_50": Achievement("Scanner Pro", "50 Barcodes gescannt - du kennst dich aus!", "scans", 50),
-            "scans_100": Achievement("Scanner Meister", "100 Barcodes gescannt - der Profi ist da!", "scans", 100),
-            "scans_500": Achievement("Scanner Legende", "500 Barcodes gescannt - legendärer Scanner Status erreicht!", "scans", 500),
-            "daily_10": Achievement("Tages Champion", "10 Barcodes an einem Tag gescannt!", "daily_scans", 10),
-            "daily_25": Achievement("Tages Meister", "25 Barcodes an einem Tag gescannt - sehr fleißig!", "daily_scans", 25)
-        }
+    # Shortcuts into the headless core
+    @property
+    def products(self):
+        return self.core.products
 
-    def load_achievements(self):
-        try:
-            with open('achievements.json', 'r') as f:
-                data = json.load(f)
-                for key, achievement_data in data.items():
-                    if key in self.achievements:
-                        self.achievements[key].unlocked = achievement_data['unlocked']
-                        self.achievements[key].unlock_date = achievement_data['unlock_date']
-        except FileNotFoundError:
-            pass
+    @property
+    def PRICES(self):
+        return self.core.prices
 
-    def save_achievements(self):
-        data = {
-            key: {
-                'unlocked': achievement.unlocked,
-                'unlock_date': achievement.unlock_date
-            }
-            for key, achievement in self.achievements.items()
-        }
-        with open('achievements.json', 'w') as f:
-            json.dump(data, f)
+    @property
+    def quantities(self):
+        return self.core.quantities
+
+    @property
+    def deposit_history(self):
+        return self.core.deposit_history
+
+    @property
+    def achievements(self):
+        return self.core.achievements
+
+    @property
+    def aggregates(self):
+        return self.core.aggregates
+
+    @property
+    def scan_log(self):
+        return self.core.scan_log
+
+    @property
+    def history_model(self):
+        return self.core.history_model
+
+    def rebuild_aggregates(self):
+        try:
+            unlocked = self.core.rebuild_aggregates()
+            messagebox.showinfo("Erfolg", f"Statistik wurde aus {self.aggregates.deposit_count} Abgaben neu aufgebaut!")
+            self.show_unlocked_achievements(unlocked)
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Fehler beim Neuaufbau der Statistik: {str(e)}")
 
     def check_achievements(self):
-        total_elements = sum(self.deposit_history[-1]['quantities'].values()) if self.deposit_history else 0
-        all_time_total = sum(sum(d['quantities'].values()) for d in self.deposit_history)
-        deposits_count = len(self.deposit_history)
-        
-        for achievement in ["each_100", "each_500", "each_1000"]:
-            if not self.achievements[achievement].unlocked:
-                if all(self.deposit_history[-1]['quantities'][product] >= self.achievements[achievement].condition_value 
-                      for product in self.products):
-                    self.unlock_achievement(achievement)
-
-        for achievement in ["total_2000", "total_3000", "total_over_3000"]:
-            if not self.achievements[achievement].unlocked and all_time_total >= self.achievements[achievement].condition_value:
-                self.unlock_achievement(achievement)
-
-        deposit_achievements = {
-            1: "first_deposit",
-            10: "deposits_10",
-            50: "deposits_50",
-            100: "deposits_100",
-            150: "deposits_150"
-        }
-        
-        for count, achievement_key in deposit_achievements.items():
-            if not self.achievements[achievement_key].unlocked and deposits_count >= count:
-                self.unlock_achievement(achievement_key)
+        self.show_unlocked_achievements(self.core.check_achievements())
 
     def unlock_achievement(self, achievement_key):
-        achievement = self.achievements[achievement_key]
-        if not achievement.unlocked:
-            achievement.unlocked = True
-            achievement.unlock_date = datetime.now().strftime("%d.%m.%Y")
-            self.save_achievements()
+        if self.core.unlock_achievement(achievement_key):
+            self.show_unlocked_achievements([achievement_key])
+
+    def show_unlocked_achievements(self, achievement_keys):
+        for achievement_key in achievement_keys:
+            achievement = self.achievements[achievement_key]
             messagebox.showinfo("Auszeichnung freigeschaltet!", 
                               f"Neue Auszeichnung: {achievement.title}\n\n{achievement.description}")
 
@@ -586,6 +574,7 @@ class PfandCalculator:
         file_menu.add_command(label="Speichern", command=self.save_quantities, accelerator="Strg+S")
         file_menu.add_command(label="Ordner öffnen", command=self.open_file_location, accelerator="Strg+O")
         file_menu.add_command(label="Speicherdatei löschen", command=self.remove_save_file, accelerator="Strg+Shift+F1")
+        file_menu.add_command(label="Daten nach SQLite migrieren", command=self.migrate_to_sqlite)
         file_menu.add_separator()
         file_menu.add_command(label="Neulanden der UI", command=self.recreate_widgets, accelerator="Strg+R")
         file_menu.add_command(label="Updater", command=open_updater, accelerator="Strg+U") # Added this to the File Menu too!
@@ -601,8 +590,10 @@ class PfandCalculator:
         self.menubar.add_cascade(label="Pfand", menu=deposit_menu)
         deposit_menu.add_command(label="Pfand Abgeben", command=self.quick_deposit, accelerator="Strg+D")
         deposit_menu.add_command(label="Abgabe Historie", command=self.show_deposit_history, accelerator="Strg+H")
+        deposit_menu.add_command(label="Statistik", command=self.show_statistics)
         deposit_menu.add_separator()
         deposit_menu.add_command(label="Historie Exportieren (CSV)", command=self.export_history_csv, accelerator="Strg+E")
+        deposit_menu.add_command(label="Historie Importieren (CSV)", command=self.import_history_csv, accelerator="Strg+I")
         deposit_menu.add_command(label="Historie Löschen", command=self.clear_deposit_history, accelerator="Strg+Shift+F2")
 
         # Scanner Menu
@@ -611,10 +602,11 @@ class PfandCalculator:
         self.menubar.add_cascade(label="Scanner", menu=scanner_menu)
         scanner_menu.add_command(label="Scanner öffnen", command=self.open_scanner_window, accelerator="Strg+B")
         scanner_menu.add_separator()
-        scanner_menu.add_command(label="Öffne µScan", command=launch_pfand_scanner, accelerator="Strg+Shift+B") #µScan
+        scanner_menu.add_command(label="Öffne µScan", command=lambda: launch_pfand_scanner(self.core, self.show_unlocked_achievements), accelerator="Strg+Shift+B") #µScan
         scanner_menu.add_command(label="Über µScan", command=self.uscan_credits) #µScan credits
         scanner_menu.add_separator()
         scanner_menu.add_command(label="Barcodes Exportieren (CSV)", command=self.export_barcodes_csv, accelerator="Strg+Shift+E")
+        scanner_menu.add_command(label="Barcode Katalog", command=self.show_barcode_catalog)
 
         # Achivements Menu
 
@@ -622,6 +614,8 @@ class PfandCalculator:
         self.menubar.add_cascade(label="Auszeichnungen", menu=achievements_menu)
         achievements_menu.add_command(label="Auszeichnungen anzeigen", command=self.show_achievements, accelerator="Strg+F6")
         achievements_menu.add_command(label="Auszeichnungen löschen", command=self.delete_achievements, accelerator="Strg+F7")
+        achievements_menu.add_separator()
+        achievements_menu.add_command(label="Statistik neu aufbauen", command=self.rebuild_aggregates)
         
         # Add custom products menu
 
@@ -652,8 +646,9 @@ class PfandCalculator:
         self.root.bind('<Control-d>', lambda e: self.quick_deposit())
         self.root.bind('<Control-h>', lambda e: self.show_deposit_history())
         self.root.bind('<Control-e>', lambda e: self.export_history_csv())
+        self.root.bind('<Control-i>', lambda e: self.import_history_csv())
         self.root.bind('<Control-b>', lambda e: self.open_scanner_window())
-        self.root.bind('<Control-Shift-B>', lambda e: launch_pfand_scanner()) #µScan
+        self.root.bind('<Control-Shift-B>', lambda e: launch_pfand_scanner(self.core, self.show_unlocked_achievements)) #µScan
         self.root.bind('<Control-F1>', lambda e: self.handle_shift_f1(e))
         self.root.bind('<Control-F2>', lambda e: self.handle_shift_f2(e))
         self.root.bind('<Control-F6>', lambda e: self.show_achievements())
@@ -679,41 +674,42 @@ class PfandCalculator:
                 subprocess.run(['open', current_dir])
 
     def remove_save_file(self):
-        if os.path.exists('quantities.json'):
+        if self.core.has_saved_quantities():
             if messagebox.askyesno("Löschen bestätigen", "Sind Sie sicher, dass Sie die Speicherdatei löschen möchten?"):
                 try:
-                    os.remove('quantities.json')
+                    # Resets the quantities, the spinboxes follow via on_quantities_changed
+                    self.core.delete_quantities()
                     messagebox.showinfo("Erfolg", "Speicherdatei wurde erfolgreich gelöscht!")
-                    self.quantities = {product: 0 for product in self.products}
-                    self.update_total()
-                    for widget in self.root.winfo_children():
-                        if isinstance(widget, ttk.Frame):
-                            for child in widget.winfo_children():
-                                if isinstance(child, ttk.Frame):
-                                    for grandchild in child.winfo_children():
-                                        if isinstance(grandchild, ttk.Spinbox):
-                                            grandchild.set("0")
                 except Exception as e:
                     messagebox.showerror("Fehler", f"Datei konnte nicht gelöscht werden: {str(e)}")
         else:
             messagebox.showinfo("Info", "Keine Speicherdatei vorhanden.")
 
-    def load_quantities(self):
+    def migrate_to_sqlite(self):
+        if not isinstance(self.core.storage, JsonStorage):
+            messagebox.showinfo("Info", "Die Daten liegen bereits in der SQLite Datenbank.")
+            return
+
+        if not messagebox.askyesno("Migration bestätigen",
+                                   "Sollen alle Daten in die SQLite Datenbank (pfand.db) übernommen werden?\n"
+                                   "Die JSON Dateien bleiben als Sicherung erhalten."):
+            return
+
         try:
-            with open('quantities.json', 'r') as f:
-                self.quantities = json.load(f)
-        except FileNotFoundError:
-            self.quantities = {product: 0 for product in self.products}
-    
+            migrated = self.core.migrate_to_sqlite()
+            messagebox.showinfo("Erfolg", f"Migration abgeschlossen! {migrated} Abgaben übernommen.")
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Fehler bei der Migration: {str(e)}")
+
     def save_quantities(self):
         try:
-            with open('quantities.json', 'w') as f:
-                json.dump(self.quantities, f)
+            self.core.save_quantities()
             messagebox.showinfo("Erfolg", "Mengen wurden erfolgreich gespeichert!")
         except Exception as e:
             messagebox.showerror("Fehler", f"Fehler beim Speichern der Mengen: {str(e)}")
-    
+
     def create_widgets(self):
+        self.spinboxes = {}
         main_frame = ttk.Frame(self.root)
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
@@ -755,43 +751,179 @@ class PfandCalculator:
         self.total_label.grid(row=1, column=0, columnspan=len(self.products), pady=10)
         
         self.update_total()
+        self.create_status_bar()
+
+    def create_status_bar(self):
+        # Non-modal progress for background exports
+        self.status_frame = ttk.Frame(self.root)
+        self.status_frame.grid(row=1, column=0, sticky='ew', padx=5, pady=(0, 5))
+        self.status_label = ttk.Label(self.status_frame, text="")
+        self.status_label.pack(side=tk.LEFT)
+        self.status_progress = ttk.Progressbar(self.status_frame, length=200, mode='determinate')
+        self.status_progress.pack(side=tk.LEFT, padx=5)
+        self.status_cancel = ttk.Button(self.status_frame, text="Abbrechen", command=self.cancel_export)
+        self.status_cancel.pack(side=tk.LEFT)
+        if self.export_job is None:
+            self.status_frame.grid_remove()
+
+    def ask_export_path(self, initialfile):
+        return filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV Dateien", "*.csv"), ("CSV Dateien (gzip)", "*.csv.gz")],
+            initialfile=initialfile
+        )
+
+    def start_export(self, file_path, header, rows, total, label):
+        self.export_job = CsvExportJob(file_path, header, rows, total=total)
+        self.export_label = label
+        if total is None:
+            # Streamed source, number of rows is unknown
+            self.status_progress.configure(mode='indeterminate', value=0)
+            self.status_progress.start(50)
+            self.status_label.configure(text=f"{label}: 0 Zeilen")
+        else:
+            self.status_progress.configure(mode='determinate', maximum=max(total, 1), value=0)
+            self.status_label.configure(text=f"{label}: 0 / {total}")
+        self.status_cancel.state(['!disabled'])
+        self.status_frame.grid()
+        self.export_job.start()
+        self.root.after(100, self.poll_export)
+
+    def poll_export(self):
+        job = self.export_job
+        if job is None:
+            return
+
+        for event in job.poll():
+            kind = event[0]
+            if kind == 'progress':
+                _, written, total = event
+                if total is None:
+                    self.status_label.configure(text=f"{self.export_label}: {written} Zeilen")
+                else:
+                    self.status_progress.configure(value=written)
+                    self.status_label.configure(text=f"{self.export_label}: {written} / {total}")
+                continue
+
+            self.export_job = None
+            self.status_cancel.state(['disabled'])
+            self.status_progress.stop()
+            self.status_progress.configure(mode='determinate')
+            if kind == 'done':
+                self.status_progress.configure(value=self.status_progress.cget('maximum'))
+                self.status_label.configure(text=f"{self.export_label}: {event[1]} Zeilen exportiert")
+            elif kind == 'cancelled':
+                self.status_label.configure(text=f"{self.export_label}: abgebrochen")
+            else:
+                self.status_label.configure(text=f"{self.export_label}: fehlgeschlagen")
+                messagebox.showerror("Fehler", f"Fehler beim Exportieren: {event[1]}")
+            self.root.after(5000, self.hide_status_bar)
+            return
+
+        self.root.after(100, self.poll_export)
+
+    def hide_status_bar(self):
+        if self.export_job is None and self.status_frame.winfo_exists():
+            self.status_frame.grid_remove()
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
     
     def update_quantity(self, product, var, event=None):
         try:
             quantity = int(var.get())
-            self.quantities[product] = quantity
-            self.update_total()
+            if quantity != self.quantities.get(product, 0):
+                # Goes through the core so the edit is written behind like every other change
+                self.core.set_quantity(product, quantity)
         except ValueError:
             var.set(str(self.quantities.get(product, 0)))
     
     def update_total(self):
-        total = sum(self.quantities[product] * self.PRICES[product] for product in self.products) # get total
+        total = self.core.current_total() # get total
         self.total_label.config(text=f"Gesamt: €{total:.2f}")
 
-    @staticmethod
-    def load_deposit_history():
+    def on_quantities_changed(self, product=None):
+        # Core listener: keep spinboxes and total in sync (also for µScan scans)
+        products = [product] if product is not None else self.products
+        for name in products:
+            spinbox = self.spinboxes.get(name)
+            if spinbox is None:
+                continue
+            try:
+                spinbox.set(str(self.quantities.get(name, 0)))
+            except tk.TclError:
+                pass  # widget was destroyed by a UI reload
         try:
-            with open('deposit_history.json', 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return []
+            self.update_total()
+        except tk.TclError:
+            pass
 
-    def save_deposit_history(self):
-        try:
-            with open('deposit_history.json', 'w') as f:
-                json.dump(self.deposit_history, f)
-        except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Speichern der Historie: {str(e)}")
+    def show_statistics(self):
+        model = self.history_model
+
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Pfand Statistik")
+        stats_window.geometry("900x500")
+
+        filter_frame = ttk.Frame(stats_window)
+        filter_frame.pack(fill='x', padx=5, pady=5)
+
+        ttk.Label(filter_frame, text="Von:").pack(side=tk.LEFT)
+        start_picker = DateEntry(filter_frame, width=12, locale='de_DE')
+        start_picker.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="Bis:").pack(side=tk.LEFT)
+        end_picker = DateEntry(filter_frame, width=12, locale='de_DE')
+        end_picker.pack(side=tk.LEFT, padx=5)
+        use_range_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Zeitraum verwenden", variable=use_range_var).pack(side=tk.LEFT, padx=5)
+
+        notebook = ttk.Notebook(stats_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        def make_tree(title, columns):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=columns, show='headings')
+            for col in columns:
+                tree.heading(col, text=col, anchor='center')
+                tree.column(col, width=90, anchor='center')
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side='left', fill='both', expand=True)
+            scrollbar.pack(side='right', fill='y')
+            return tree
+
+        product_tree = make_tree("Produkte", ['Produkt', 'Menge'])
+        month_tree = make_tree("Monate", ['Monat'] + model.products + ['Gesamt'])
+        year_tree = make_tree("Jahre", ['Jahr'] + model.products + ['Gesamt'])
+        top_tree = make_tree("Top Tage", ['Datum', 'Elemente', 'Gesamt'])
+
+        def fill_periods(tree, groups):
+            for label, quantities, amount in groups:
+                tree.insert('', tk.END, values=[label or "Unbekannt"]
+                            + [quantities.get(product, 0) for product in model.products] + [f"€{amount:.2f}"])
+
+        def refresh():
+            start, end = (start_picker.get_date(), end_picker.get_date()) if use_range_var.get() else (None, None)
+            for tree in (product_tree, month_tree, year_tree, top_tree):
+                tree.delete(*tree.get_children())
+
+            for product, quantity in model.totals_per_product(start, end).items():
+                product_tree.insert('', tk.END, values=(product, quantity))
+            product_tree.insert('', tk.END, values=("Gesamt", f"€{model.amount(start, end):.2f}"))
+
+            fill_periods(month_tree, model.totals_by_month(start, end))
+            fill_periods(year_tree, model.totals_by_year(start, end))
+
+            for day, items, amount in model.top_days(10, start=start, end=end):
+                top_tree.insert('', tk.END, values=(day.strftime("%d.%m.%Y") if day else "Unbekannt", items, f"€{amount:.2f}"))
+
+        ttk.Button(filter_frame, text="Anwenden", command=refresh).pack(side=tk.LEFT, padx=5)
+        refresh()
 
     # Changed in Version 7.4.101
     def show_deposit_history(self):
-        try:
-            with open("deposit_history.json", "r", encoding="utf-8") as file:
-                deposit_history = json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print("error while loading file")
-            return
-
         history_window = tk.Toplevel(self.root)
         history_window.title("Pfand Abgabe Historie")
         history_window.geometry("900x500")
@@ -799,44 +931,23 @@ class PfandCalculator:
         main_frame = ttk.Frame(history_window)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        all_items = set()
-        for deposit in deposit_history:
-            all_items.update(deposit['quantities'].keys())
-
-        item_columns = sorted(all_items)
-        columns = ['Datum'] + item_columns + ['Gesamt']
+        # Columns and footer come from the running aggregates, no pass over the history
+        product_totals = self.aggregates.product_totals
+        item_columns = sorted(product_totals)
 
-        tree = ttk.Treeview(main_frame, columns=columns, show='headings')
+        # Only the visible rows are materialized (see history_view.py)
+        table = VirtualHistoryTable(main_frame, self.deposit_history, item_columns)
+        table.grid(row=0, column=0, sticky='nsew')
+        self.history_table = table
 
-        for col in columns:
-            tree.heading(col, text=col, anchor='center')
-            width = 100 if col == 'Datum' else 80
-            tree.column(col, width=width, anchor='center' if col != 'Gesamt' else 'e')
-
-        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-
-        tree.grid(row=0, column=0, sticky='nsew')
-        scrollbar.grid(row=0, column=1, sticky='ns')
+        def forget_table(event):
+            if event.widget is table and self.history_table is table:
+                self.history_table = None
+        table.bind('<Destroy>', forget_table)
 
         main_frame.grid_columnconfigure(0, weight=1)
         main_frame.grid_rowconfigure(0, weight=1)
 
-        totals = {item: 0 for item in item_columns}
-        total_amount = 0
-
-        for deposit in deposit_history:
-            quantities = deposit.get('quantities', {})
-            row = [deposit.get('date', '')]
-            for item in item_columns:
-                count = quantities.get(item, 0)
-                row.append(count)
-                totals[item] += count
-            amount = deposit.get('total', 0.0)
-            row.append(f"{amount:.2f}")
-            total_amount += amount
-            tree.insert('', tk.END, values=row)
-
         totals_frame = ttk.Frame(main_frame)
         totals_frame.grid(row=1, column=0, sticky='ew', pady=(5, 0))
 
@@ -847,8 +958,8 @@ class PfandCalculator:
 
         row = ["Gesamt:"]
         for item in item_columns:
-            row.append(f"{totals[item]} {item}")  
-        row.append(f"€{total_amount:.2f}")  
+            row.append(f"{product_totals[item]} {item}")  
+        row.append(f"€{self.aggregates.total_amount:.2f}")  
         for idx, value in enumerate(row):
             ttk.Label(totals_frame, text=value, font=bold_font).grid(row=0, column=idx, sticky='w', padx=5)
 
@@ -867,32 +978,15 @@ class PfandCalculator:
         date_picker.pack(pady=5)
 
         def confirm_deposit():
-            date = date_picker.get_date().strftime("%d.%m.%Y")
-            current_total = sum(self.quantities[product] * self.PRICES[product]
-                              for product in self.products)
-            
-            deposit_record = {
-                'date': date,
-                'quantities': dict(self.quantities),
-                'total': current_total
-            }
-            self.deposit_history.append(deposit_record)
-            self.save_deposit_history()
-
-            self.quantities = {product: 0 for product in self.products}
-            self.save_quantities()
-            self.update_total()
-
-            for widget in self.root.winfo_children():
-                if isinstance(widget, ttk.Frame):
-                    for child in widget.winfo_children():
-                        if isinstance(child, ttk.Frame):
-                            for grandchild in child.winfo_children():
-                                if isinstance(grandchild, ttk.Spinbox):
-                                    grandchild.set("0")
+            try:
+                _, unlocked = self.core.deposit(date_picker.get_date())
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Fehler beim Speichern der Historie: {str(e)}")
+                return
 
             messagebox.showinfo("Erfolg", "Pfand wurde erfolgreich abgegeben!")
             deposit_dialog.destroy()
+            self.show_unlocked_achievements(unlocked)
 
         button_frame = ttk.Frame(deposit_dialog)
         button_frame.pack(pady=20)
@@ -905,72 +999,71 @@ class PfandCalculator:
             return
 
         if messagebox.askyesno("Pfand Abgeben", "Möchten Sie den Pfand mit dem heutigen Datum abgeben?"):
-            current_date = datetime.now().strftime("%d.%m.%Y")
-            current_total = sum(self.quantities[product] * self.PRICES[product] 
-                            for product in self.products)
-            
-            deposit_record = {
-                'date': current_date,
-                'quantities': dict(self.quantities),
-                'total': current_total
-            }
-            self.deposit_history.append(deposit_record)
-            self.save_deposit_history()
-            
-            self.check_achievements()
-
-            self.quantities = {product: 0 for product in self.products}
-            self.save_quantities()
-            self.update_total()
-
-            for widget in self.root.winfo_children():
-                if isinstance(widget, ttk.Frame):
-                    for child in widget.winfo_children():
-                        if isinstance(child, ttk.Frame):
-                            for grandchild in child.winfo_children():
-                                if isinstance(grandchild, ttk.Spinbox):
-                                    grandchild.set("0")
+            try:
+                _, unlocked = self.core.deposit()
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Fehler beim Speichern der Historie: {str(e)}")
+                return
 
+            self.show_unlocked_achievements(unlocked)
             messagebox.showinfo("Erfolg", "Pfand wurde erfolgreich abgegeben!")
         else:
             self.make_deposit()
 
     def export_history_csv(self):
-        if not self.deposit_history:
+        if not self.aggregates.deposit_count:
             messagebox.showinfo("Info", "Keine Historie zum Exportieren vorhanden.")
             return
+        if self.export_job is not None:
+            messagebox.showinfo("Info", "Es läuft bereits ein Export.")
+            return
 
-        try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV Dateien", "*.csv")],
-                initialfile="pfand_historie.csv"
-            )
-            
-            if not file_path:
-                return
+        file_path = self.ask_export_path("pfand_historie.csv")
+        if not file_path:
+            return
 
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile, delimiter=';')
-                
-                # Create header with all products
-                header = ['Datum'] + self.products + ['Gesamt (€)']
-                writer.writerow(header)
-                
-                for deposit in self.deposit_history:
-                    # Create row with all products
-                    row = [deposit['date']]
-                    for product in self.products:
-                        row.append(deposit['quantities'].get(product, 0))
-                    row.append(f"{deposit['total']:.2f}")
-                    writer.writerow(row)
-            
-            messagebox.showinfo("Erfolg", "Historie wurde erfolgreich exportiert!")
+        # Create header with all products
+        products = list(self.products)
+        header = ['Datum'] + products + ['Gesamt (€)']
+        core = self.core
+
+        def rows():
+            # Reading the history and building the columnar model run on the export thread
+            return ColumnarHistory.from_history(core.read_deposit_history(), products).iter_rows(products)
+        self.start_export(file_path, header, rows, self.aggregates.deposit_count, "Historie")
+
+    def import_history_csv(self):
+        file_paths = filedialog.askopenfilenames(
+            title="Historie importieren",
+            filetypes=[("CSV files", "*.csv *.csv.gz"), ("All files", "*.*")]
+        )
+        if not file_paths:
+            return
+
+        try:
+            self.root.config(cursor="watch")
+            self.root.update_idletasks()
+            result, unlocked = import_history_csv(self.core, file_paths)
         except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Exportieren: {str(e)}")
+            messagebox.showerror("Fehler", f"Fehler beim Importieren: {str(e)}")
+            return
+        finally:
+            self.root.config(cursor="")
+
+        message = (f"{result.imported} Abgaben importiert\n"
+                   f"{result.duplicates} bereits vorhanden (übersprungen)\n"
+                   f"{result.invalid} ungültige Zeilen")
+        if result.repeated:
+            message += f"\n{result.repeated} gleiche Abgaben mehrfach in einer Datei (alle importiert)"
+        if result.unknown_products:
+            message += f"\n\nUnbekannte Produkte (ohne Pfandwert): {', '.join(sorted(result.unknown_products))}"
+        if result.errors:
+            message += "\n\nNicht gelesen:\n" + "\n".join(f"{os.path.basename(path)}: {error}" for path, error in result.errors)
+        messagebox.showinfo("Import abgeschlossen", message)
+        self.show_unlocked_achievements(unlocked)
 
     def clear_deposit_history(self):
-        if not self.deposit_history:
+        if not self.aggregates.deposit_count:
             messagebox.showinfo("Info", "Keine Historie zum Löschen vorhanden.")
             return
 
@@ -978,9 +1071,9 @@ class PfandCalculator:
                               "Sind Sie sicher, dass Sie die gesamte Abgabe-Historie löschen möchten?\n"
                               "Dieser Vorgang kann nicht rückgängig gemacht werden!"):
             try:
-                self.deposit_history = []
-                if os.path.exists('deposit_history.json'):
-                    os.remove('deposit_history.json')
+                self.core.clear_deposit_history()
+                if self.history_table is not None:
+                    self.history_table.set_history(self.deposit_history)
                 messagebox.showinfo("Erfolg", "Abgabe-Historie wurde erfolgreich gelöscht!")
             except Exception as e:
                 messagebox.showerror("Fehler", f"Fehler beim Löschen der Historie: {str(e)}")
@@ -1002,12 +1095,7 @@ class PfandCalculator:
                               "Sind Sie sicher, dass Sie alle Auszeichnungen löschen möchten?\n"
                               "Dieser Vorgang kann nicht rückgängig gemacht werden!"):
             try:
-                for achievement in self.achievements.values():
-                    achievement.unlocked = False
-                    achievement.unlock_date = None
-                
-                if os.path.exists('achievements.json'):
-                    os.remove('achievements.json')
+                self.core.clear_achievements()
                 messagebox.showinfo("Erfolg", "Alle Auszeichnungen wurden erfolgreich gelöscht!")
             except Exception as e:
                 messagebox.showerror("Fehler", f"Fehler beim Löschen der Auszeichnungen: {str(e)}")
@@ -1020,14 +1108,24 @@ class PfandCalculator:
             
             # Create frames for scanner layout
             self.camera_frame = ttk.Frame(self.scanner_window)
-            self.camera_frame.pack(side="left", padx=10, pady=5)
+            self.camera_frame.pack(side="left", padx=10, pady=5, fill="both", expand=True)
             
             self.scanner_control_frame = ttk.Frame(self.scanner_window)
             self.scanner_control_frame.pack(side="left", padx=10, pady=5, fill="y")
             
-            # Create camera label
+            # Camera, recorded video, image folder or rendered test barcodes
+            source_frame = ttk.LabelFrame(self.scanner_control_frame, text="Bildquelle")
+            source_frame.pack(pady=5, padx=5, fill="x")
+            
+            self.source_spec = "camera:0"
+            self.source_combo = ttk.Combobox(source_frame, state="readonly", values=list(SCANNER_SOURCES))
+            self.source_combo.current(0)
+            self.source_combo.pack(pady=2, padx=5, fill="x")
+            self.source_combo.bind("<<ComboboxSelected>>", self.change_scanner_source)
+            
+            # Create camera label (the preview is scaled to its size)
             self.camera_label = ttk.Label(self.camera_frame)
-            self.camera_label.pack()
+            self.camera_label.pack(fill="both", expand=True)
             
             # Create focus control
             focus_frame = ttk.LabelFrame(self.scanner_control_frame, text="Kamera Einstellungen")
@@ -1069,13 +1167,13 @@ class PfandCalculator:
             )
             self.scan_button.pack(pady=10)
             
-            # Initialize scan counter for achievements
-            self.daily_scans = 0
-            self.total_scans = 0
-            self.last_scan_date = None
-            
-            # Queue for thread-safe communication
-            self.queue = queue.Queue()
+            # Which decode scale finds the barcodes (see decoding.decode_pyramid)
+            self.scale_label = ttk.Label(self.scanner_control_frame, text="")
+            self.scale_label.pack(pady=2)
+            self.rate_label = ttk.Label(self.scanner_control_frame, text="")
+            self.rate_label.pack(pady=2)
+            self.last_scan_label = ttk.Label(self.scanner_control_frame, text="")
+            self.last_scan_label.pack(pady=2)
             
             # Set window size to match camera resolution
             self.scanner_window.geometry("1600x800")
@@ -1083,132 +1181,159 @@ class PfandCalculator:
     def close_scanner_window(self):
         if self.scanning:
             self.toggle_scanning()
-        if self.cap:
-            self.cap.release()
-            self.cap = None
         if self.scanner_window:
             self.scanner_window.destroy()
             self.scanner_window = None
 
+    def change_scanner_source(self, event=None):
+        choice = self.source_combo.get()
+        spec = SCANNER_SOURCES[choice]
+        if choice == "Videodatei...":
+            path = filedialog.askopenfilename(parent=self.scanner_window, title="Video auswählen",
+                                              filetypes=[("Videos", "*.mp4 *.avi *.mkv *.mov"), ("Alle Dateien", "*.*")])
+            spec = f"video:{path}" if path else None
+        elif choice == "Bildordner...":
+            path = filedialog.askdirectory(parent=self.scanner_window, title="Bildordner auswählen")
+            spec = f"images:{path}" if path else None
+        
+        if spec is None:
+            # Cancelled, keep the previous source
+            self.source_combo.set(next((name for name, value in SCANNER_SOURCES.items()
+                                        if value == self.source_spec), self.source_combo.get()))
+            return
+        self.source_spec = spec
+        if self.scanning:
+            self.toggle_scanning()
+            self.toggle_scanning()
+
     def toggle_scanning(self):
         if not self.scanning:
-            self.cap = cv2.VideoCapture(0)
+            try:
+                cap = open_source(self.source_spec)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Fehler", f"Bildquelle konnte nicht geöffnet werden: {str(e)}")
+                return
+            if not cap.isOpened():
+                cap.release()
+                messagebox.showerror("Fehler", "Bildquelle konnte nicht geöffnet werden")
+                return
+            self.scan_source_name = cap.name
+            
+            # Set optimal camera properties for performance (ignored by the other sources)
+            cap.set(cv2.CAP_PROP_FPS, 30)  # Request 30 FPS
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer delay
             
-            # Set optimal camera properties for performance
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)  # Request 30 FPS
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer delay
+            cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+            cap.set(cv2.CAP_PROP_FOCUS, 0)
             
-            self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-            self.cap.set(cv2.CAP_PROP_FOCUS, 0)
+            # Reading and decoding run on their own threads from here on.
+            # Frames are decoded downscaled first, full resolution only if that finds nothing.
+            # Unchanged frames (empty counter) are not decoded at all, the decode
+            # rate adapts to the measured decode time and the CPU load.
+            pool = DecodePool(decoder=pyramid_decoder())
+            self.decode_scheduler = DecodeScheduler(DECODE_RATE, workers=pool.workers)
+            self.scan_pipeline = ScanPipeline(cap, pool=pool, tracker=RoiTracker(), gate=MotionGate(),
+                                              scheduler=self.decode_scheduler)
+            self.pyramid_stats = PyramidStats()
+            self.scan_pipeline.start()
+            self.preview = PreviewRenderer(self.camera_label, PREVIEW_FPS)
+            self.painted_seq = 0
+            self.last_detections = (0, [])
             
             self.scanning = True
             self.scan_button.configure(text="Scannen Stoppen")
             self.process_video()
         else:
             self.scanning = False
-            if self.cap:
-                self.cap.release()
-            self.cap = None
+            if self.scan_pipeline:
+                self.scan_pipeline.stop()  # releases the camera and the decode pool
+            self.scan_pipeline = None
             self.scan_button.configure(text="Scannen Starten")
-            self.camera_label.configure(image='')
+            self.preview.clear()
 
     def toggle_autofocus(self):
-        if self.cap:
+        if self.scan_pipeline:
             if self.autofocus_var.get():
-                self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+                self.scan_pipeline.set_property(cv2.CAP_PROP_AUTOFOCUS, 1)
                 self.focus_slider.state(['disabled'])
             else:
-                self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+                self.scan_pipeline.set_property(cv2.CAP_PROP_AUTOFOCUS, 0)
                 self.focus_slider.state(['!disabled'])
-                self.cap.set(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
-
-    def adjust_image(self, frame):
-        # This method is now only used for preview adjustments
-        brightness = self.brightness_slider.get() / 50.0 - 1.0
-        contrast = self.contrast_slider.get() / 50.0
-        
-        adjusted = cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness * 127)
-        return adjusted
+                self.scan_pipeline.set_property(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
 
     def process_video(self):
+        # Runs on the Tk thread: only drains decode results and paints the newest frame
         if not self.scanning:
             return
             
         try:
-            ret, frame = self.cap.read()
-            if ret:
-                if not self.autofocus_var.get():
-                    self.cap.set(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
-                
-                # Resize frame for faster processing (720p is plenty for barcode detection)
-                frame = cv2.resize(frame, (1280, 720))
-                
-                # Only process every 3rd frame for barcode detection
-                if hasattr(self, 'frame_count'):
-                    self.frame_count += 1
-                else:
-                    self.frame_count = 0
-                
-                if self.frame_count % 3 == 0:  # Process every 3rd frame
-                    # Process in grayscale for better performance
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    barcodes = decode(gray)
-                    
-                    for barcode in barcodes:
-                        points = barcode.polygon
-                        if len(points) == 4:
-                            pts = np.array([(p.x, p.y) for p in points])
-                            cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
-                    
-                        barcode_data = barcode.data.decode('utf-8')
-                        if barcode_data not in self.scanned_barcodes:
-                            self.scanned_barcodes.add(barcode_data)
-                            self.scanner_window.after(0, lambda d=barcode_data: self.handle_barcode(d))
+            if not self.autofocus_var.get():
+                self.scan_pipeline.set_property(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
+            
+            results = self.scan_pipeline.poll()
+            for seq, detections in results:
+                self.pyramid_stats.record(detections)
+                if detections:
+                    self.last_detections = (seq, detections)
+                for detection in detections:
+                    if self.recent_barcodes.is_new(detection.data):
+                        self.scanner_window.after(0, lambda d=detection.data: self.handle_barcode(d))
+            
+            seq, frame = self.scan_pipeline.latest_frame()
+            if frame is not None and seq != self.painted_seq and self.preview.due:
+                self.painted_seq = seq
                 
-                # Convert and display frame
-                cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-                img = Image.fromarray(cv2image)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.camera_label.imgtk = imgtk
-                self.camera_label.configure(image=imgtk)
+                # Outline barcodes found in the last few frames
+                detection_seq, detections = self.last_detections
+                polygons = [d.polygon for d in detections] if seq - detection_seq <= 10 else []
+                self.preview.render(frame, polygons)
             
-            if self.scanning:
-                # Use a shorter delay for higher frame rate
-                self.scanner_window.after(5, self.process_video)
+            if results:
+                self.scale_label.configure(text=f"Treffer je Stufe: {self.pyramid_stats.summary()}")
+                self.rate_label.configure(text=f"Dekodierrate: {self.decode_scheduler.summary()}")
         except Exception as e:
             print(f"Error in process_video: {e}")
-            if self.scanning:
-                self.scanner_window.after(5, self.process_video)
+        
+        if self.scanning:
+            self.scanner_window.after(15, self.process_video)
+
+    def track_dialog(self, dialog, barcode_data):
+        # A barcode is not asked for again while one of its dialogs is open,
+        # however long that takes (the dedup window may have run out by then)
+        self.open_dialogs.add(barcode_data)
+
+        def closed(event):
+            if event.widget is dialog:
+                self.open_dialogs.discard(barcode_data)
+        dialog.bind('<Destroy>', closed)
 
     def handle_barcode(self, barcode_data):
+        if barcode_data in self.open_dialogs:
+            return
+        # Barcodes classified before are counted without asking (see the catalog in core.py)
+        entry, unlocked = self.core.record_known_scan(barcode_data, source=f"scanner:{self.scan_source_name}")
+        if entry is not None:
+            result = entry['product'] if entry['has_pfand'] else "kein Pfand"
+            self.last_scan_label.configure(text=f"{barcode_data}: {result}")
+            self.show_unlocked_achievements(unlocked)
+            return
+        
         # First dialog for Pfand symbol verification
         verify_dialog = tk.Toplevel(self.scanner_window)
         verify_dialog.title("Pfand Symbol Überprüfung")
         verify_dialog.transient(self.scanner_window)
         verify_dialog.grab_set()
+        self.track_dialog(verify_dialog, barcode_data)
         
         ttk.Label(verify_dialog, text="Ist ein Pfand Symbol auf dem Produkt?").pack(pady=10)
         
         def handle_verification(has_pfand):
             verify_dialog.destroy()
             if has_pfand:
-                # Add barcode to history with timestamp and Pfand status
-                self.barcode_history.append({
-                    'timestamp': datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
-                    'barcode': barcode_data,
-                    'has_pfand': True
-                })
+                # Logged once the product is chosen (or skipped)
                 self.show_product_selection_dialog(barcode_data)
             else:
-                # Add barcode to history with timestamp and Pfand status
-                self.barcode_history.append({
-                    'timestamp': datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
-                    'barcode': barcode_data,
-                    'has_pfand': False
-                })
-                self.scanned_barcodes.remove(barcode_data)
+                self.core.record_scan(barcode_data, False, source=f"scanner:{self.scan_source_name}")
                 messagebox.showinfo("Kein Pfand", "Dieses Produkt hat kein Pfand Symbol.")
         
         button_frame = ttk.Frame(verify_dialog)
@@ -1221,6 +1346,7 @@ class PfandCalculator:
         dialog.title("Barcode Erkannt")
         dialog.transient(self.scanner_window)
         dialog.grab_set()
+        self.track_dialog(dialog, barcode_data)
         
         ttk.Label(dialog, text=f"Barcode erkannt: {barcode_data}").pack(pady=10)
         ttk.Label(dialog, text="Produkttyp auswählen:").pack(pady=5)
@@ -1232,39 +1358,14 @@ class PfandCalculator:
         def confirm():
             selected_product = product_var.get()
             if selected_product:
-                print(f"Erhöhe {selected_product}")  # Debug print
-                # Update quantity
-                current_qty = self.quantities.get(selected_product, 0)
-                self.quantities[selected_product] = current_qty + 1
-                print(f"Neue Menge für {selected_product}: {self.quantities[selected_product]}")  # Debug print
-                
-                # Update scan counters and check achievements
-                self.update_scan_achievements()
-                
-                # Force immediate UI update
-                def do_update():
-                    try:
-                        # Directly update the spinbox
-                        spinbox = self.spinboxes[selected_product]
-                        spinbox.set(str(self.quantities[selected_product]))
-                        spinbox.update()  # Force the spinbox to update
-                        
-                        # Update the total
-                        self.update_total()
-                        self.root.update_idletasks()  # Force the entire UI to update
-                        
-                        # Save the quantities
-                        self.save_quantities()
-                        print("UI Update und Speicherung abgeschlossen")  # Debug print
-                    except Exception as e:
-                        print(f"Fehler beim UI Update: {e}")
-                
-                # Schedule the update for the next event loop iteration
-                self.root.after(1, do_update)
                 dialog.destroy()
+                # Logs the scan, increments the quantity (spinbox follows via the
+                # core listener), updates the scan counters and checks achievements
+                unlocked = self.core.record_scan(barcode_data, True, selected_product, source=f"scanner:{self.scan_source_name}")
+                self.show_unlocked_achievements(unlocked)
         
         def skip():
-            self.scanned_barcodes.remove(barcode_data)
+            self.core.record_scan(barcode_data, True, source=f"scanner:{self.scan_source_name}")
             dialog.destroy()
         
         button_frame = ttk.Frame(dialog)
@@ -1272,145 +1373,75 @@ class PfandCalculator:
         ttk.Button(button_frame, text="Hinzufügen", command=confirm).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Überspringen", command=skip).pack(side=tk.LEFT, padx=5)
 
-    def update_scan_achievements(self):
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # Update daily scan counter
-        if self.last_scan_date != current_date:
-            self.daily_scans = 1
-            self.last_scan_date = current_date
-        else:
-            self.daily_scans += 1
-        
-        # Update total scan counter
-        self.total_scans += 1
-        
-        # Check scan-related achievements
-        achievements_to_check = {
-            1: "first_scan",
-            50: "scans_50",
-            100: "scans_100",
-            500: "scans_500"
-        }
-        
-        # Check total scans achievements
-        for count, achievement_key in achievements_to_check.items():
-            if self.total_scans == count and not self.achievements[achievement_key].unlocked:
-                self.unlock_achievement(achievement_key)
-                self.save_achievements()
-        
-        # Check daily scan achievements
-        daily_achievements = {
-            10: "daily_10",
-            25: "daily_25"
-        }
-        
-        for count, achievement_key in daily_achievements.items():
-            if self.daily_scans == count and not self.achievements[achievement_key].unlocked:
-                self.unlock_achievement(achievement_key)
-                self.save_achievements()
-        
-        # Save the updated scan counts
-        self.save_quantities()  # This ensures we don't lose progress
-
-    def update_ui(self):
-        def update_spinboxes():
-            try:
-                # Update all spinboxes to match quantities
-                main_frame = self.root.winfo_children()[0]  # Get the main frame
-                for frame in main_frame.winfo_children():
-                    if isinstance(frame, ttk.Frame):
-                        # Find the product this frame represents
-                        for widget in frame.winfo_children():
-                            if isinstance(widget, ttk.Label) and widget.cget('text') in self.products:
-                                product = widget.cget('text')
-                                current_qty = self.quantities.get(product, 0)
-                                # Find and update the spinbox
-                                for w in frame.winfo_children():
-                                    if isinstance(w, ttk.Spinbox):
-                                        w.set(str(current_qty))
-                                        w.update()
-                                        break
-                
-                # Update the total
-                self.update_total()
-            except Exception as e:
-                print(f"Error updating UI: {e}")
-        
-        # Ensure updates happen in the main thread
-        if threading.current_thread() is threading.main_thread():
-            update_spinboxes()
-        else:
-            self.root.after(0, update_spinboxes)
-
     def on_closing(self):
         if self.scanner_window and self.scanner_window.winfo_exists():
             self.close_scanner_window()
         self.root.destroy()
 
+    def shutdown(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.join(timeout=2)
+        # Write everything that is still pending (also after Strg+Q)
+        try:
+            self.core.close()
+        except Exception as e:
+            print(f"Error saving on shutdown: {e}")
+
     def export_barcodes_csv(self):
-        if not self.barcode_history:
+        if self.scan_log.is_empty():
             messagebox.showinfo("Info", "Keine Barcodes zum Exportieren vorhanden.")
             return
+        if self.export_job is not None:
+            messagebox.showinfo("Info", "Es läuft bereits ein Export.")
+            return
 
-        try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV Dateien", "*.csv")],
-                initialfile="barcode_historie.csv"
-            )
-            
-            if not file_path:
-                return
+        file_path = self.ask_export_path("barcode_historie.csv")
+        if not file_path:
+            return
 
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile, delimiter=';')
-                
-                # Write header
-                writer.writerow(['Datum', 'Barcode', 'Hat Pfand'])
-                
-                # Write barcode history
-                for entry in self.barcode_history:
-                    writer.writerow([
-                        entry['timestamp'],
-                        entry['barcode'],
-                        'Ja' if entry['has_pfand'] else 'Nein'
-                    ])
-            
-            messagebox.showinfo("Erfolg", "Barcode Historie wurde erfolgreich exportiert!")
-        except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Exportieren: {str(e)}")
+        def pfand_text(has_pfand):
+            return '' if has_pfand is None else 'Ja' if has_pfand else 'Nein'
 
-    def load_products(self):
-        try:
-            with open('products.json', 'r') as f:
-                data = json.load(f)
-                self.products = data.get('products', [])
-                self.PRICES = data.get('prices', {})
-        except FileNotFoundError:
-            # Default products if no JSON exists
-            self.products = ["Flaschen", "Bierflasche", "Kasten", "Dose", "Plastikflasche", "Monster", "Joghurt Glas"]
-            self.PRICES = {
-                "Flaschen": 0.25,
-                "Bierflasche": 0.20,
-                "Kasten": 3.00,
-                "Dose": 0.25,
-                "Plastikflasche": 0.25,
-                "Monster": 0.25,
-                "Joghurt Glas": 0.17,
-            }
-            self.save_products()
-
-    def save_products(self):
-        try:
-            data = {
-                'products': self.products,
-                'prices': self.PRICES
-            }
-            with open('products.json', 'w') as f:
-                json.dump(data, f)
-        except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Speichern der Produkte: {str(e)}")
+        # Streamed from the scan log on the export thread (all sessions, all segments)
+        rows = ([entry['timestamp'], entry['barcode'], pfand_text(entry['has_pfand']),
+                 entry['product'] or '', entry['source'] or '']
+                for entry in self.scan_log.iter_events())
+        self.start_export(file_path, ['Datum', 'Barcode', 'Hat Pfand', 'Produkt', 'Quelle'], rows, None, "Barcodes")
+
+    def show_barcode_catalog(self):
+        catalog_window = tk.Toplevel(self.root)
+        catalog_window.title("Barcode Katalog")
+        catalog_window.geometry("700x400")
+        
+        columns = ("Barcode", "Produkt", "Hat Pfand", "Zuletzt gesehen", "Anzahl")
+        tree = ttk.Treeview(catalog_window, columns=columns, show="headings")
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=120)
+        scrollbar = ttk.Scrollbar(catalog_window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        
+        def refresh():
+            tree.delete(*tree.get_children())
+            entries = sorted(self.core.catalog.items(), key=lambda item: item[1]['count'], reverse=True)
+            for barcode, entry in entries:
+                has_pfand = '' if entry['has_pfand'] is None else 'Ja' if entry['has_pfand'] else 'Nein'
+                tree.insert("", "end", iid=barcode, values=(barcode, entry['product'] or '', has_pfand,
+                                                            entry['last_seen'] or '', entry['count']))
+        
+        def forget():
+            # The next scan of these barcodes asks again
+            for barcode in tree.selection():
+                self.core.forget_barcode(barcode)
+            refresh()
+        
+        button_frame = ttk.Frame(catalog_window)
+        button_frame.pack(side="bottom", pady=5)
+        ttk.Button(button_frame, text="Auswahl vergessen", command=forget).pack(side=tk.LEFT, padx=5)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        refresh()
 
     def show_add_product_window(self):
         dialog = tk.Toplevel(self.root)
@@ -1475,9 +1506,11 @@ class PfandCalculator:
                     return
 
             # Add the new product
-            self.products.append(name)
-            self.PRICES[name] = deposit
-            self.save_products()
+            try:
+                self.core.add_product(name, deposit)
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Fehler beim Speichern der Produkte: {str(e)}")
+                return
 
             # Update the UI
             self.recreate_widgets()
@@ -1619,9 +1652,11 @@ class PfandCalculator:
                     return
 
             # Add the new product
-            self.products.append(name)
-            self.PRICES[name] = deposit
-            self.save_products()
+            try:
+                self.core.add_product(name, deposit)
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Fehler beim Speichern der Produkte: {str(e)}")
+                return
 
             # Update treeview
             tree.insert('', 'end', values=(name, f"{deposit:.2f}"))
@@ -1646,9 +1681,12 @@ class PfandCalculator:
                 item = tree.item(selected[0])
                 product_name = item['values'][0]
                 
-                # Remove from lists
-                self.products.remove(product_name)
-                del self.PRICES[product_name]
+                # Remove from the product list (saved by the core)
+                try:
+                    self.core.remove_product(product_name)
+                except Exception as e:
+                    messagebox.showerror("Fehler", f"Fehler beim Speichern der Produkte: {str(e)}")
+                    return
                 
                 # Delete image if exists
                 image_path = f"PfandApplication/images/{product_name.lower()}.png"
@@ -1658,8 +1696,7 @@ class PfandCalculator:
                     except Exception as e:
                         print(f"Fehler beim Löschen des Bildes: {e}")
 
-                # Save changes and update UI
-                self.save_products()
+                # Update UI
                 self.recreate_widgets()
                 dialog.destroy()
 
@@ -1680,8 +1717,8 @@ class PfandCalculator:
         # Recreate menu
         self.create_menu()
         
-        # Reload quantities
-        self.load_quantities()
+        # Reload quantities (write pending changes first)
+        self.core.reload_quantities()
         
         # Recreate main widgets
         self.create_widgets()
@@ -1690,6 +1727,7 @@ class PfandCalculator:
     def launch(check_for_update) -> None:
      root = tk.Tk()
      app = PfandCalculator(root)
+     root.protocol("WM_DELETE_WINDOW", app.on_closing)
 
      #Icon (Version Pineapple | not really sure if this works yet!)
      #TODO: Check if this shit works (On Windows and Linux)
@@ -1709,5 +1747,6 @@ class PfandCalculator:
          root.after(1, run_silent_update)
 
      root.mainloop()
+     app.shutdown()
 
 if __name__ == "__main__": PfandCalculator.launch(True)
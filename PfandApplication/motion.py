@@ -0,0 +1,78 @@
+"""
+
+Motion Gate
+
+Skips decoding while the picture does not change (empty counter, nothing
+in front of the camera). Each frame is shrunk to a tiny grayscale
+thumbnail and compared with the previous one (mean absolute difference).
+
+    - change above threshold  ->  decode, and keep decoding for the next
+                                  burst_frames frames (the product is
+                                  usually held still right after moving it)
+    - no change               ->  skip, but decode every idle_interval
+                                  seconds anyway so nothing is missed for
+                                  good
+
+The idle interval is in seconds, not frames, and shorter than the dedup
+window: the decode rate drops to about 1 fps on slow machines, and a
+bottle standing still has to be decoded again before its DedupCache
+entry expires, or it would be counted a second time.
+
+"""
+import time
+
+import cv2
+import numpy as np
+
+from PfandApplication.decoding import to_gray
+from PfandApplication.dedup import DEFAULT_WINDOW
+
+
+class MotionGate:
+    def __init__(self, threshold=4.0, burst_frames=15, idle_interval=DEFAULT_WINDOW / 2, size=(64, 36)):
+        self.threshold = threshold  # mean grey value difference (0-255)
+        self.burst_frames = burst_frames
+        self.idle_interval = idle_interval  # seconds, 0 -> never decode static frames
+        self.size = size
+        self.previous = None
+        self.burst = 0
+        self.last_pass = None
+
+        self.passed = 0
+        self.skipped = 0
+        self.last_difference = 0.0
+
+    def thumbnail(self, frame):
+        return cv2.resize(to_gray(frame), self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def changed(self, frame, now=None):
+        # True if this frame should be decoded
+        now = time.monotonic() if now is None else now
+        thumbnail = self.thumbnail(frame)
+        if self.previous is None or self.previous.shape != thumbnail.shape:
+            self.previous = thumbnail
+            self.burst = self.burst_frames
+            return self._pass(now)
+
+        self.last_difference = float(np.abs(thumbnail - self.previous).mean())
+        self.previous = thumbnail
+        if self.last_difference >= self.threshold:
+            self.burst = self.burst_frames
+            return self._pass(now)
+
+        if self.burst > 0:
+            self.burst -= 1
+            return self._pass(now)
+
+        if self.idle_interval and now - self.last_pass >= self.idle_interval:
+            return self._pass(now)
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        self.previous = None
+
+    def _pass(self, now):
+        self.last_pass = now
+        self.passed += 1
+        return True
@@ -0,0 +1,80 @@
+"""
+
+Write-Behind Persistence
+
+Changes are only marked as dirty, a timer writes the newest state once
+after delay_ms. Bursts of changes (e.g. a scan session) become one write.
+flush() writes immediately (Strg+S, shutdown).
+
+With merge=True the data are dicts of changes (e.g. barcode -> catalog
+entry): marked changes are merged into the pending ones instead of
+replacing them, so one write gets everything changed since the last.
+
+"""
+import copy
+import threading
+
+
+class WriteBehind:
+    def __init__(self, write, delay_ms=500, merge=False):
+        self.write = write
+        self.delay = delay_ms / 1000.0
+        self.merge = merge
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # keeps writes in order
+        self.pending = None
+        self.dirty = False
+        self.timer = None
+
+    def mark_dirty(self, data):
+        with self.lock:
+            # Deep copy now: the caller keeps mutating its dict and the nested
+            # ones (totals per product, catalog entries) while the timer writes
+            data = copy.deepcopy(data)
+            if self.merge and self.dirty:
+                self.pending.update(data)
+            else:
+                self.pending = data
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return False
+                data = self.pending
+                self.pending = None
+                self.dirty = False
+            try:
+                self.write(data)
+            except Exception:
+                # Keep the data dirty so the next flush (or shutdown) retries
+                with self.lock:
+                    if not self.dirty:
+                        self.pending = data
+                        self.dirty = True
+                    elif self.merge:
+                        self.pending = {**data, **self.pending}
+                raise
+            return True
+
+    def discard(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending = None
+            self.dirty = False
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error in write-behind flush: {e}")
@@ -1,18 +1,35 @@
 # µScan V2.2.2
 import tkinter as tk
-from tkinter import ttk, simpledialog, messagebox
+from tkinter import ttk, simpledialog, messagebox, filedialog
 import cv2
-from PIL import Image, ImageTk
-from pyzbar.pyzbar import decode
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
 import queue
-import json
-import os
 import time
 
+from PfandApplication.core import PfandCore
+from PfandApplication.decode_pool import DecodePool
+from PfandApplication.decoding import PyramidStats
+from PfandApplication.dedup import DedupCache
+from PfandApplication.devices import DeviceCache
+from PfandApplication.frame_sources import CameraSource, open_source
+from PfandApplication.pfand_types import load_table
+from PfandApplication.preprocessing import MAX_VARIANTS, PreprocessCascade, benchmark_variants, decode_cascade_pyramid, load_profile, save_profile
+from PfandApplication.roi_tracker import RoiTracker
+from PfandApplication.preview import PreviewRenderer
+from PfandApplication.motion import MotionGate
+from PfandApplication.scheduler import DecodeScheduler
+
+# Sources besides the cameras (see frame_sources.py), None -> ask for a file/folder
+SOURCE_CHOICES = {
+    "Video file...": None,
+    "Image folder...": None,
+    "Synthetic EAN-13": "synthetic",
+    "Synthetic EAN-8": "synthetic:ean8",
+}
+
 class PfandScanner:
-    def __init__(self, window, window_title):
+    def __init__(self, window, window_title, core=None, on_achievements=None):
         self.window = window
         self.window.title(window_title)
         self.window.geometry("1920x1080")
@@ -20,28 +37,46 @@ class PfandScanner:
         self.window.columnconfigure(0, weight=1)
         self.window.rowconfigure(0, weight=1)
 
-        self.data_file = "quantities.json"
-        self.load_json()
-
-        self.barcode_times = {}
-        self.prompted_barcodes = set()
+        # Shares the core with the main window if started from there,
+        # standalone it opens its own
+        self.owns_core = core is None
+        self.core = core or PfandCore()
+        # Keys of achievements unlocked by a scan, the main window passes its own popup
+        self.on_achievements = on_achievements or self.show_unlocked_achievements
 
-        self.selected_device_index = tk.IntVar(value=0)
-        self.last_process_time = time.time()
+        self.source_spec = "camera:0"  # see frame_sources.open_source
+        self.source_choice = None  # combobox entry of a source that is not a camera
 
         # FPS Einstellung ist hier!
         # FPS Setting is here!
-        self.process_interval = 0.30 # 30 FPS
+        self.decode_rate = 10 # Decodes per second (target, lowered automatically if the CPU can't keep up)
+        self.preview_fps = 30 # Preview only, decoding has its own rate
+        self.scan_window = 5 # Seconds in which the same barcode counts as the same bottle
+        self.prompt_window = 600 # Seconds before asking for the product of a barcode again
+
+        self.recent_scans = DedupCache(self.scan_window)
+        self.prompted_barcodes = DedupCache(self.prompt_window)
+        self.open_prompts = set()  # barcodes whose product dialog is open right now
+
+        # Downscaled first, full resolution (with the preprocessing cascade) only if that finds nothing
+        self.decode_pool = DecodePool(decoder=decode_cascade_pyramid)
+        self.decode_scheduler = DecodeScheduler(self.decode_rate, workers=self.decode_pool.workers)
+        self.pyramid_stats = PyramidStats()
+        self.roi_tracker = RoiTracker()
+        self.motion_gate = MotionGate()  # skip decoding while nothing moves
+        self.decode_regions = {}  # seq -> (region, preprocessing order) handed to the pool
+        # Preprocessing variants, the one that hits most often is tried first
+        self.cascade = PreprocessCascade()
+        self.benchmark_frames = None  # frames collected for a benchmark run
+        self.benchmark_results = queue.Queue()
+        self.frame_seq = 0
 
         self.init_gui()
         self.init_camera()
 
-        self.queue = queue.Queue()
-        self.pfand_values = {
-            "EINWEG": 0.25,
-            "MEHRWEG": 0.15,
-            "DOSE": 0.25,
-        }
+        self.queue = queue.Queue()  # (barcode, symbology), misreads are already dropped by the decoder
+        # Container type and deposit by barcode prefix (pfand_prefixes.json)
+        self.pfand_table = load_table()
 
         self.update_preview()
         self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -66,6 +101,7 @@ class PfandScanner:
 
         self.camera_label = ttk.Label(self.camera_frame)
         self.camera_label.pack(expand=True, fill="both")
+        self.preview = PreviewRenderer(self.camera_label, self.preview_fps)
 
         self.init_device_selector()
         self.init_controls()
@@ -80,25 +116,86 @@ class PfandScanner:
         self.device_combo = ttk.Combobox(device_frame, state="readonly")
         self.device_combo.pack(fill="x", padx=5)
 
-        available_devices = self.list_video_devices()
-        self.device_combo['values'] = [f"Camera {i}" for i in available_devices]
-        self.device_combo.current(0)
+        # Besides the cameras: recorded videos, image folders and rendered test barcodes.
+        # The cached device list is shown at once, discovery runs in the background.
+        self.device_cache = DeviceCache()
+        self.device_results = queue.Queue()
+        self.pending_discoveries = 0
+        self.device_indices = []
+        self.device_choice = 0
+        self.set_video_devices(self.device_cache.cached() or [])
         self.device_combo.bind("<<ComboboxSelected>>", self.change_camera)
 
-    def list_video_devices(self, max_devices=10):
-        available = []
-        for i in range(max_devices):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                available.append(i)
-                cap.release()
-        return available
+        ttk.Button(device_frame, text="Refresh", command=lambda: self.discover_devices(refresh=True)).pack(pady=2)
+        self.discover_devices()
+
+    def discover_devices(self, refresh=False):
+        def discover():
+            try:
+                self.device_results.put(self.device_cache.devices(refresh))
+            except Exception as e:
+                print(f"Error listing video devices: {e}")
+                self.device_results.put(None)
+        threading.Thread(target=discover, daemon=True).start()
+        self.pending_discoveries += 1
+        if self.pending_discoveries == 1:
+            self.window.after(100, self.poll_devices)
+
+    def poll_devices(self):
+        try:
+            devices = self.device_results.get_nowait()
+            self.pending_discoveries -= 1
+            if devices is not None:
+                self.set_video_devices(devices)
+        except queue.Empty:
+            pass
+        if self.pending_discoveries:
+            self.window.after(100, self.poll_devices)
+
+    def set_video_devices(self, devices):
+        self.device_indices = [device.index for device in devices] or [0]
+        names = {device.index: device.name for device in devices}
+        cameras = [f"Camera {i} ({names[i]})" if names.get(i) else f"Camera {i}" for i in self.device_indices]
+        self.device_combo['values'] = cameras + list(SOURCE_CHOICES)
+
+        # Keep showing the source in use
+        kind, _, argument = self.source_spec.partition(':')
+        if kind != 'camera':
+            self.device_choice = len(cameras) + list(SOURCE_CHOICES).index(self.source_choice)
+        elif int(argument) in self.device_indices:
+            self.device_choice = self.device_indices.index(int(argument))
+        elif devices and not (hasattr(self, 'cap') and self.cap.isOpened()):
+            # The camera in use is not there (anymore), take the first one found
+            self.device_choice = 0
+            self.source_spec = f"camera:{self.device_indices[0]}"
+            if hasattr(self, 'cap'):
+                self.init_camera()
+        self.device_combo.current(self.device_choice)
 
     def change_camera(self, event=None):
-        index = self.device_combo.current()
-        self.selected_device_index.set(index)
+        choice = self.device_combo.current()
+        if choice < len(self.device_indices):
+            spec = f"camera:{self.device_indices[choice]}"
+        else:
+            spec = self.ask_source(self.device_combo.get())
+            if spec is None:
+                self.device_combo.current(self.device_choice)  # cancelled
+                return
+            self.source_choice = self.device_combo.get()
+        self.device_choice = choice
+        self.source_spec = spec
         self.init_camera()
 
+    def ask_source(self, choice):
+        if choice == "Video file...":
+            path = filedialog.askopenfilename(parent=self.window, title="Choose video",
+                                              filetypes=[("Videos", "*.mp4 *.avi *.mkv *.mov"), ("All files", "*.*")])
+            return f"video:{path}" if path else None
+        if choice == "Image folder...":
+            path = filedialog.askdirectory(parent=self.window, title="Choose image folder")
+            return f"images:{path}" if path else None
+        return SOURCE_CHOICES[choice]
+
     def init_controls(self):
         focus_frame = ttk.LabelFrame(self.control_frame, text="Camera Controls")
         focus_frame.pack(pady=5, padx=5, fill="x")
@@ -126,6 +223,19 @@ class PfandScanner:
         self.contrast_slider.set(50)
         self.contrast_slider.pack(pady=2, padx=5, fill="x")
 
+        self.scale_label = ttk.Label(process_frame, text="")
+        self.scale_label.pack(pady=2)
+        self.rate_label = ttk.Label(process_frame, text="")
+        self.rate_label.pack(pady=2)
+
+        cascade_frame = ttk.LabelFrame(self.control_frame, text="Preprocessing")
+        cascade_frame.pack(pady=5, padx=5, fill="x")
+
+        self.cascade_label = ttk.Label(cascade_frame, text="", wraplength=250)
+        self.cascade_label.pack(pady=2)
+        self.benchmark_button = ttk.Button(cascade_frame, text="Benchmark Camera", command=self.start_benchmark)
+        self.benchmark_button.pack(pady=2)
+
     def init_treeview(self):
         self.tree = ttk.Treeview(self.info_frame, columns=("Time", "Barcode", "Type", "Deposit"), show="headings")
         for col in ["Time", "Barcode", "Type", "Deposit"]:
@@ -142,22 +252,20 @@ class PfandScanner:
     def init_camera(self):
         if hasattr(self, 'cap') and self.cap and self.cap.isOpened():
             self.cap.release()
-        device_index = self.selected_device_index.get()
-        self.cap = cv2.VideoCapture(device_index, cv2.CAP_DSHOW if os.name == 'nt' else 0)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        # Files and synthetic frames are not paced in read() (that would sleep on
+        # the Tk thread), update_preview schedules itself at their fps instead
+        try:
+            self.cap = open_source(self.source_spec, realtime=False)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not open {self.source_spec}: {e}")
+            self.source_spec = "camera:0"
+            self.cap = open_source(self.source_spec, realtime=False)
+        self.next_frame = time.perf_counter()
+        if self.source_spec.startswith('camera:') and not self.cap.isOpened():
+            self.device_cache.invalidate()  # unplugged since the device list was cached
+        self.motion_gate.reset()
         self.toggle_autofocus()
-
-    def load_json(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as f:
-                self.quantities = json.load(f)
-        else:
-            self.quantities = {}
-
-    def save_json(self):
-        with open(self.data_file, 'w') as f:
-            json.dump(self.quantities, f, indent=4)
+        self.load_cascade_profile()
 
     def toggle_autofocus(self):
         if self.cap:
@@ -169,14 +277,46 @@ class PfandScanner:
                 self.focus_slider.state(['!disabled'])
                 self.cap.set(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
 
-    def adjust_image(self, frame):
-        brightness = self.brightness_slider.get() / 50.0 - 1.0
-        contrast = self.contrast_slider.get() / 50.0
-        adjusted = cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness * 127)
-        gray = cv2.cvtColor(adjusted, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                     cv2.THRESH_BINARY, 11, 2)
+    def decode_settings(self):
+        # Slider values for the threshold variant (brightness -1..1, contrast factor)
+        return self.brightness_slider.get() / 50.0 - 1.0, self.contrast_slider.get() / 50.0
+
+    def camera_profile_key(self):
+        return self.source_spec
+
+    def load_cascade_profile(self):
+        self.cascade = PreprocessCascade()
+        profile = load_profile(self.camera_profile_key())
+        if profile:
+            self.cascade.load_dict(profile)
+        self.cascade_label.configure(text=self.cascade.summary())
+
+    def start_benchmark(self):
+        if self.benchmark_frames is not None:
+            return
+        self.benchmark_frames = []
+        self.benchmark_button.state(['disabled'])
+        self.cascade_label.configure(text="Collecting frames...")
+
+    def run_benchmark(self, frames, settings):
+        # Worker thread, the result is picked up by update_preview
+        try:
+            self.benchmark_results.put(benchmark_variants(frames, *settings))
+        except Exception as e:
+            print(f"Error in preprocessing benchmark: {e}")
+            self.benchmark_results.put(None)
+
+    def finish_benchmark(self, results):
+        self.benchmark_button.state(['!disabled'])
+        if results is None:
+            self.cascade_label.configure(text="Benchmark failed")
+            return
+        self.cascade.apply_benchmark(results)
+        try:
+            save_profile(self.camera_profile_key(), dict(self.cascade.to_dict(), benchmark=results))
+        except OSError as e:
+            print(f"Error saving preprocessing profile: {e}")
+        self.cascade_label.configure(text=self.cascade.summary())
 
     def update_preview(self):
         try:
@@ -185,44 +325,99 @@ class PfandScanner:
                 if not self.autofocus_var.get():
                     self.cap.set(cv2.CAP_PROP_FOCUS, self.focus_slider.get())
 
-                current_time = time.time()
-                if current_time - self.last_process_time >= self.process_interval:
-                    processed_frame = self.adjust_image(frame)
-                    barcodes = decode(processed_frame) or decode(frame)
-                    for barcode in barcodes:
-                        barcode_data = barcode.data.decode('utf-8')
-                        self.queue.put(barcode_data)
-                    self.last_process_time = current_time
-
-                cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-                img = Image.fromarray(cv2image)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.camera_label.imgtk = imgtk
-                self.camera_label.configure(image=imgtk)
+                # Decoding runs in the decode pool, the preview does not wait for it
+                if not self.decode_pool.full and self.decode_scheduler.due():
+                    # Nothing moved -> nothing new to decode
+                    if self.motion_gate.changed(frame):
+                        self.frame_seq += 1
+                        # Only the area around the last barcode, now and then the full frame
+                        region = self.roi_tracker.next_region(frame.shape)
+                        # Only the variants that are actually tried, so only those are scored
+                        order = self.cascade.order()[:MAX_VARIANTS]
+                        if self.decode_pool.submit(self.frame_seq, self.roi_tracker.crop(frame, region),
+                                                   order, *self.decode_settings()):
+                            self.decode_regions[self.frame_seq] = (region, order)
+
+                for seq, detections in self.decode_pool.results():
+                    self.decode_scheduler.record(self.decode_pool.last_latency)
+                    self.rate_label.configure(text=f"Decode rate: {self.decode_scheduler.summary()}")
+                    region, order = self.decode_regions.pop(seq, (None, self.cascade.order()[:MAX_VARIANTS]))
+                    detections = self.roi_tracker.update(region, detections)
+                    self.pyramid_stats.record(detections)
+                    self.cascade.record(order, detections)
+                    self.scale_label.configure(text=f"Hits per scale: {self.pyramid_stats.summary()}")
+                    self.cascade_label.configure(text=self.cascade.summary())
+                    for detection in detections:
+                        self.queue.put((detection.data, detection.type))
+
+                if self.benchmark_frames is not None and len(self.benchmark_frames) < 30:
+                    self.benchmark_frames.append(frame.copy())
+                    if len(self.benchmark_frames) == 30:
+                        self.cascade_label.configure(text="Benchmarking...")
+                        threading.Thread(target=self.run_benchmark, daemon=True,
+                                         args=(self.benchmark_frames, self.decode_settings())).start()
+                try:
+                    results = self.benchmark_results.get_nowait()
+                    self.benchmark_frames = None
+                    self.finish_benchmark(results)
+                except queue.Empty:
+                    pass
+
+                self.preview.render(frame)
         except Exception as e:
             print(f"Error in video preview: {e}")
 
-        self.window.after(10, self.update_preview)  # ~100 FPS preview
-
-    def show_product_selection(self, barcode_data):
+        self.window.after(self.preview_delay(), self.update_preview)
+
+    def preview_delay(self):
+        # ms until the next read: a camera blocks in read() until its next frame,
+        # the other sources get one frame per 1/fps
+        if isinstance(self.cap, CameraSource):
+            return 10
+        now = time.perf_counter()
+        self.next_frame += 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        if self.next_frame < now - 1.0:
+            self.next_frame = now  # fell behind, do not catch up with a burst
+        return max(1, int((self.next_frame - now) * 1000))
+
+    def show_product_selection(self, barcode_data, source=None, timestamp=None):
+        # The scan is logged with the chosen product (or without one if skipped)
         if hasattr(self, 'product_win') and self.product_win.winfo_exists():
+            # Not marked as prompted, the next scan asks again
+            self.core.record_scan(barcode_data, True, source=source, timestamp=timestamp, remember=False)
             return
 
         self.product_win = tk.Toplevel(self.window)
         self.product_win.title("Produktwahl")
+        # Marked once the dialog is really open: not asked again while it is
+        # open, nor within prompt_window afterwards
+        self.prompted_barcodes.is_new(barcode_data)
+        self.open_prompts.add(barcode_data)
+        product_win = self.product_win
+
+        def closed(event):
+            if event.widget is product_win:
+                self.open_prompts.discard(barcode_data)
+        product_win.bind('<Destroy>', closed)
+
+        def skip():
+            self.core.record_scan(barcode_data, True, source=source, timestamp=timestamp, remember=False)
+            product_win.destroy()
+        product_win.protocol("WM_DELETE_WINDOW", skip)
 
         ttk.Label(self.product_win, text=f"Welches Produkt soll dem Barcode '{barcode_data}' zugeordnet werden?").pack(pady=5)
 
         selected_product = tk.StringVar()
-        for prod in self.quantities:
+        for prod in self.core.products:
             ttk.Radiobutton(self.product_win, text=prod, variable=selected_product, value=prod).pack(anchor='w')
 
         def confirm():
             prod = selected_product.get()
             if prod:
-                self.quantities[prod] = self.quantities.get(prod, 0) + 1
-                self.save_json()
+                # Like the scanner window: counted, catalogued and in the scan statistics
+                unlocked = self.core.record_scan(barcode_data, True, prod, source=source, timestamp=timestamp)
                 self.product_win.destroy()
+                self.on_achievements(unlocked)
             else:
                 messagebox.showwarning("Keine Auswahl", "Bitte ein Produkt auswählen.")
 
@@ -230,25 +425,29 @@ class PfandScanner:
 
     def process_queue(self):
         try:
-            barcode_data = self.queue.get(timeout=0.1)
-            now = datetime.now()
-
-            timestamps = self.barcode_times.get(barcode_data, [])
-            timestamps = [t for t in timestamps if now - t <= timedelta(seconds=5)]
-            if len(timestamps) >= 3:
+            barcode_data, barcode_type = self.queue.get(timeout=0.1)
+            if not self.recent_scans.is_new(barcode_data):
                 return
-            timestamps.append(now)
-            self.barcode_times[barcode_data] = timestamps
+            now = datetime.now()
 
             current_time = now.strftime("%Y-%m-%d %H:%M:%S")
-            pfand_type = "EINWEG" if len(barcode_data) == 13 else "MEHRWEG" if len(barcode_data) == 8 else "DOSE"
-            deposit = self.pfand_values.get(pfand_type, 0.00)
-
-            self.tree.insert("", 0, values=(current_time, barcode_data, pfand_type, f"{deposit:.2f}"))
-
-            if barcode_data not in self.prompted_barcodes:
-                self.prompted_barcodes.add(barcode_data)
-                self.window.after(0, self.show_product_selection, barcode_data)
+            pfand_type = self.pfand_table.classify(barcode_data, barcode_type)
+
+            self.tree.insert("", 0, values=(current_time, barcode_data, pfand_type.type, f"{pfand_type.deposit:.2f}"))
+            source = f"uscan:{self.cap.name}"
+            timestamp = now.strftime("%d.%m.%Y %H:%M:%S")
+
+            # Barcodes with a known product are counted right away, the others are asked for
+            entry, unlocked = self.core.record_known_scan(barcode_data, source=source, timestamp=timestamp)
+            self.on_achievements(unlocked)
+            if entry is None:
+                # Books, coupons, deposit receipts, ... (no deposit in the table) are not asked for
+                has_pfand = pfand_type.deposit > 0
+                if has_pfand and barcode_data not in self.open_prompts and not self.prompted_barcodes.seen(barcode_data):
+                    self.window.after(0, self.show_product_selection, barcode_data, source, timestamp)
+                else:
+                    # Only a guess from the table: the main scanner still asks for this barcode
+                    self.core.record_scan(barcode_data, has_pfand, source=source, timestamp=timestamp, remember=False)
 
         except queue.Empty:
             pass
@@ -257,12 +456,22 @@ class PfandScanner:
         finally:
             self.window.after(100, self.process_queue)
 
+    def show_unlocked_achievements(self, achievement_keys):
+        for achievement_key in achievement_keys:
+            achievement = self.core.achievements[achievement_key]
+            messagebox.showinfo("Auszeichnung freigeschaltet!",
+                                f"Neue Auszeichnung: {achievement.title}\n\n{achievement.description}",
+                                parent=self.window)
+
     def on_closing(self):
         if self.cap and self.cap.isOpened():
             self.cap.release()
+        self.decode_pool.close()
+        if self.owns_core:
+            self.core.close()
         self.window.destroy()
 
 if __name__ != "__main__":
-    def launch_pfand_scanner():
+    def launch_pfand_scanner(core=None, on_achievements=None):
         scanner_window = tk.Toplevel()
-        PfandScanner(scanner_window, "µScan V2.2.2")
+        PfandScanner(scanner_window, "µScan V2.2.2", core, on_achievements)
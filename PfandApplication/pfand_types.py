@@ -0,0 +1,107 @@
+"""
+
+Pfand Classification
+
+Maps a barcode to its container type and deposit value with a prefix /
+range table instead of guessing from the length alone. The table is a
+data file (pfand_prefixes.json):
+
+    {"length": 13, "prefix": "", "type": "EINWEG", "deposit": 0.25}
+    {"length": 13, "from": "978", "to": "979", "type": "KEIN PFAND", "deposit": 0.0}
+
+    - length  ->  8 (EAN-8) or 13 (EAN-13; UPC-A/UPC-E are looked up as EAN-13)
+    - prefix  ->  every number starting with it, from/to a range of prefixes
+    - the narrowest matching range wins, "default" applies to everything
+      else (non GS1 barcodes, QR codes)
+
+On load the ranges are compiled per length into disjoint, sorted
+intervals, a lookup is one bisect (O(log n)):
+
+    table = load_table()
+    table.classify("9001234567892")   ->  PfandType(type='EINWEG', deposit=0.25, note=None)
+
+"""
+import json
+import os
+from bisect import bisect_right
+from collections import namedtuple
+
+from PfandApplication.ean import normalize
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pfand_prefixes.json')
+
+PfandType = namedtuple('PfandType', ['type', 'deposit', 'note'], defaults=(None,))
+
+# Used if the table file is missing (the old rule: length 13 / 8 / anything else)
+FALLBACK_TABLE = {
+    'default': {'type': 'DOSE', 'deposit': 0.25},
+    'ranges': [
+        {'length': 13, 'prefix': '', 'type': 'EINWEG', 'deposit': 0.25},
+        {'length': 8, 'prefix': '', 'type': 'MEHRWEG', 'deposit': 0.15},
+    ],
+}
+
+
+def range_bounds(entry, length):
+    # Prefixes -> first and last number of that length
+    start = entry.get('from', entry.get('prefix', ''))
+    end = entry.get('to', entry.get('prefix', ''))
+    if any(len(part) > length or part and not part.isdigit() for part in (start, end)):
+        raise ValueError(f"Ungültiger Bereich: {entry}")
+    return int(start.ljust(length, '0')), int(end.ljust(length, '9'))
+
+
+class PfandTable:
+    def __init__(self, data):
+        default = data.get('default', {})
+        self.default = PfandType(default.get('type', 'DOSE'), float(default.get('deposit', 0.0)), default.get('note'))
+        self.intervals = {}  # length -> (starts, ends, types)
+        by_length = {}
+        for position, entry in enumerate(data.get('ranges', [])):
+            length = int(entry.get('length', 13))
+            start, end = range_bounds(entry, length)
+            if start > end:
+                raise ValueError(f"Leerer Bereich: {entry}")
+            pfand_type = PfandType(entry['type'], float(entry.get('deposit', 0.0)), entry.get('note'))
+            by_length.setdefault(length, []).append((start, end, position, pfand_type))
+        for length, ranges in by_length.items():
+            self.intervals[length] = self.compile(ranges)
+
+    @staticmethod
+    def compile(ranges):
+        # Overlapping ranges -> disjoint intervals, each with the narrowest range
+        # covering it (the later one if equally wide)
+        points = sorted({start for start, _, _, _ in ranges} | {end + 1 for _, end, _, _ in ranges})
+        starts, ends, types = [], [], []
+        for segment_start, next_point in zip(points, points[1:]):
+            covering = [(end - start, -position, pfand_type) for start, end, position, pfand_type in ranges
+                        if start <= segment_start <= end]
+            if not covering:
+                continue
+            pfand_type = min(covering)[2]
+            if types and types[-1] == pfand_type and ends[-1] == segment_start - 1:
+                ends[-1] = next_point - 1
+            else:
+                starts.append(segment_start)
+                ends.append(next_point - 1)
+                types.append(pfand_type)
+        return starts, ends, types
+
+    def classify(self, barcode, barcode_type=None):
+        code = normalize(barcode, barcode_type)
+        if code is None or len(code) not in self.intervals:
+            return self.default
+        starts, ends, types = self.intervals[len(code)]
+        value = int(code)
+        index = bisect_right(starts, value) - 1
+        if index >= 0 and value <= ends[index]:
+            return types[index]
+        return self.default
+
+
+def load_table(path=TABLE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return PfandTable(json.load(f))
+    except FileNotFoundError:
+        return PfandTable(FALLBACK_TABLE)
@@ -0,0 +1,167 @@
+"""
+
+Preprocessing Cascade (µScan)
+
+Instead of always thresholding and then decoding twice, every frame runs
+through a cascade of preprocessing variants and stops at the first one
+that finds a barcode:
+
+    raw        ->  grayscale frame as it is
+    equalized  ->  histogram equalization (dark / low contrast scenes)
+    threshold  ->  brightness/contrast sliders, blur, adaptive threshold
+    sharpened  ->  unsharp mask (slightly blurry cameras)
+
+PreprocessCascade learns which variant hits most often (decayed success
+rate) and puts it first, so the common case is a single decode. At most
+MAX_VARIANTS variants are tried per frame, the others move up once the
+tried ones keep missing. The
+variants can also be benchmarked on frames of a camera; the result is
+stored per camera in preprocess_profiles.json and used as the start order.
+
+decode_cascade() runs in the decode pool workers, the learning happens in
+the caller: it passes the current order along and records the result.
+decode_cascade_pyramid() combines it with the decode pyramid: the
+downscaled copy only gets the first variant, the cascade runs once at full
+resolution (a frame without a barcode costs 3 decodes, not scales x variants).
+
+"""
+import json
+import os
+import time
+
+import cv2
+
+from PfandApplication.decoding import DEFAULT_SCALES, decode_gray, pyramid_levels, scaled_detections, to_gray
+
+PROFILES_PATH = 'preprocess_profiles.json'
+
+
+def raw(gray, brightness=0.0, contrast=1.0):
+    return gray
+
+
+def equalized(gray, brightness=0.0, contrast=1.0):
+    return cv2.equalizeHist(gray)
+
+
+def threshold(gray, brightness=0.0, contrast=1.0):
+    adjusted = cv2.convertScaleAbs(gray, alpha=contrast, beta=brightness * 127)
+    blurred = cv2.GaussianBlur(adjusted, (5, 5), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+
+
+def sharpened(gray, brightness=0.0, contrast=1.0):
+    blurred = cv2.GaussianBlur(gray, (0, 0), 3)
+    return cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
+
+
+PREPROCESSORS = {
+    'raw': raw,
+    'equalized': equalized,
+    'threshold': threshold,
+    'sharpened': sharpened,
+}
+DEFAULT_ORDER = ('raw', 'threshold', 'equalized', 'sharpened')
+MAX_VARIANTS = 2  # decodes per frame and scale at most
+
+
+def decode_cascade(frame, order=DEFAULT_ORDER, brightness=0.0, contrast=1.0, max_variants=MAX_VARIANTS):
+    gray = to_gray(frame)
+    for variant in order[:max_variants]:
+        detections = decode_gray(PREPROCESSORS[variant](gray, brightness, contrast))
+        if detections:
+            return [detection._replace(variant=variant) for detection in detections]
+    return []
+
+
+def decode_cascade_pyramid(frame, order=DEFAULT_ORDER, brightness=0.0, contrast=1.0,
+                           scales=DEFAULT_SCALES, max_variants=MAX_VARIANTS):
+    # Only the last (full resolution) scale runs more than the first variant
+    for scale, image, last in pyramid_levels(frame, scales):
+        detections = decode_cascade(image, order, brightness, contrast, max_variants if last else 1)
+        if detections:
+            return scaled_detections(detections, scale)
+    return []
+
+
+def benchmark_variants(frames, brightness=0.0, contrast=1.0, variants=DEFAULT_ORDER):
+    # {variant: {'hit_rate': ..., 'ms': ...}} with every variant run on every frame
+    results = {}
+    grays = [to_gray(frame) for frame in frames]
+    for variant in variants:
+        hits = 0
+        start = time.perf_counter()
+        for gray in grays:
+            if decode_gray(PREPROCESSORS[variant](gray, brightness, contrast)):
+                hits += 1
+        elapsed = time.perf_counter() - start
+        results[variant] = {
+            'hit_rate': hits / len(grays) if grays else 0.0,
+            'ms': elapsed * 1000 / len(grays) if grays else 0.0,
+        }
+    return results
+
+
+class PreprocessCascade:
+    def __init__(self, variants=DEFAULT_ORDER, decay=0.95):
+        self.variants = tuple(variants)
+        self.decay = decay
+        self.scores = {variant: 0.5 for variant in self.variants}  # decayed success rate
+        self.attempts = {variant: 0 for variant in self.variants}
+        self.hits = {variant: 0 for variant in self.variants}
+        self.costs = {variant: 1.0 for variant in self.variants}  # relative cost, from a benchmark
+
+    def order(self):
+        # Best hit rate per cost first, ties keep the default order
+        return tuple(sorted(self.variants, key=lambda variant: -self.scores[variant] / self.costs[variant]))
+
+    def record(self, order, detections):
+        # Every variant up to the one that hit was tried (in the given order)
+        hit = detections[0].variant if detections else None
+        for variant in order:
+            self.attempts[variant] += 1
+            found = variant == hit
+            self.hits[variant] += found
+            self.scores[variant] = self.decay * self.scores[variant] + (1 - self.decay) * found
+            if found:
+                break
+
+    def apply_benchmark(self, results):
+        fastest = min((result['ms'] for result in results.values()), default=0.0) or 1.0
+        for variant, result in results.items():
+            if variant in self.scores:
+                self.scores[variant] = result['hit_rate']
+                self.costs[variant] = max(1.0, result['ms'] / fastest)
+
+    def summary(self):
+        return "  ".join(f"{variant}: {self.scores[variant]:.0%}" for variant in self.order())
+
+    def to_dict(self):
+        return {'scores': self.scores, 'costs': self.costs}
+
+    def load_dict(self, data):
+        for variant in self.variants:
+            self.scores[variant] = data.get('scores', {}).get(variant, self.scores[variant])
+            self.costs[variant] = data.get('costs', {}).get(variant, self.costs[variant])
+
+
+def load_profile(camera, path=PROFILES_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(str(camera))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_profile(camera, profile, path=PROFILES_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        profiles = {}
+    profiles[str(camera)] = profile
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(tmp_path, path)
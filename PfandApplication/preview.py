@@ -0,0 +1,108 @@
+"""
+
+Camera Preview Renderer
+
+Paints camera frames into a Tk label at a fixed preview rate, independent
+of how often frames are read or decoded:
+
+    - render() returns right away if the next preview frame is not due yet
+    - the frame is scaled down to the size the label actually has
+    - resize/colour conversion write into buffers that are kept between
+      frames, and one PhotoImage is reused (paste) instead of creating a
+      new one per frame
+    - BGR -> RGB only, no RGBA conversion
+
+Barcode outlines are drawn onto the scaled copy, the camera frame itself
+is never modified.
+
+"""
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+DEFAULT_FPS = 30
+
+
+class PreviewRenderer:
+    def __init__(self, label, fps=DEFAULT_FPS, max_size=(1280, 720)):
+        self.label = label
+        self.max_size = max_size
+        self.set_fps(fps)
+
+        self.photo = None
+        self.size = None
+        self.resized = None
+        self.rgb = None
+
+        self.last_render = 0.0
+        self.rendered = 0
+        self.fps = 0.0  # measured preview rate
+        self._count_start = time.perf_counter()
+        self._count = 0
+
+    def set_fps(self, fps):
+        self.interval = 1.0 / max(1, fps)
+
+    @property
+    def due(self):
+        return time.perf_counter() - self.last_render >= self.interval
+
+    def target_size(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        width, height = self.label.winfo_width(), self.label.winfo_height()
+        if width <= 1 or height <= 1:
+            # Not mapped yet, start with the frame size
+            width, height = frame_width, frame_height
+        width, height = min(width, self.max_size[0]), min(height, self.max_size[1])
+
+        scale = min(width / frame_width, height / frame_height, 1.0)
+        return max(1, int(frame_width * scale)), max(1, int(frame_height * scale)), scale
+
+    def render(self, frame, polygons=()):
+        # False if the preview was not due
+        if not self.due:
+            return False
+        self.last_render = time.perf_counter()
+
+        width, height, scale = self.target_size(frame)
+        if self.size != (width, height):
+            self._allocate(frame, width, height)
+
+        source = frame
+        if scale != 1.0:
+            cv2.resize(frame, (width, height), dst=self.resized, interpolation=cv2.INTER_AREA)
+            source = self.resized
+        cv2.cvtColor(source, cv2.COLOR_GRAY2RGB if frame.ndim == 2 else cv2.COLOR_BGR2RGB, dst=self.rgb)
+
+        for polygon in polygons:
+            if len(polygon) >= 3:
+                points = np.round(np.array(polygon, dtype=np.float32) * scale).astype(np.int32)
+                cv2.polylines(self.rgb, [points], True, (0, 255, 0), 2)
+
+        self.photo.paste(Image.frombuffer('RGB', (width, height), self.rgb, 'raw', 'RGB', 0, 1))
+        self._count_frame()
+        return True
+
+    def clear(self):
+        self.label.configure(image='')
+        self.photo = None
+        self.size = None
+
+    def _allocate(self, frame, width, height):
+        self.resized = np.empty((height, width) + frame.shape[2:], dtype=np.uint8)
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self.photo = ImageTk.PhotoImage('RGB', (width, height))
+        self.label.configure(image=self.photo)
+        self.label.imgtk = self.photo  # keep a reference
+        self.size = (width, height)
+
+    def _count_frame(self):
+        self.rendered += 1
+        self._count += 1
+        now = time.perf_counter()
+        if now - self._count_start >= 1.0:
+            self.fps = self._count / (now - self._count_start)
+            self._count_start = now
+            self._count = 0
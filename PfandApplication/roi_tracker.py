@@ -0,0 +1,77 @@
+"""
+
+Region of Interest Tracking
+
+Barcodes rarely jump around between frames. RoiTracker remembers where the
+last detections were and next_region() returns a padded box around them,
+so only that crop has to be decoded. The full frame is decoded again
+
+    - every full_frame_every frames (new barcodes elsewhere in the picture),
+    - on the frame after a crop found nothing,
+    - when nothing was found for a while.
+
+    region = tracker.next_region(frame.shape)   # None -> full frame
+    detections = tracker.update(region, decode(tracker.crop(frame, region)))
+
+update() maps the detections back to frame coordinates.
+
+"""
+from PfandApplication.decoding import map_detection
+
+
+class RoiTracker:
+    def __init__(self, padding=0.5, min_padding=40, full_frame_every=15):
+        self.padding = padding  # relative to the box size
+        self.min_padding = min_padding  # pixels
+        self.full_frame_every = full_frame_every
+        self.box = None  # (x0, y0, x1, y1) of the last detections
+        self.force_full = True
+        self.frames = 0
+
+        self.roi_hits = 0
+        self.roi_misses = 0
+        self.full_decodes = 0
+
+    def next_region(self, shape):
+        # (x, y, w, h) to decode or None for the full frame
+        self.frames += 1
+        if self.box is None or self.force_full or self.frames % self.full_frame_every == 0:
+            return None
+
+        height, width = shape[:2]
+        x0, y0, x1, y1 = self.box
+        pad_x = max(self.min_padding, int((x1 - x0) * self.padding))
+        pad_y = max(self.min_padding, int((y1 - y0) * self.padding))
+        x0, y0 = max(0, x0 - pad_x), max(0, y0 - pad_y)
+        x1, y1 = min(width, x1 + pad_x), min(height, y1 + pad_y)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+
+    @staticmethod
+    def crop(frame, region):
+        if region is None:
+            return frame
+        x, y, w, h = region
+        return frame[y:y + h, x:x + w]
+
+    def update(self, region, detections):
+        if region is None:
+            self.full_decodes += 1
+        else:
+            detections = [map_detection(detection, region[:2]) for detection in detections]
+
+        points = [point for detection in detections for point in detection.polygon]
+        if points:
+            if region is not None:
+                self.roi_hits += 1
+            xs, ys = zip(*points)
+            self.box = (min(xs), min(ys), max(xs), max(ys))
+            self.force_full = False
+        elif region is not None:
+            # Barcode left the crop, look at the whole frame next time
+            self.roi_misses += 1
+            self.force_full = True
+        else:
+            self.box = None
+        return detections
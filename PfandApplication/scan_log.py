@@ -0,0 +1,113 @@
+"""
+
+Persistent Scan Log
+
+Every scan event is appended as one compact JSON line to scan_log.jsonl.
+When the file gets bigger than max_bytes it is gzip compressed into a
+numbered segment (scan_log.jsonl.000001.gz, ...) and a new file is started.
+iter_events() streams all segments, oldest first, without loading them.
+
+"""
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%d.%m.%Y %H:%M:%S"
+
+_shared_logs = {}
+_shared_lock = threading.Lock()
+
+
+def get_scan_log(path='scan_log.jsonl'):
+    # One instance per file, the main scanner and µScan share it
+    with _shared_lock:
+        if path not in _shared_logs:
+            _shared_logs[path] = ScanLog(path)
+        return _shared_logs[path]
+
+
+class ScanLog:
+    def __init__(self, path='scan_log.jsonl', max_bytes=1024 * 1024, max_segments=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments  # None -> keep every old segment
+        self.lock = threading.Lock()
+
+    def append(self, barcode, has_pfand, product=None, source=None, timestamp=None):
+        event = {
+            't': timestamp or datetime.now().strftime(TIMESTAMP_FORMAT),
+            'b': barcode,
+            'p': None if has_pfand is None else int(has_pfand),
+            'prod': product,
+            'src': source,
+        }
+        line = json.dumps(event, separators=(',', ':'), ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                size = f.tell()
+            if size >= self.max_bytes:
+                self._rotate()
+
+    def segments(self):
+        # Numbered segments sort by name, the live file comes last
+        segments = sorted(glob.glob(glob.escape(self.path) + '.*.gz'))
+        if os.path.exists(self.path):
+            segments.append(self.path)
+        return segments
+
+    def is_empty(self):
+        return not self.segments()
+
+    def iter_events(self):
+        for segment in self.segments():
+            opener = gzip.open if segment.endswith('.gz') else open
+            try:
+                with opener(segment, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        event = self._parse(line)
+                        if event is not None:
+                            yield event
+            except FileNotFoundError:
+                # Rotated away while we were streaming, it shows up as a segment next time
+                continue
+
+    def clear(self):
+        with self.lock:
+            for segment in self.segments():
+                os.remove(segment)
+
+    @staticmethod
+    def _parse(line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        has_pfand = data.get('p')
+        return {
+            'timestamp': data.get('t'),
+            'barcode': data.get('b'),
+            'has_pfand': None if has_pfand is None else bool(has_pfand),
+            'product': data.get('prod'),
+            'source': data.get('src'),
+        }
+
+    def _rotate(self):
+        existing = sorted(glob.glob(glob.escape(self.path) + '.*.gz'))
+        number = int(existing[-1].rsplit('.', 2)[-2]) + 1 if existing else 1
+        segment = f"{self.path}.{number:06d}.gz"
+
+        with open(self.path, 'rb') as source, gzip.open(segment, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.path)
+
+        if self.max_segments is not None:
+            for old in (existing + [segment])[:-self.max_segments]:
+                os.remove(old)
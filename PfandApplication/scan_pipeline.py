@@ -0,0 +1,234 @@
+"""
+
+Threaded Capture/Decode Pipeline
+
+    capture thread  ->  LatestFrameBuffer  ->  decode worker  ->  results
+          |
+          +-> newest frame for the preview
+
+The Tk thread never touches the camera and never decodes. It only paints
+latest_frame() and drains poll(). Frames the decoder cannot keep up with
+are overwritten in the buffer instead of piling up, so decoding always
+works on the newest frame.
+
+Camera properties (focus, ...) are handed to the capture thread with
+set_property(), the capture object is only used by that thread.
+
+With a DecodePool (decode_pool.py) the worker hands frames to the pool
+whenever it has room and forwards its ordered results. With a RoiTracker
+(roi_tracker.py) only the region around the last detections is decoded,
+result polygons are always in full frame coordinates. With a MotionGate
+(motion.py) frames that did not change are not decoded at all. With a
+DecodeScheduler (scheduler.py) frames are only taken as often as its
+adaptive rate allows.
+
+"""
+import queue
+import threading
+import time
+
+from PfandApplication.decoding import decode_frame
+
+
+class LatestFrameBuffer:
+    # Holds at most one frame, put() replaces a frame nobody took yet
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame, seq=None):
+        with self.condition:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = frame
+            self.seq = self.seq + 1 if seq is None else seq
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        # (seq, frame) or None on timeout/close
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None or self.closed, timeout)
+            if self.frame is None:
+                return None
+            frame, self.frame = self.frame, None
+            return self.seq, frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class ScanPipeline:
+    def __init__(self, capture, decoder=decode_frame, frame_filter=None, pool=None, tracker=None, gate=None,
+                 scheduler=None):
+        self.capture = capture  # anything with read()/set()/release(), e.g. cv2.VideoCapture
+        self.decoder = decoder  # frame -> list of Detection
+        self.frame_filter = frame_filter  # optional frame -> frame, runs on the capture thread
+        self.pool = pool  # optional DecodePool, decodes with its own decoder; closed by stop()
+        self.tracker = tracker  # optional RoiTracker
+        self.gate = gate  # optional MotionGate
+        self.scheduler = scheduler  # optional DecodeScheduler
+        self.regions = {}  # seq -> decoded region of frames in the pool
+
+        self.decode_buffer = LatestFrameBuffer()
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()
+
+        self.preview_lock = threading.Lock()
+        self.preview = (0, None)
+        self.property_lock = threading.Lock()
+        self.pending_properties = {}
+        self.applied_properties = {}
+
+        self.frames = 0
+        self.decoded = 0
+        self.last_decode_time = 0.0
+
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="scan-capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="scan-decode", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        self.decode_buffer.close()
+        for thread in self.threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+        if self.pool is not None:
+            self.pool.close()
+
+    @property
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def set_property(self, prop, value):
+        with self.property_lock:
+            if self.applied_properties.get(prop) != value:
+                self.pending_properties[prop] = value
+
+    def latest_frame(self):
+        # (seq, frame) of the newest captured frame; the frame is shared, copy before drawing on it
+        with self.preview_lock:
+            return self.preview
+
+    def poll(self):
+        # [(seq, detections), ...] in decode order
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    @property
+    def dropped(self):
+        return self.decode_buffer.dropped
+
+    def _apply_properties(self):
+        with self.property_lock:
+            pending, self.pending_properties = self.pending_properties, {}
+        for prop, value in pending.items():
+            self.capture.set(prop, value)
+            self.applied_properties[prop] = value
+
+    def _capture_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                self._apply_properties()
+                ret, frame = self.capture.read()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+                if self.frame_filter is not None:
+                    frame = self.frame_filter(frame)
+
+                self.frames += 1
+                with self.preview_lock:
+                    self.preview = (self.frames, frame)
+                self.decode_buffer.put(frame, self.frames)
+        except Exception as e:
+            print(f"Error in capture thread: {e}")
+        finally:
+            self.decode_buffer.close()
+            self.capture.release()
+
+    def _decode_loop(self):
+        if self.pool is not None:
+            self._pool_loop()
+            return
+
+        while not self.stop_event.is_set():
+            if not self._wait_until_due():
+                continue
+            item = self.decode_buffer.get(timeout=0.5)
+            if item is None:
+                if self.decode_buffer.closed:
+                    break
+                continue
+            seq, frame = item
+            if self.gate is not None and not self.gate.changed(frame):
+                continue
+            start = time.perf_counter()
+            try:
+                detections = self.decoder(self._crop(seq, frame))
+            except Exception as e:
+                self.regions.pop(seq, None)
+                print(f"Error decoding frame: {e}")
+                continue
+            self.last_decode_time = time.perf_counter() - start
+            if self.scheduler is not None:
+                self.scheduler.record(self.last_decode_time)
+            self._put_result(seq, detections)
+
+    def _pool_loop(self):
+        # Only take a frame when the pool has room, until then the buffer keeps the newest one
+        while not self.stop_event.is_set():
+            if self.pool.full:
+                self.pool.wait(0.05)
+            elif self._wait_until_due():
+                item = self.decode_buffer.get(timeout=0.05)
+                if item is None and self.decode_buffer.closed:
+                    break
+                if item is not None and (self.gate is None or self.gate.changed(item[1])):
+                    seq, frame = item
+                    if not self.pool.submit(seq, self._crop(seq, frame)):
+                        self.regions.pop(seq, None)
+
+            for seq, detections in self.pool.results():
+                self.last_decode_time = self.pool.last_latency
+                if self.scheduler is not None:
+                    self.scheduler.record(self.last_decode_time)
+                self._put_result(seq, detections)
+
+    def _wait_until_due(self):
+        # Sleeps at most 50 ms, False if the next decode is not due yet
+        if self.scheduler is None or self.scheduler.due():
+            return True
+        time.sleep(min(0.05, self.scheduler.time_until_due()))
+        return False
+
+    def _crop(self, seq, frame):
+        if self.tracker is None:
+            return frame
+        region = self.tracker.next_region(frame.shape)
+        self.regions[seq] = region
+        return self.tracker.crop(frame, region)
+
+    def _put_result(self, seq, detections):
+        if self.tracker is not None:
+            detections = self.tracker.update(self.regions.pop(seq, None), detections)
+            # Frames the pool dropped never come back
+            for stale in [old for old in self.regions if old < seq]:
+                del self.regions[stale]
+        self.decoded += 1
+        self.results.put((seq, detections))
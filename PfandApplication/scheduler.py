@@ -0,0 +1,85 @@
+"""
+
+Adaptive Decode Scheduling
+
+Replaces the fixed "every 3rd frame" / "every 0.3 s" decode cadence.
+DecodeScheduler aims for target_rate decodes per second and adapts:
+
+    - the decode latency is measured (moving average), the rate is capped
+      at what the workers can do with 20% headroom
+    - if the machine is busy (1 minute load average per core above
+      max_load) the rate is lowered
+    - backing off happens at once, speeding up again step by step
+
+    if scheduler.due():
+        ... decode ...
+        scheduler.record(latency)
+
+"""
+import os
+import time
+
+
+class DecodeScheduler:
+    def __init__(self, target_rate=15.0, min_rate=1.0, max_rate=60.0, workers=1, max_load=0.85, smoothing=0.2):
+        self.target_rate = target_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.workers = workers
+        self.max_load = max_load
+        self.smoothing = smoothing
+
+        self.rate = max(min_rate, min(target_rate, max_rate))
+        self.latency = None  # seconds, moving average
+        self.load = None
+        self.last_due = 0.0
+        self.last_adjust = 0.0
+
+    def due(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if now - self.last_due >= 1.0 / self.rate:
+            self.last_due = now
+            return True
+        return False
+
+    def time_until_due(self, now=None):
+        now = time.perf_counter() if now is None else now
+        return max(0.0, self.last_due + 1.0 / self.rate - now)
+
+    def record(self, latency, now=None):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        now = time.perf_counter() if now is None else now
+        if now - self.last_adjust >= 0.5:
+            self.last_adjust = now
+            self.adjust()
+
+    def adjust(self):
+        goal = min(self.target_rate, self.max_rate)
+        if self.latency:
+            goal = min(goal, 0.8 * self.workers / self.latency)
+
+        self.load = cpu_load()
+        if self.load is not None and self.load > self.max_load:
+            goal = min(goal, self.rate * 0.7)
+
+        if goal < self.rate:
+            self.rate = goal
+        else:
+            self.rate = min(goal, self.rate * 1.2 + 0.5)
+        self.rate = max(self.min_rate, self.rate)
+
+    def summary(self):
+        latency = f"{self.latency * 1000:.0f} ms" if self.latency is not None else "-"
+        return f"{self.rate:.1f}/s ({latency})"
+
+
+def cpu_load():
+    # Load average per core, None where the OS has none (Windows)
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,466 @@
+"""
+
+Storage Backends
+
+JsonStorage     ->  the classic JSON files (quantities.json, deposit_history.json, barcodes.json, ...)
+SQLiteStorage   ->  everything in a single SQLite database (pfand.db)
+
+open_storage() picks the SQLite database once it exists, otherwise the JSON files.
+migrate_json_to_sqlite() copies the JSON files into a new database (one-shot).
+
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from PfandApplication.deposit_journal import DepositJournal
+
+DB_PATH = 'pfand.db'
+
+
+class StorageBackend:
+    def load_products(self):
+        # Returns (products, prices) or None if nothing is stored yet
+        raise NotImplementedError
+
+    def save_products(self, products, prices):
+        raise NotImplementedError
+
+    def load_quantities(self):
+        # Returns a dict or None if nothing is stored yet
+        raise NotImplementedError
+
+    def save_quantities(self, quantities):
+        raise NotImplementedError
+
+    def has_quantities(self):
+        raise NotImplementedError
+
+    def delete_quantities(self):
+        raise NotImplementedError
+
+    def load_deposit_history(self):
+        raise NotImplementedError
+
+    def read_deposit_history(self):
+        # Like load_deposit_history(), but safe on a worker thread (exports)
+        return self.load_deposit_history()
+
+    def deposit_count(self):
+        # Backends override this if they can count without loading everything
+        return len(self.load_deposit_history())
+
+    def append_deposit(self, record):
+        raise NotImplementedError
+
+    def append_deposits(self, records):
+        # Backends override this to write all records in one go
+        for record in records:
+            self.append_deposit(record)
+
+    def clear_deposit_history(self):
+        raise NotImplementedError
+
+    def load_achievements(self):
+        # Returns {key: {'unlocked': bool, 'unlock_date': str|None}}
+        raise NotImplementedError
+
+    def save_achievements(self, data):
+        raise NotImplementedError
+
+    def clear_achievements(self):
+        raise NotImplementedError
+
+    def load_aggregates(self):
+        # Returns the AggregateIndex dict or None if nothing is stored yet
+        raise NotImplementedError
+
+    def save_aggregates(self, data):
+        raise NotImplementedError
+
+    def load_catalog(self):
+        # Returns {barcode: {'product': str|None, 'has_pfand': bool|None, 'last_seen': str|None, 'count': int}}
+        raise NotImplementedError
+
+    def save_catalog(self, catalog):
+        raise NotImplementedError
+
+    def update_catalog(self, changes):
+        # {barcode: entry, or None if forgotten}; backends override this to
+        # write only the changed barcodes instead of the whole catalog
+        self.save_catalog(apply_catalog_changes(self.load_catalog(), changes))
+
+    def close(self):
+        pass
+
+
+class JsonStorage(StorageBackend):
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self.products_path = os.path.join(directory, 'products.json')
+        self.quantities_path = os.path.join(directory, 'quantities.json')
+        self.achievements_path = os.path.join(directory, 'achievements.json')
+        self.aggregates_path = os.path.join(directory, 'aggregates.json')
+        self.catalog_path = os.path.join(directory, 'barcodes.json')
+        self.deposit_journal = DepositJournal(os.path.join(directory, 'deposit_history.json'))
+
+    def load_products(self):
+        data = self._read(self.products_path)
+        if data is None:
+            return None
+        return data.get('products', []), data.get('prices', {})
+
+    def save_products(self, products, prices):
+        self._write(self.products_path, {'products': products, 'prices': prices})
+
+    def load_quantities(self):
+        return self._read(self.quantities_path)
+
+    def save_quantities(self, quantities):
+        self._write(self.quantities_path, quantities)
+
+    def has_quantities(self):
+        return os.path.exists(self.quantities_path)
+
+    def delete_quantities(self):
+        if os.path.exists(self.quantities_path):
+            os.remove(self.quantities_path)
+
+    def load_deposit_history(self):
+        return self.deposit_journal.load()
+
+    def read_deposit_history(self):
+        return self.deposit_journal.read()[0]
+
+    def append_deposit(self, record):
+        self.deposit_journal.append(record)
+        if self.deposit_journal.needs_compaction:
+            self.deposit_journal.compact(self.deposit_journal.load())
+
+    def append_deposits(self, records):
+        # Bulk import: one atomic snapshot write instead of a journal line per record
+        records = list(records)
+        if not records:
+            return
+        history = self.deposit_journal.load() + records
+        self.deposit_journal.seq += len(records)
+        self.deposit_journal.compact(history)
+
+    def clear_deposit_history(self):
+        self.deposit_journal.clear()
+
+    def load_achievements(self):
+        return self._read(self.achievements_path) or {}
+
+    def save_achievements(self, data):
+        self._write(self.achievements_path, data)
+
+    def clear_achievements(self):
+        if os.path.exists(self.achievements_path):
+            os.remove(self.achievements_path)
+
+    def load_aggregates(self):
+        return self._read(self.aggregates_path)
+
+    def save_aggregates(self, data):
+        self._write(self.aggregates_path, data)
+
+    def load_catalog(self):
+        return self._read(self.catalog_path) or {}
+
+    def save_catalog(self, catalog):
+        self._write(self.catalog_path, catalog)
+
+    def update_catalog(self, changes):
+        # The file is rewritten anyway. A broken one is replaced, the core
+        # started with an empty catalog then.
+        try:
+            catalog = self.load_catalog()
+        except ValueError:
+            catalog = {}
+        self.save_catalog(apply_catalog_changes(catalog, changes))
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        # Temp file + rename, a crash never leaves a half written file behind
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class SQLiteStorage(StorageBackend):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            name TEXT PRIMARY KEY,
+            price REAL NOT NULL,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS quantities (
+            product TEXT PRIMARY KEY,
+            quantity INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS deposits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            total REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_deposits_day ON deposits(day);
+        CREATE TABLE IF NOT EXISTS deposit_items (
+            deposit_id INTEGER NOT NULL REFERENCES deposits(id) ON DELETE CASCADE,
+            product TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (deposit_id, product)
+        );
+        CREATE INDEX IF NOT EXISTS idx_deposit_items_product ON deposit_items(product);
+        CREATE TABLE IF NOT EXISTS achievements (
+            key TEXT PRIMARY KEY,
+            unlocked INTEGER NOT NULL,
+            unlock_date TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS barcodes (
+            barcode TEXT PRIMARY KEY,
+            product TEXT,
+            has_pfand INTEGER,
+            last_seen TEXT,
+            count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_barcodes_product ON barcodes(product);
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        # Connection is shared between the Tk thread and background writers
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    def load_products(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT name, price FROM products ORDER BY position").fetchall()
+        if not rows:
+            return None
+        return [name for name, _ in rows], {name: price for name, price in rows}
+
+    def save_products(self, products, prices):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM products")
+            self.conn.executemany(
+                "INSERT INTO products (name, price, position) VALUES (?, ?, ?)",
+                [(name, prices[name], position) for position, name in enumerate(products)]
+            )
+
+    def load_quantities(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT product, quantity FROM quantities").fetchall()
+        if not rows:
+            return None
+        return dict(rows)
+
+    def save_quantities(self, quantities):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM quantities")
+            self.conn.executemany(
+                "INSERT INTO quantities (product, quantity) VALUES (?, ?)",
+                list(quantities.items())
+            )
+
+    def has_quantities(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM quantities LIMIT 1").fetchone() is not None
+
+    def delete_quantities(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM quantities")
+
+    def load_deposit_history(self):
+        with self.lock:
+            deposits = self.conn.execute("SELECT id, date, total FROM deposits ORDER BY id").fetchall()
+            items = self.conn.execute(
+                "SELECT deposit_id, product, quantity FROM deposit_items ORDER BY deposit_id"
+            ).fetchall()
+
+        quantities_by_id = {}
+        for deposit_id, product, quantity in items:
+            quantities_by_id.setdefault(deposit_id, {})[product] = quantity
+
+        return [
+            {'date': date, 'quantities': quantities_by_id.get(deposit_id, {}), 'total': total}
+            for deposit_id, date, total in deposits
+        ]
+
+    def append_deposit(self, record):
+        self.append_deposits([record])
+
+    def append_deposits(self, records):
+        with self.lock, self.conn:
+            for record in records:
+                cursor = self.conn.execute(
+                    "INSERT INTO deposits (date, day, total) VALUES (?, ?, ?)",
+                    (record['date'], date_to_day(record['date']), record['total'])
+                )
+                deposit_id = cursor.lastrowid
+                self.conn.executemany(
+                    "INSERT INTO deposit_items (deposit_id, product, quantity) VALUES (?, ?, ?)",
+                    [(deposit_id, product, quantity) for product, quantity in record['quantities'].items()]
+                )
+
+    def clear_deposit_history(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM deposit_items")
+            self.conn.execute("DELETE FROM deposits")
+
+    def deposit_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM deposits").fetchone()[0]
+
+    def load_achievements(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT key, unlocked, unlock_date FROM achievements").fetchall()
+        return {key: {'unlocked': bool(unlocked), 'unlock_date': unlock_date} for key, unlocked, unlock_date in rows}
+
+    def save_achievements(self, data):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM achievements")
+            self.conn.executemany(
+                "INSERT INTO achievements (key, unlocked, unlock_date) VALUES (?, ?, ?)",
+                [(key, int(value['unlocked']), value['unlock_date']) for key, value in data.items()]
+            )
+
+    def clear_achievements(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM achievements")
+
+    def load_aggregates(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'aggregates'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_aggregates(self, data):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates', ?)",
+                (json.dumps(data),)
+            )
+
+    def load_catalog(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT barcode, product, has_pfand, last_seen, count FROM barcodes").fetchall()
+        return {
+            barcode: {'product': product, 'has_pfand': None if has_pfand is None else bool(has_pfand),
+                      'last_seen': last_seen, 'count': count}
+            for barcode, product, has_pfand, last_seen, count in rows
+        }
+
+    def save_catalog(self, catalog):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM barcodes")
+            self.conn.executemany(
+                "INSERT INTO barcodes (barcode, product, has_pfand, last_seen, count) VALUES (?, ?, ?, ?, ?)",
+                [self._catalog_row(barcode, entry) for barcode, entry in catalog.items()]
+            )
+
+    def update_catalog(self, changes):
+        # Upserts/deletes only the changed rows, the rest of the table is not touched
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO barcodes (barcode, product, has_pfand, last_seen, count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(barcode) DO UPDATE SET product = excluded.product, has_pfand = excluded.has_pfand, "
+                "last_seen = excluded.last_seen, count = excluded.count",
+                [self._catalog_row(barcode, entry) for barcode, entry in changes.items() if entry is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM barcodes WHERE barcode = ?",
+                [(barcode,) for barcode, entry in changes.items() if entry is None]
+            )
+
+    @staticmethod
+    def _catalog_row(barcode, entry):
+        return (barcode, entry['product'], None if entry['has_pfand'] is None else int(entry['has_pfand']),
+                entry['last_seen'], entry['count'])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def apply_catalog_changes(catalog, changes):
+    for barcode, entry in changes.items():
+        if entry is None:
+            catalog.pop(barcode, None)
+        else:
+            catalog[barcode] = entry
+    return catalog
+
+
+def date_to_day(date):
+    # '%d.%m.%Y' -> proleptic ordinal, used for the date index
+    try:
+        return datetime.strptime(date, "%d.%m.%Y").toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+def open_storage(directory='.'):
+    db_path = os.path.join(directory, DB_PATH)
+    if os.path.exists(db_path):
+        return SQLiteStorage(db_path)
+    return JsonStorage(directory)
+
+
+def migrate_json_to_sqlite(directory='.'):
+    db_path = os.path.join(directory, DB_PATH)
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} existiert bereits")
+
+    source = JsonStorage(directory)
+    target = SQLiteStorage(db_path)
+    try:
+        products = source.load_products()
+        if products is not None:
+            target.save_products(*products)
+
+        quantities = source.load_quantities()
+        if quantities is not None:
+            target.save_quantities(quantities)
+
+        history = source.load_deposit_history()
+        target.append_deposits(history)
+
+        target.save_achievements(source.load_achievements())
+
+        aggregates = source.load_aggregates()
+        if aggregates is not None:
+            target.save_aggregates(aggregates)
+
+        target.save_catalog(source.load_catalog())
+    except Exception:
+        # Don't leave a half migrated database behind, open_storage() would pick it up
+        target.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        raise
+
+    # The JSON files are left untouched as a backup
+    return target, len(history)
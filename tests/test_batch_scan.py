@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from PfandApplication.batch_scan import ScanEvent, batch_scan, record_events
+from PfandApplication.core import PfandCore
+from PfandApplication.ean import random_code, render_ean
+from PfandApplication.scan_log import ScanLog
+from PfandApplication.storage import JsonStorage
+
+
+def test_mixed_size_images_are_not_dropped(tmp_path):
+    # Every image is bigger than the last, so each one needs new shared memory slots
+    rng = np.random.default_rng(7)
+    codes = []
+    for i in range(12):
+        code = random_code(rng)
+        label = render_ean(code, module_width=2 + i % 3)
+        height, width = label.shape[0] + 40 + i * 30, label.shape[1] + 40 + i * 50
+        image = np.full((height, width), 255, np.uint8)
+        image[20:20 + label.shape[0], 20:20 + label.shape[1]] = label
+        cv2.imwrite(str(tmp_path / f"{i:02d}.png"), image)
+        codes.append(code)
+
+    events = batch_scan([str(tmp_path)], workers=2, mode='process')
+
+    assert [event.barcode for event in events] == codes
+
+
+def test_scans_counted_as_a_product_go_through_the_core(tmp_path):
+    core = PfandCore(JsonStorage(str(tmp_path)), ScanLog(str(tmp_path / 'scan_log.jsonl')), write_delay_ms=0)
+    try:
+        start = core.quantities.get('Dose', 0)
+        events = [ScanEvent(datetime(2024, 3, 1, 18, 0, second), barcode, 'EAN13', 'videos/abgabe.mp4', second)
+                  for second, barcode in enumerate(['4006381333931', '4006381333931', '9783161484100'])]
+        record_events(events, core, 'Dose')
+
+        assert core.quantities['Dose'] == start + 3
+        assert core.aggregates.total_scans == 3
+        assert core.aggregates.scans_on('2024-03-01') == 3
+        assert core.catalog['4006381333931']['count'] == 2
+        assert core.catalog['9783161484100']['product'] == 'Dose'
+        logged = list(core.scan_log.iter_events())
+        assert [event['product'] for event in logged] == ['Dose'] * 3
+        assert logged[0]['source'] == 'batch:abgabe.mp4'
+        # The log alone gives the same scan counters
+        core.rebuild_aggregates()
+        assert core.aggregates.daily_scans == {'2024-03-01': 3}
+    finally:
+        core.close()
@@ -0,0 +1,52 @@
+from PfandApplication.core import PfandCore
+from PfandApplication.scan_log import ScanLog
+from PfandApplication.storage import JsonStorage, SQLiteStorage
+
+
+def open_core(tmp_path):
+    return PfandCore(JsonStorage(str(tmp_path)), ScanLog(str(tmp_path / 'scan_log.jsonl')), write_delay_ms=0)
+
+
+def test_confirmed_scans_are_catalogued(tmp_path):
+    core = open_core(tmp_path)
+    try:
+        core.record_scan('4006381333931', True, 'Dose')
+        core.record_scan('9783161484100', False)
+        assert core.lookup_barcode('4006381333931')['product'] == 'Dose'
+        assert core.lookup_barcode('9783161484100')['has_pfand'] is False
+        entry, _ = core.record_known_scan('4006381333931')
+        assert entry['count'] == 2
+    finally:
+        core.close()
+
+
+def test_guessed_scans_are_logged_but_not_catalogued(tmp_path):
+    core = open_core(tmp_path)
+    try:
+        core.record_scan('9783161484100', False, remember=False)
+        core.record_scan('4006381333931', True, remember=False)
+        assert core.catalog == {}
+        assert [event['has_pfand'] for event in core.scan_log.iter_events()] == [False, True]
+        # A barcode the user classified before still gets its count
+        core.remember_barcode('9783161484100', False)
+        core.record_scan('9783161484100', False, remember=False)
+        assert core.catalog['9783161484100']['count'] == 1
+    finally:
+        core.close()
+
+
+def test_catalog_changes_reach_the_database(tmp_path):
+    core = PfandCore(SQLiteStorage(str(tmp_path / 'pfand.db')), ScanLog(str(tmp_path / 'scan_log.jsonl')),
+                     write_delay_ms=60000)
+    core.record_scan('4006381333931', True, 'Dose', timestamp='01.03.2024 18:00:00')
+    core.record_known_scan('4006381333931', timestamp='01.03.2024 18:00:10')
+    core.remember_barcode('9783161484100', False)
+    core.forget_barcode('9783161484100')
+    core.close()
+
+    storage = SQLiteStorage(str(tmp_path / 'pfand.db'))
+    try:
+        assert storage.load_catalog() == {'4006381333931': {'product': 'Dose', 'has_pfand': True,
+                                                            'last_seen': '01.03.2024 18:00:10', 'count': 2}}
+    finally:
+        storage.close()
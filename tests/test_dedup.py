@@ -0,0 +1,47 @@
+from PfandApplication.dedup import DedupCache
+
+
+def test_repeats_within_the_window():
+    cache = DedupCache(window=5.0)
+    assert cache.is_new('a', now=0.0)
+    assert not cache.is_new('a', now=3.0)
+    # Every sighting starts the window over
+    assert not cache.is_new('a', now=7.0)
+    assert cache.is_new('a', now=12.5)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_expired_entries_are_dropped():
+    cache = DedupCache(window=5.0)
+    cache.is_new('a', now=0.0)
+    cache.is_new('b', now=4.0)
+    cache.expire(now=6.0)
+    assert len(cache) == 1
+    assert cache.expired == 1
+    assert cache.seen('b', now=6.0)
+    assert not cache.seen('a', now=6.0)
+
+
+def test_least_recently_seen_are_evicted():
+    cache = DedupCache(window=100.0, max_size=2)
+    cache.is_new('a', now=0.0)
+    cache.is_new('b', now=1.0)
+    cache.is_new('a', now=2.0)
+    cache.is_new('c', now=3.0)
+    assert cache.evicted == 1
+    assert cache.seen('a', now=3.0)
+    assert not cache.seen('b', now=3.0)
+
+
+def test_positions_of_other_files_do_not_expire_entries_early():
+    # The batch scan passes video positions, which start over for every file
+    cache = DedupCache(window=5.0)
+    assert cache.is_new(('a.mp4', 'x'), now=30.0)
+    assert cache.is_new(('b.mp4', 'x'), now=1.0)
+    assert not cache.is_new(('b.mp4', 'x'), now=2.0)
+
+
+def test_seen_does_not_record():
+    cache = DedupCache()
+    assert not cache.seen('a', now=0.0)
+    assert cache.is_new('a', now=0.0)
@@ -0,0 +1,69 @@
+import json
+
+from PfandApplication.deposit_journal import DepositJournal
+
+
+def record(day, quantity):
+    return {'date': f"{day:02d}.01.2024", 'quantities': {'Dose': quantity}, 'total': quantity * 0.25}
+
+
+def test_append_and_replay(tmp_path):
+    path = str(tmp_path / 'deposit_history.json')
+    journal = DepositJournal(path)
+    journal.load()
+    for day in range(1, 4):
+        journal.append(record(day, day))
+
+    assert DepositJournal(path).load() == [record(day, day) for day in range(1, 4)]
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / 'deposit_history.json')
+    journal = DepositJournal(path)
+    journal.load()
+    journal.append(record(1, 1))
+    journal.append(record(2, 2))
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 3, "record": {"date": "03.0')  # crash mid write
+
+    reopened = DepositJournal(path)
+    assert reopened.load() == [record(1, 1), record(2, 2)]
+    # Appending after the torn line continues with the next sequence number
+    reopened.append(record(4, 4))
+    assert DepositJournal(path).load() == [record(1, 1), record(2, 2), record(4, 4)]
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path):
+    path = str(tmp_path / 'deposit_history.json')
+    journal = DepositJournal(path, compact_every=2)
+    history = journal.load()
+    for day in range(1, 3):
+        journal.append(record(day, day))
+        history.append(record(day, day))
+    assert journal.needs_compaction
+    journal.compact(history)
+
+    assert not (tmp_path / 'deposit_history.json.journal').exists()
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {'seq': 2, 'deposits': history}
+    assert DepositJournal(path).load() == history
+
+
+def test_interrupted_compaction_does_not_duplicate(tmp_path):
+    # Snapshot written, crash before the journal was removed
+    path = str(tmp_path / 'deposit_history.json')
+    journal = DepositJournal(path)
+    history = journal.load()
+    for day in range(1, 4):
+        journal.append(record(day, day))
+        history.append(record(day, day))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'seq': 2, 'deposits': history[:2]}, f)
+
+    assert DepositJournal(path).load() == history
+
+
+def test_plain_list_snapshot_of_old_versions(tmp_path):
+    path = tmp_path / 'deposit_history.json'
+    path.write_text(json.dumps([record(1, 1)]), encoding='utf-8')
+    assert DepositJournal(str(path)).load() == [record(1, 1)]
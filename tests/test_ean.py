@@ -0,0 +1,39 @@
+from PfandApplication.ean import check_digit, complete, is_valid, modules, normalize, upce_to_upca
+
+
+def test_check_digit():
+    assert check_digit("400638133393") == 1
+    assert complete("9638507") == "96385074"
+    assert is_valid("4006381333931")
+    assert not is_valid("4006381333932")
+    assert is_valid("96385074", 'EAN-8')
+    assert not is_valid("96385075", 'EAN8')
+
+
+def test_upc_a_is_checked_as_ean13():
+    assert normalize("036000291452", 'UPCA') == "0036000291452"
+    assert is_valid("036000291452", 'UPC-A')
+    assert not is_valid("036000291453", 'UPC-A')
+
+
+def test_upce_expansion():
+    # One case per rule of the last digit
+    assert upce_to_upca("01234505") == "012000003455"
+    assert upce_to_upca("01234531") == "012300000451"
+    assert upce_to_upca("01234546") == "012340000056"
+    assert upce_to_upca("01234565") == "012345000065"
+    assert normalize("01234565", 'UPCE') == "0012345000065"
+    assert is_valid("01234565", 'UPCE')
+    assert not is_valid("01234566", 'UPCE')
+
+
+def test_other_symbologies_pass():
+    assert is_valid("http://example.com", 'QRCODE')
+    assert is_valid("ABC-123", 'CODE128')
+    assert normalize("ABC") is None
+    assert not is_valid("12345", 'EAN13')
+
+
+def test_modules():
+    assert len(modules("4006381333931")) == 95
+    assert len(modules("96385074")) == 67
@@ -0,0 +1,36 @@
+import csv
+import threading
+
+from PfandApplication.exporter import CsvExportJob
+
+
+def test_rows_function_runs_on_the_worker(tmp_path):
+    path = str(tmp_path / 'historie.csv')
+    threads = []
+
+    def rows():
+        threads.append(threading.current_thread())
+        return ([str(i), i] for i in range(2500))
+
+    job = CsvExportJob(path, ['Datum', 'Dose'], rows, total=2500)
+    job.start()
+    job.join(10)
+
+    assert threads == [job]
+    assert job.poll()[-1] == ('done', 2500, path)
+    with open(path, newline='', encoding='utf-8') as f:
+        lines = list(csv.reader(f, delimiter=';'))
+    assert lines[0] == ['Datum', 'Dose']
+    assert len(lines) == 2501
+
+
+def test_failing_rows_leave_no_file(tmp_path):
+    path = str(tmp_path / 'historie.csv')
+
+    def rows():
+        raise OSError("kaputt")
+
+    job = CsvExportJob(path, ['Datum'], rows)
+    job.run()
+    assert job.poll() == [('error', 'kaputt', path)]
+    assert list(tmp_path.iterdir()) == []
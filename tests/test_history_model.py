@@ -0,0 +1,49 @@
+from datetime import date
+
+from PfandApplication.history_model import ColumnarHistory
+
+HISTORY = [
+    {'date': '15.01.2024', 'quantities': {'Dose': 4}, 'total': 1.0},
+    {'date': '20.01.2024', 'quantities': {'Dose': 2, 'Kasten': 1}, 'total': 3.5},
+    {'date': '03.02.2024', 'quantities': {'Kasten': 2}, 'total': 6.0},
+    {'date': '20.01.2024', 'quantities': {'Dose': 1}, 'total': 0.25},
+    {'date': 'kaputt', 'quantities': {'Dose': 8}, 'total': 2.0},
+    {'date': '01.03.2023', 'quantities': {'Dose': 1}, 'total': 0.25},
+]
+
+
+def test_group_by_month():
+    model = ColumnarHistory.from_history(HISTORY, ['Dose'])
+    assert model.products == ['Dose', 'Kasten']
+    months = {label: (quantities, amount) for label, quantities, amount in model.totals_by_month()}
+    assert months['2024-01'] == ({'Dose': 7, 'Kasten': 1}, 4.75)
+    assert months['2024-02'] == ({'Dose': 0, 'Kasten': 2}, 6.0)
+    assert months['2023-03'] == ({'Dose': 1, 'Kasten': 0}, 0.25)
+    # Unparseable dates are kept in their own group
+    assert months[None] == ({'Dose': 8, 'Kasten': 0}, 2.0)
+
+
+def test_group_by_year_and_range():
+    model = ColumnarHistory.from_history(HISTORY)
+    years = {label: amount for label, _, amount in model.totals_by_year()}
+    assert years == {'2023': 0.25, '2024': 10.75, None: 2.0}
+    assert model.totals_per_product(date(2024, 1, 1), date(2024, 1, 31)) == {'Dose': 7, 'Kasten': 1}
+    assert model.amount(start=date(2024, 2, 1)) == 6.0
+
+
+def test_top_days_adds_up_the_same_day():
+    model = ColumnarHistory.from_history(HISTORY)
+    best = model.top_days(2)
+    assert best[0] == (date(2024, 2, 3), 2, 6.0)
+    assert best[1] == (date(2024, 1, 20), 4, 3.75)
+
+
+def test_append_adds_rows_and_columns():
+    model = ColumnarHistory.from_history(HISTORY[:1], ['Dose'], )
+    for _ in range(300):
+        model.append({'date': '16.01.2024', 'quantities': {'Monster': 1}, 'total': 0.25})
+    assert model.size == 301
+    assert model.totals_per_product() == {'Dose': 4, 'Monster': 300}
+    rows = list(model.iter_rows(['Monster', 'Dose']))
+    assert rows[0] == ['15.01.2024', 0, 4, '1.00']
+    assert rows[-1] == ['16.01.2024', 1, 0, '0.25']
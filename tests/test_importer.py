@@ -0,0 +1,95 @@
+from PfandApplication.importer import HistoryImporter, parse_dates
+
+PRICES = {'Dose': 0.25, 'Kasten': 3.0}
+
+
+def write(path, rows, header='Datum;Dose;Kasten;Gesamt (€)'):
+    path.write_text('\n'.join([header] + rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_parse_dates():
+    ordinals = parse_dates(['01.02.2024', '29.02.2024', '30.02.2024', '1.2.2024', 'xx.02.2024', '31.12.1999'])
+    valid = [value > 0 for value in ordinals]
+    assert valid == [True, True, False, False, False, True]
+
+
+def test_totals_are_recomputed_and_invalid_rows_counted(tmp_path):
+    path = write(tmp_path / 'a.csv', [
+        '02.01.2024;4;1;999.00',
+        '01.01.2024;2;;0.50',
+        '31.02.2024;1;0;0.25',   # no such day
+        '03.01.2024;x;0;0.00',   # not a number
+        '04.01.2024;1',          # missing columns
+    ])
+    importer = HistoryImporter(PRICES)
+    assert importer.add_file(path)
+
+    records = importer.sorted_records()
+    assert [record['date'] for record in records] == ['01.01.2024', '02.01.2024']
+    assert records[1] == {'date': '02.01.2024', 'quantities': {'Dose': 4, 'Kasten': 1}, 'total': 4.0}
+    assert importer.result.rows == 5
+    assert importer.result.invalid == 3
+
+
+def test_existing_deposits_are_skipped(tmp_path):
+    existing = [{'date': '01.01.2024', 'quantities': {'Dose': 2, 'Kasten': 0}, 'total': 0.5}]
+    path = write(tmp_path / 'a.csv', ['01.01.2024;2;0;0.50', '01.01.2024;2;0;0.50', '02.01.2024;1;0;0.25'])
+    importer = HistoryImporter(PRICES, existing)
+    importer.add_file(path)
+
+    # One of the two identical rows is already there, the other one is a second deposit
+    assert len(importer.sorted_records()) == 2
+    assert importer.result.duplicates == 1
+    assert importer.result.repeated == 1
+
+
+def test_identical_rows_of_one_file_are_all_imported(tmp_path):
+    path = write(tmp_path / 'a.csv', ['01.01.2024;2;0;0.50', '01.01.2024;2;0;0.50'])
+    importer = HistoryImporter(PRICES)
+    importer.add_file(path)
+    assert len(importer.sorted_records()) == 2
+    assert importer.result.duplicates == 0
+
+
+def test_unknown_products_and_broken_files(tmp_path):
+    importer = HistoryImporter(PRICES)
+    importer.add_file(write(tmp_path / 'a.csv', ['01.01.2024;3;5;0'], header='Datum;Dose;Club Mate;Gesamt (€)'))
+    assert importer.result.unknown_products == {'Club Mate'}
+    assert importer.sorted_records()[0]['total'] == 0.75
+
+    assert not importer.add_file(write(tmp_path / 'b.csv', ['01.01.2024;1'], header='Produkt;Dose'))
+    assert not importer.add_file(str(tmp_path / 'missing.csv'))
+    assert len(importer.result.errors) == 2
+    assert importer.result.files == 1
+
+
+def test_the_same_file_twice_in_one_import(tmp_path):
+    path = write(tmp_path / 'a.csv', ['01.01.2024;2;0;0.50', '01.01.2024;2;0;0.50'])
+    importer = HistoryImporter(PRICES)
+    importer.add_file(path)
+    importer.add_file(path)
+    assert len(importer.sorted_records()) == 2
+    assert importer.result.duplicates == 2
+
+
+def test_overlapping_exports_of_two_stations(tmp_path):
+    first = write(tmp_path / 'a.csv', ['01.01.2024;2;0;0.50', '02.01.2024;1;0;0.25'])
+    second = write(tmp_path / 'b.csv', ['02.01.2024;1;0;0.25', '02.01.2024;1;0;0.25', '03.01.2024;0;1;3.00'])
+    importer = HistoryImporter(PRICES)
+    importer.add_file(first)
+    importer.add_file(second)
+    # b.csv has a second deposit on 02.01. and one on 03.01. that a.csv does not have
+    assert [record['date'] for record in importer.sorted_records()] == \
+        ['01.01.2024', '02.01.2024', '02.01.2024', '03.01.2024']
+    assert importer.result.duplicates == 1
+
+
+def test_a_broken_file_does_not_count_as_known(tmp_path):
+    broken = tmp_path / 'broken.csv.gz'
+    broken.write_bytes(b'not gzip')
+    path = write(tmp_path / 'a.csv', ['01.01.2024;2;0;0.50'])
+    importer = HistoryImporter(PRICES)
+    assert not importer.add_file(str(broken))
+    importer.add_file(path)
+    assert len(importer.sorted_records()) == 1
@@ -0,0 +1,39 @@
+import numpy as np
+
+from PfandApplication.dedup import DedupCache
+from PfandApplication.motion import MotionGate
+
+
+def frame(value):
+    return np.full((72, 128, 3), value, np.uint8)
+
+
+def test_moving_picture_is_decoded_with_a_burst_after_it():
+    gate = MotionGate(burst_frames=2, idle_interval=0)
+    assert gate.changed(frame(0), now=0.0)
+    assert gate.changed(frame(100), now=0.1)
+    assert gate.changed(frame(100), now=0.2)
+    assert gate.changed(frame(100), now=0.3)
+    assert not gate.changed(frame(100), now=0.4)
+    assert gate.skipped == 1
+
+
+def test_still_picture_is_decoded_every_idle_interval_whatever_the_frame_rate():
+    gate = MotionGate(burst_frames=0, idle_interval=2.5)
+    gate.changed(frame(50), now=0.0)
+    # 30 fps and 1 fps: the same seconds between the idle decodes
+    passed = [t / 30 for t in range(1, 300) if gate.changed(frame(50), now=t / 30)]
+    assert passed == [75 / 30, 150 / 30, 225 / 30]
+    gate = MotionGate(burst_frames=0, idle_interval=2.5)
+    gate.changed(frame(50), now=0.0)
+    assert [t for t in range(1, 10) if gate.changed(frame(50), now=float(t))] == [3, 6, 9]
+
+
+def test_bottle_standing_still_at_1_fps_stays_one_scan():
+    gate = MotionGate()
+    recent = DedupCache()
+    counted = 0
+    for t in range(60):
+        if gate.changed(frame(80), now=float(t)) and recent.is_new('4006381333931', now=float(t)):
+            counted += 1
+    assert counted == 1
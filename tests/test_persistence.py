@@ -0,0 +1,54 @@
+from PfandApplication.persistence import WriteBehind
+
+
+def test_pending_data_is_isolated_from_the_caller():
+    written = []
+    writer = WriteBehind(written.append, delay_ms=60000)
+    aggregates = {'product_totals': {'Dose': 1}, 'deposit_count': 1}
+    writer.mark_dirty(aggregates)
+    aggregates['product_totals']['Dose'] = 99
+    aggregates['product_totals']['Kasten'] = 1
+
+    assert writer.flush()
+    assert written == [{'product_totals': {'Dose': 1}, 'deposit_count': 1}]
+    assert not writer.flush()
+
+
+def test_only_the_newest_state_is_written():
+    written = []
+    writer = WriteBehind(written.append, delay_ms=60000)
+    for count in range(5):
+        writer.mark_dirty({'count': count})
+    writer.flush()
+    assert written == [{'count': 4}]
+
+
+def test_merged_changes_are_written_together():
+    written = []
+    writer = WriteBehind(written.append, delay_ms=60000, merge=True)
+    writer.mark_dirty({'a': 1})
+    writer.mark_dirty({'b': 2})
+    writer.mark_dirty({'a': 3})
+    assert writer.flush()
+    assert written == [{'a': 3, 'b': 2}]
+    assert not writer.flush()
+
+
+def test_merged_changes_survive_a_failed_write():
+    written = []
+
+    def write(changes):
+        if not written:
+            written.append(None)
+            writer.mark_dirty({'b': 3, 'c': 4})  # changed while writing
+            raise OSError("disk full")
+        written.append(changes)
+
+    writer = WriteBehind(write, delay_ms=60000, merge=True)
+    writer.mark_dirty({'a': 1, 'b': 2})
+    try:
+        writer.flush()
+    except OSError:
+        pass
+    assert writer.flush()
+    assert written[-1] == {'a': 1, 'b': 3, 'c': 4}
@@ -0,0 +1,11 @@
+from PfandApplication.ean import complete
+from PfandApplication.pfand_types import load_table
+
+
+def test_ean8_restricted_prefixes():
+    table = load_table()
+    assert table.classify(complete("0123456"), 'EAN8').type == 'KEIN PFAND'
+    assert table.classify(complete("2123456"), 'EAN8').type == 'KEIN PFAND'
+    # 1 is a regular GS1 prefix, not an in-store range
+    assert table.classify(complete("1123456"), 'EAN8').type != 'KEIN PFAND'
+    assert table.classify(complete("1123456"), 'EAN8').type == 'MEHRWEG'
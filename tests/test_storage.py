@@ -0,0 +1,74 @@
+import pytest
+
+from PfandApplication.storage import JsonStorage, SQLiteStorage, migrate_json_to_sqlite, open_storage
+
+HISTORY = [
+    {'date': '01.01.2024', 'quantities': {'Dose': 4, 'Kasten': 1}, 'total': 4.0},
+    {'date': '02.01.2024', 'quantities': {'Dose': 2}, 'total': 0.5},
+]
+CATALOG = {
+    '4006381333931': {'product': 'Dose', 'has_pfand': True, 'last_seen': '01.01.2024 10:00:00', 'count': 3},
+    '9783161484100': {'product': None, 'has_pfand': False, 'last_seen': None, 'count': 1},
+}
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    source = JsonStorage(str(tmp_path))
+    source.save_products(['Dose', 'Kasten'], {'Dose': 0.25, 'Kasten': 3.0})
+    source.save_quantities({'Dose': 5, 'Kasten': 0})
+    source.load_deposit_history()
+    for record in HISTORY:
+        source.append_deposit(record)
+    source.save_achievements({'first_deposit': {'unlocked': True, 'unlock_date': '01.01.2024'}})
+    source.save_aggregates({'deposit_count': 2})
+    source.save_catalog(CATALOG)
+
+    target, migrated = migrate_json_to_sqlite(str(tmp_path))
+    try:
+        assert migrated == 2
+        assert isinstance(target, SQLiteStorage)
+        assert target.load_products() == (['Dose', 'Kasten'], {'Dose': 0.25, 'Kasten': 3.0})
+        assert target.load_quantities() == {'Dose': 5, 'Kasten': 0}
+        assert target.load_deposit_history() == HISTORY
+        assert target.deposit_count() == 2
+        assert target.load_achievements() == {'first_deposit': {'unlocked': True, 'unlock_date': '01.01.2024'}}
+        assert target.load_aggregates() == {'deposit_count': 2}
+        assert target.load_catalog() == CATALOG
+    finally:
+        target.close()
+
+    # The database is used from now on, the JSON files stay as a backup
+    storage = open_storage(str(tmp_path))
+    assert isinstance(storage, SQLiteStorage)
+    storage.close()
+    assert JsonStorage(str(tmp_path)).load_deposit_history() == HISTORY
+
+
+def test_migrate_refuses_an_existing_database(tmp_path):
+    SQLiteStorage(str(tmp_path / 'pfand.db')).close()
+    with pytest.raises(FileExistsError):
+        migrate_json_to_sqlite(str(tmp_path))
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_update_catalog_writes_only_the_changes(tmp_path, backend):
+    if backend == 'json':
+        storage = JsonStorage(str(tmp_path))
+    else:
+        storage = SQLiteStorage(str(tmp_path / 'pfand.db'))
+    try:
+        storage.save_catalog(CATALOG)
+        changed = {'product': 'Dose', 'has_pfand': True, 'last_seen': '02.01.2024 09:00:00', 'count': 4}
+        added = {'product': None, 'has_pfand': False, 'last_seen': None, 'count': 1}
+        storage.update_catalog({'4006381333931': changed, '9783161484100': None, '4000417025005': added})
+        assert storage.load_catalog() == {'4006381333931': changed, '4000417025005': added}
+    finally:
+        storage.close()
+
+
+def test_update_catalog_replaces_a_broken_json_file(tmp_path):
+    (tmp_path / 'barcodes.json').write_text('{"4006381333931": {"prod')
+    storage = JsonStorage(str(tmp_path))
+    entry = {'product': 'Dose', 'has_pfand': True, 'last_seen': None, 'count': 1}
+    storage.update_catalog({'4006381333931': entry})
+    assert storage.load_catalog() == {'4006381333931': entry}